@@ -1,16 +1,48 @@
 import json
+import asyncio
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
+from pydantic import ValidationError
+
+from backend.command_policy import assess_command
 from backend.config import settings
-from backend.memory import memory_manager
+from backend.memory_manager import memory_manager
 from backend.llm_client import get_llm_response
-from backend.schemas import PlanModel
-from backend.tools import get_tool_definitions, execute_tool, substitute_placeholders
-from backend.utils import parse_json_from_response, plan_sanity_check, validate_plan_semantically
+from backend.plan_executor import execute_plan
+from backend.schemas import PlanModel, StepModel
+from backend.prompts import planning_prompt
+from backend.tools import execute_tool
+from backend.utils import (
+    PLACEHOLDER_PATTERN, SecurityDecision, parse_json_from_response, plan_sanity_check, substitute_placeholders,
+    validate_plan_semantically
+)
 
 logger = logging.getLogger(__name__)
 
+def _speculative_shell_commands(plan: List[StepModel]) -> List[str]:
+    commands = []
+    for step in plan:
+        if step.tool.name != "execute_script":
+            continue
+        command = step.parameters.get("command")
+        # Commands that depend on earlier step output are only known at execution time.
+        if isinstance(command, str) and command.strip() and not PLACEHOLDER_PATTERN.search(command) and command not in commands:
+            commands.append(command)
+    return commands
+
+async def _pre_assess_command(command: str, user_prompt: str) -> Optional[SecurityDecision]:
+    try:
+        return await assess_command(command, user_prompt)
+    except Exception as e:
+        logger.warning(f"Speculative security assessment of '{command}' failed, it will be assessed at execution: {e}")
+        return None
+
+def _agent_result(response: str, full_history: List[Dict[str, Any]], history_start: int) -> Dict[str, Any]:
+    # chat_history is only a window of the stored history (plus its summary), so callers persist
+    # new_messages with append_chat_messages; the windowed history itself is never handed back.
+    return {"response": response, "new_messages": full_history[history_start:]}
+
 async def run_agent(
     user_prompt: str, session_id: str, chat_history: list, correlation_id: str = "no-correlation-id"
 ) -> Dict[str, Any]:
@@ -30,7 +62,9 @@ async def run_agent(
             )
 
         print("\n--- STAGE 0: MEMORY RETRIEVAL ---")
-        retrieved_context_list = memory_manager.retrieve_from_memory(user_prompt)
+        retrieved_context_list = await memory_manager.aretrieve_from_memory(
+            user_prompt, session_id=session_id if settings.memory_scope_to_session else None
+        )
         context_str = "\n\n---\n\n".join(retrieved_context_list)
         if context_str:
             logger.info("Injecting retrieved context.")
@@ -38,36 +72,9 @@ async def run_agent(
             logger.info("No relevant context found in memory.")
 
         print(f"\n--- STAGE 1: PLAN GENERATION (Attempt {attempt + 1}/{max_retries}) ---")
-        tool_schemas_str = json.dumps(get_tool_definitions(), indent=2)
-
-        planning_system_prompt = (
-            "You are a tactical AI agent. Your only job is to take a single, simple, concrete task and create a JSON plan to execute it using the available tools. "
-            "Your output MUST be a JSON object with a 'plan' key.\n\n"
-            "**CRITICAL RESPONSE FORMATTING:**\n"
-            "1. Your output MUST be a single JSON object with a single root key named \"plan\".\n"
-            "2. The value of \"plan\" MUST be a list of step objects.\n"
-            "3. Each step object in the list MUST have EXACTLY three keys: \"tool\", \"parameters\", and \"reason\".\n"
-            "4. **Each step must represent a single, atomic action.** Do NOT combine multiple commands into one step.\n"
-            "5. The \"parameters\" for the \"execute_script\" tool must contain a single key named \"command\" whose value is a string.\n\n"
-            "Example of a PERFECT response:\n"
-            "{\n"
-            '  "plan": [\n'
-            '    {\n'
-            '      "tool": {"name": "execute_script"},\n'
-            '      "parameters": {"command": "echo \'hello world\'"},\n'
-            '      "reason": "This is an example step to print hello world."\n'
-            '    }\n'
-            '  ]\n'
-            '}\n\n'
-            "### CONTEXT FROM LONG-TERM MEMORY ###\n"
-            f"{context_str if context_str else 'No relevant context found.'}\n"
-            "### END CONTEXT ###\n\n"
-            "AVAILABLE TOOLS:\n"
-            f"{tool_schemas_str}\n\n"
-            "Now, create a plan for the user's simple request."
-        )
-
-        planning_messages = [{"role": "system", "content": planning_system_prompt}, {"role": "user", "content": user_prompt}]
+        prompt = planning_prompt.build(user_prompt, context_str)
+        logger.info(f"Planning prompt {prompt.version}: ~{prompt.total_tokens} tokens {prompt.section_tokens}")
+        planning_messages = prompt.messages
 
         llm_plan_response_str = await get_llm_response(
             provider="mistral", model_name=settings.mistral_model, messages=planning_messages,
@@ -77,7 +84,7 @@ async def run_agent(
         print("--- RAW LLM JSON ---")
         print(parsed_data)
         if "content" in parsed_data:
-            return {"response": parsed_data["content"], "full_history": full_history}
+            return _agent_result(parsed_data["content"], full_history, len(chat_history))
 
         try:
             plan = PlanModel(**parsed_data).plan
@@ -86,33 +93,48 @@ async def run_agent(
                 plan = PlanModel(plan=parsed_data).plan
             except ValidationError as e:
                 logger.error(f"Pydantic validation failed on both attempts: {e}")
-                return {"response": f"Invalid plan structure: {e}", "full_history": full_history}
+                return _agent_result(f"Invalid plan structure: {e}", full_history, len(chat_history))
 
         is_sane, sanity_error = plan_sanity_check(plan, user_prompt)
         if not is_sane:
-            return {"response": sanity_error, "full_history": full_history}
+            return _agent_result(sanity_error, full_history, len(chat_history))
 
-        is_logical, comment, corrected_plan_list = await validate_plan_semantically(parsed_data['plan'], user_prompt, correlation_id)
+        shell_commands = _speculative_shell_commands(plan) if settings.speculative_security_assessment else []
+        (is_logical, comment, corrected_plan_list), *assessments = await asyncio.gather(
+            validate_plan_semantically(parsed_data['plan'], user_prompt, correlation_id),
+            *(_pre_assess_command(command, original_user_prompt) for command in shell_commands),
+        )
         if not is_logical:
-            return {"response": f"Semantic validation failed: {comment}", "full_history": full_history}
+            return _agent_result(f"Semantic validation failed: {comment}", full_history, len(chat_history))
+
+        security_verdicts = {}
+        if corrected_plan_list == parsed_data['plan']:
+            security_verdicts = {cmd: verdict for cmd, verdict in zip(shell_commands, assessments) if verdict is not None}
+        elif shell_commands:
+            logger.info("Plan Critic rewrote the plan, discarding speculative security assessments.")
 
         plan = PlanModel(plan=corrected_plan_list).plan
         logger.info(f"Plan semantic validation: SUCCESS. {comment}")
-        full_history.append({"role": "assistant", "content": f"Plan Generated (and validated): {comment}\n```json\n{json.dumps({'plan': corrected_plan_list}, indent=2)}\n```"})
+        full_history.append({"role": "assistant", "content": f"Plan Generated (and validated): {comment}\n```json\n{json.dumps({'plan': corrected_plan_list}, separators=(',', ':'))}\n```"})
         print(f"✅ Plan generated with {len(plan)} steps.")
 
         print("\n--- STAGE 2: EXECUTION ---")
-        step_results = {}
         execution_error = None
 
-        for i, step in enumerate(plan):
+        async def run_step(i: int, step: StepModel, results: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
             print(f"Executing step {i+1}/{len(plan)}: {step.tool}")
-            params = substitute_placeholders(step.parameters, step_results)
-            tool_output = await execute_tool(step.tool, params, session_id, original_user_prompt)
-            step_results[i] = tool_output
+            params = substitute_placeholders(step.parameters, results)
+            return await execute_tool(
+                step.tool, params, session_id, original_user_prompt, security_verdicts=security_verdicts
+            )
+
+        step_results = await execute_plan(plan, run_step, settings.max_parallel_steps)
+
+        for i in sorted(step_results):
+            tool_output = step_results[i]
             print(f"🔭 Observed: {tool_output}")
             if tool_output.get("status") == "error":
-                error_message = f"Execution stopped at step {i+1} ({step.tool}): {tool_output.get('message')}"
+                error_message = f"Execution stopped at step {i+1} ({plan[i].tool}): {tool_output.get('message')}"
                 full_history.append({"role": "assistant", "content": error_message})
                 retryable_errors = ["not found", "does not exist"]
                 is_retryable = any(keyword in error_message.lower() for keyword in retryable_errors)
@@ -121,15 +143,15 @@ async def run_agent(
                     break
                 else:
                     logger.error(f"Execution failed with a non-retryable error. Halting.")
-                    return {"response": error_message, "full_history": full_history}
+                    return _agent_result(error_message, full_history, len(chat_history))
 
         if not execution_error:
             print("\n--- STAGE 3: FINAL REPORT ---")
             final_result = step_results.get(len(plan) - 1, {})
             final_answer = final_result.get("data", "The plan has been executed successfully.")
             full_history.append({"role": "assistant", "content": str(final_answer)})
-            return {"response": str(final_answer), "full_history": full_history}
+            return _agent_result(str(final_answer), full_history, len(chat_history))
 
     final_error_message = f"Agent failed after {max_retries} attempts. Last error: {execution_error}"
     full_history.append({"role": "assistant", "content": final_error_message})
-    return {"response": final_error_message, "full_history": full_history}
+    return _agent_result(final_error_message, full_history, len(chat_history))
@@ -0,0 +1,101 @@
+import heapq
+import math
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+")
+CAMEL_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    # Identifiers are indexed whole and by their snake/camel-case parts, so 'retrieveFromMemory'
+    # matches both itself and 'memory'.
+    tokens = []
+    for word in re.findall(r"[A-Za-z0-9_]+", text):
+        lowered = word.lower()
+        tokens.append(lowered)
+        parts = [p.lower() for piece in TOKEN_PATTERN.findall(word) for p in CAMEL_PATTERN.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_len
+
+    def add(self, doc_id: str, text: str, meta: Optional[Dict[str, Any]] = None):
+        tokens = tokenize(text)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        with self._lock:
+            self._remove_locked(doc_id)
+            for token, tf in counts.items():
+                self._postings.setdefault(token, {})[doc_id] = tf
+            self._doc_len[doc_id] = len(tokens)
+            self._doc_terms[doc_id] = list(counts)
+            self._meta[doc_id] = meta or {}
+            self._total_len += len(tokens)
+
+    def update_meta(self, doc_id: str, meta: Dict[str, Any]):
+        with self._lock:
+            if doc_id in self._meta:
+                self._meta[doc_id] = meta
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: str):
+        length = self._doc_len.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_len -= length
+        self._meta.pop(doc_id, None)
+        for token in self._doc_terms.pop(doc_id, []):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[token]
+
+    def search(
+        self, query: str, k: int, predicate: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> List[Tuple[str, float]]:
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs
+            scores: Dict[str, float] = {}
+            for token in set(tokenize(query)):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            if predicate is not None:
+                scores = {doc_id: score for doc_id, score in scores.items() if predicate(self._meta[doc_id])}
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
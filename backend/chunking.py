@@ -0,0 +1,90 @@
+import ast
+import logging
+from typing import List, NamedTuple, Tuple
+
+from backend.llm_client import _count_tokens
+
+logger = logging.getLogger(__name__)
+
+class Chunk(NamedTuple):
+    text: str
+    kind: str
+    start_line: int
+    end_line: int
+    start_char: int
+    end_char: int
+
+def estimate_tokens(text: str) -> int:
+    # Falls back to ~4 characters per token when tiktoken is unavailable.
+    return _count_tokens(text) or (len(text) + 3) // 4
+
+def _line_offsets(lines: List[str]) -> List[int]:
+    offsets, position = [], 0
+    for line in lines:
+        offsets.append(position)
+        position += len(line)
+    offsets.append(position)
+    return offsets
+
+def _make_chunk(lines: List[str], offsets: List[int], start: int, end: int, kind: str) -> Chunk:
+    # start/end are 0-based, end exclusive; stored line numbers are 1-based and inclusive.
+    return Chunk("".join(lines[start:end]), kind, start + 1, end, offsets[start], offsets[end])
+
+def _window_spans(lines: List[str], start: int, end: int, max_tokens: int, overlap_lines: int) -> List[Tuple[int, int]]:
+    spans, window_start = [], start
+    while window_start < end:
+        tokens, window_end = 0, window_start
+        while window_end < end:
+            line_tokens = estimate_tokens(lines[window_end])
+            if window_end > window_start and tokens + line_tokens > max_tokens:
+                break
+            tokens += line_tokens
+            window_end += 1
+        spans.append((window_start, window_end))
+        if window_end >= end:
+            break
+        window_start = max(window_start + 1, window_end - overlap_lines)
+    return spans
+
+def _python_spans(content: str, line_count: int) -> List[Tuple[int, int, str]]:
+    tree = ast.parse(content)
+    spans, cursor = [], 0
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1
+        end = node.end_lineno
+        if start > cursor:
+            spans.append((cursor, start, "module"))
+        spans.append((start, end, "class" if isinstance(node, ast.ClassDef) else "function"))
+        cursor = end
+    if cursor < line_count:
+        spans.append((cursor, line_count, "module"))
+    return spans
+
+def chunk_document(content: str, filename: str, max_tokens: int = 256, overlap_lines: int = 2) -> List[Chunk]:
+    lines = content.splitlines(keepends=True)
+    if not lines:
+        return []
+    offsets = _line_offsets(lines)
+
+    spans = [(0, len(lines), "window")]
+    if filename.endswith(".py"):
+        try:
+            spans = _python_spans(content, len(lines))
+        except (SyntaxError, ValueError) as e:
+            logger.info(f"Could not parse '{filename}' as Python, falling back to token windows: {e}")
+
+    chunks = []
+    for start, end, kind in spans:
+        text = "".join(lines[start:end])
+        if not text.strip():
+            continue
+        if estimate_tokens(text) <= max_tokens and kind != "window":
+            chunks.append(_make_chunk(lines, offsets, start, end, kind))
+            continue
+        for window_start, window_end in _window_spans(lines, start, end, max_tokens, overlap_lines):
+            chunk = _make_chunk(lines, offsets, window_start, window_end, kind)
+            if chunk.text.strip():
+                chunks.append(chunk)
+    return chunks
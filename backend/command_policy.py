@@ -0,0 +1,297 @@
+import logging
+import os
+import shlex
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from prometheus_client import Counter
+
+from backend.config import settings
+from backend.llm_client import get_llm_response
+from backend.utils import SecurityDecision
+
+logger = logging.getLogger(__name__)
+
+SECURITY_ASSESSMENTS = Counter(
+    "security_assessments_total", "Shell command security assessments by deciding source.", ["source"]
+)
+
+CONTROL_OPERATORS = {";", "&&", "||", "|", "&"}
+REDIRECT_OPERATORS = {">", ">>", "<", ">|", "&>", ">&", "<&"}
+# shlex emits runs of these characters as one token, so ";(" or "|&" arrive as a single operator.
+PUNCTUATION_CHARS = frozenset("();<>|&")
+# Subshells, groups and process substitution are shell syntax, never operands.
+GROUPING_CHARS = ("(", ")", "{", "}")
+GLOB_CHARS = ("*", "?", "[")
+
+class CommandRule(NamedTuple):
+    binary: str
+    args_prefix: Tuple[str, ...] = ()
+    allowed_flags: Optional[FrozenSet[str]] = None
+    denied_flags: FrozenSet[str] = frozenset()
+    workspace_paths_only: bool = True
+    # Options whose value may be attached (-o/etc/x); the value is path-checked like an operand.
+    value_flags: FrozenSet[str] = frozenset()
+    # Operands may be rev:path (git show HEAD:README.md); the path part is checked too.
+    rev_paths: bool = False
+
+ALLOW_RULES = [
+    CommandRule("ls"),
+    CommandRule("cat"),
+    CommandRule("pwd"),
+    CommandRule("echo"),
+    CommandRule("head", value_flags=frozenset({"-n", "-c"})),
+    CommandRule("tail", value_flags=frozenset({"-n", "-c", "-s"})),
+    CommandRule("wc"),
+    CommandRule("grep", value_flags=frozenset({"-f", "-e", "-m", "-A", "-B", "-C", "-d", "-D"})),
+    CommandRule("tree", value_flags=frozenset({"-o", "-L", "-P", "-I", "-H", "-T"})),
+    CommandRule("diff", value_flags=frozenset({"-C", "-U", "-W", "-x", "-X", "-I", "-S", "-F", "-L"})),
+    CommandRule("sort", denied_flags=frozenset({"--compress-program"}), value_flags=frozenset({"-o", "-T", "-k", "-t", "-S"})),
+    CommandRule("which"),
+    CommandRule("find", denied_flags=frozenset({"-delete", "-exec", "-execdir", "-ok", "-okdir"})),
+    CommandRule("mkdir", allowed_flags=frozenset({"-p", "--parents", "-v"})),
+    CommandRule("touch"),
+    CommandRule("pytest"),
+    CommandRule("python", ("-m", "pytest")),
+    CommandRule("python3", ("-m", "pytest")),
+    CommandRule("python", ("--version",), allowed_flags=frozenset()),
+    CommandRule("python3", ("--version",), allowed_flags=frozenset()),
+    CommandRule("pip", ("list",)),
+    CommandRule("pip", ("show",)),
+    CommandRule("pip", ("freeze",)),
+    CommandRule("git", ("status",)),
+    CommandRule("git", ("log",), rev_paths=True),
+    CommandRule("git", ("diff",), rev_paths=True),
+    CommandRule("git", ("show",), rev_paths=True),
+]
+
+DENY_BINARIES = {
+    "sudo", "su", "doas", "dd", "mkfs", "fdisk", "parted", "shutdown", "reboot",
+    "halt", "poweroff", "init", "systemctl", "mount", "umount", "chroot", "insmod", "rmmod",
+}
+
+def _is_flag(token: str) -> bool:
+    return token.startswith("-") and token != "-"
+
+def _flag_set(token: str) -> Iterable[str]:
+    if token.startswith("--") or len(token) <= 2:
+        return [token.split("=", 1)[0]]
+    # Bundled short flags like -rf.
+    return [f"-{c}" for c in token[1:]]
+
+def _is_denied(flag: str, denied_flags: FrozenSet[str]) -> bool:
+    # getopt_long accepts any unambiguous prefix, so --compress=sh is --compress-program=sh.
+    if flag.startswith("--") and len(flag) > 2:
+        return any(denied.startswith(flag) for denied in denied_flags)
+    return flag in denied_flags
+
+def _split_short_value(token: str, value_flags: FrozenSet[str]) -> Optional[Tuple[List[str], Optional[str]]]:
+    # "-rn" -> (["-r", "-n"], None); "-o/etc/x" -> (["-o"], "/etc/x"). None when the bundle holds
+    # something that is neither a flag letter nor the value of a known value option.
+    flags = []
+    for position, char in enumerate(token[1:], start=1):
+        flag = f"-{char}"
+        if flag in value_flags:
+            flags.append(flag)
+            return flags, token[position + 1:] or None
+        if not char.isalnum():
+            return None
+        flags.append(flag)
+    return flags, None
+
+def _escapes_workspace(token: str) -> bool:
+    if token.startswith(("/", "~")):
+        return True
+    # The shell expands .? .* and .[.] to "..", so a globbed component that can match a leading dot
+    # may climb out of the workspace.
+    if any(part.startswith((".", "[")) and any(char in part for char in GLOB_CHARS) for part in token.split("/")):
+        return True
+    return os.path.normpath(token).split(os.sep)[0] == ".."
+
+def _split_segments(tokens: List[str]) -> Optional[List[List[str]]]:
+    segments, current = [], []
+    for token in tokens:
+        if token in CONTROL_OPERATORS:
+            if not current:
+                return None
+            segments.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current:
+        segments.append(current)
+    return segments
+
+class CommandPolicy:
+    def __init__(self, allow_rules: List[CommandRule], deny_binaries: Iterable[str], cache_size: int):
+        self._rules: Dict[str, List[CommandRule]] = {}
+        for rule in allow_rules:
+            self._rules.setdefault(rule.binary, []).append(rule)
+        self._deny_binaries = frozenset(deny_binaries)
+        self._verdicts: "OrderedDict[Tuple[str, str], SecurityDecision]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def tokenize(self, command: str) -> Optional[List[str]]:
+        # Substitutions and variables can expand to anything, so they are never decided locally.
+        if any(marker in command for marker in ("$", "`", "\n")):
+            return None
+        try:
+            lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+            lexer.whitespace_split = True
+            tokens = list(lexer)
+        except ValueError:
+            return None
+        for token in tokens:
+            if any(char in token for char in GROUPING_CHARS):
+                return None
+            if set(token) <= PUNCTUATION_CHARS and token not in CONTROL_OPERATORS | REDIRECT_OPERATORS:
+                return None
+        return tokens
+
+    def normalize(self, command: str) -> str:
+        tokens = self.tokenize(command)
+        if tokens is None:
+            return " ".join(command.split())
+        return " ".join(shlex.quote(t) if t not in CONTROL_OPERATORS | REDIRECT_OPERATORS else t for t in tokens)
+
+    def _check_segment(self, segment: List[str]) -> Optional[SecurityDecision]:
+        binary = os.path.basename(segment[0])
+        args = segment[1:]
+        # A path like ./ls may be anything, so only bare names on PATH can match allow rules.
+        allow_candidates = self._rules.get(binary, []) if "/" not in segment[0] else []
+
+        if binary in self._deny_binaries or binary.startswith("mkfs."):
+            return SecurityDecision(is_safe=False, reasoning=f"'{binary}' is denied by the command policy.")
+        if binary == "rm":
+            flags = {f for a in args if _is_flag(a) for f in _flag_set(a)}
+            recursive = flags & {"-r", "-R", "--recursive"}
+            if recursive and any(_escapes_workspace(a) or a in ("*", ".") for a in args if not _is_flag(a)):
+                return SecurityDecision(is_safe=False, reasoning="Recursive delete outside of a workspace subdirectory is denied.")
+
+        for rule in allow_candidates:
+            if tuple(args[:len(rule.args_prefix)]) != rule.args_prefix:
+                continue
+            rest = args[len(rule.args_prefix):]
+            operands, flags, raw_flags, redirect_target, undecidable = [], set(), set(), False, False
+            for token in rest:
+                if token in REDIRECT_OPERATORS:
+                    redirect_target = True
+                    continue
+                if redirect_target:
+                    operands.append(token)
+                    redirect_target = False
+                elif _is_flag(token):
+                    raw_flags.add(token.split("=", 1)[0])
+                    if token.startswith("--") or len(token) <= 2:
+                        flags.update(_flag_set(token))
+                        if "=" in token:
+                            operands.append(token.split("=", 1)[1])
+                        continue
+                    split = _split_short_value(token, rule.value_flags)
+                    if split is None:
+                        undecidable = True
+                        break
+                    flags.update(split[0])
+                    if split[1] is not None:
+                        operands.append(split[1])
+                elif rule.rev_paths and ":" in token:
+                    operands.extend(token.split(":", 1))
+                else:
+                    operands.append(token)
+            if redirect_target or undecidable:
+                continue
+            if any(_is_denied(flag, rule.denied_flags) for flag in flags | raw_flags):
+                continue
+            if rule.allowed_flags is not None and not flags <= rule.allowed_flags:
+                continue
+            if rule.workspace_paths_only and any(_escapes_workspace(o) for o in operands):
+                continue
+            return SecurityDecision(is_safe=True, reasoning=f"Matched allow rule for '{' '.join((binary,) + rule.args_prefix)}'.")
+        return None
+
+    def evaluate(self, command: str) -> Optional[SecurityDecision]:
+        tokens = self.tokenize(command)
+        if not tokens:
+            return None
+        segments = _split_segments(tokens)
+        if not segments:
+            return None
+        decisions = [self._check_segment(segment) for segment in segments]
+        for decision in decisions:
+            if decision is not None and not decision.is_safe:
+                return decision
+        if all(decision is not None for decision in decisions):
+            return decisions[0] if len(decisions) == 1 else SecurityDecision(
+                is_safe=True, reasoning="Every part of the command matched an allow rule."
+            )
+        return None
+
+    def get_cached_verdict(self, command: str, user_prompt: str) -> Optional[SecurityDecision]:
+        key = (self.normalize(command), user_prompt)
+        with self._lock:
+            decision = self._verdicts.get(key)
+            if decision is not None:
+                self._verdicts.move_to_end(key)
+            return decision
+
+    def remember_verdict(self, command: str, user_prompt: str, decision: SecurityDecision):
+        key = (self.normalize(command), user_prompt)
+        with self._lock:
+            self._verdicts[key] = decision
+            self._verdicts.move_to_end(key)
+            while len(self._verdicts) > self._cache_size:
+                self._verdicts.popitem(last=False)
+
+command_policy = CommandPolicy(ALLOW_RULES, DENY_BINARIES, cache_size=settings.security_verdict_cache_size)
+
+async def assess_command(command: str, user_prompt: str) -> SecurityDecision:
+    decision = command_policy.evaluate(command)
+    if decision is not None:
+        SECURITY_ASSESSMENTS.labels(source="rule_allow" if decision.is_safe else "rule_deny").inc()
+        if decision.is_safe:
+            logger.info(f"Command '{command}' approved by command policy: {decision.reasoning}")
+        else:
+            logger.warning(f"Command '{command}' REJECTED by command policy: {decision.reasoning}")
+        return decision
+
+    decision = command_policy.get_cached_verdict(command, user_prompt)
+    if decision is not None:
+        SECURITY_ASSESSMENTS.labels(source="cache").inc()
+        logger.info(f"Reusing cached Security Officer verdict for command: '{command}'")
+        return decision
+
+    logger.info(f"Engaging AI Security Officer to assess command: '{command}'")
+    SECURITY_ASSESSMENTS.labels(source="llm").inc()
+
+    security_prompt = (
+        "You are an AI Security Officer. Your only job is to determine if a shell command is safe to execute in the context of a user's request. "
+        "The command is considered 'SAFE' if it is not destructive (e.g., no `rm -rf`, `mv` on important files, `dd`), is not trying to access sensitive system files outside its workspace, and is directly related to the user's goal. "
+        "The command is 'UNSAFE' if it is destructive, tries to escalate privileges (`sudo`), or is clearly unrelated to the goal.\n\n"
+        f"User's Goal: \"{user_prompt}\"\n"
+        f"Command to Assess: \"{command}\"\n\n"
+        "Is this command SAFE or UNSAFE? Respond with ONLY the word SAFE or UNSAFE, followed by the reasoning."
+    )
+
+    messages = [{"role": "system", "content": security_prompt}]
+
+    response = await get_llm_response(
+        provider="mistral", model_name=settings.mistral_model, messages=messages,
+        temperature=0.0, max_tokens=50
+    )
+
+    parts = response.strip().split(None, 1)
+    label = parts[0].upper() if parts else ""
+    reasoning = parts[1] if len(parts) > 1 else ""
+    is_safe = label == "SAFE"
+    decision = SecurityDecision(is_safe=is_safe, reasoning=reasoning)
+
+    if is_safe:
+        logger.info(f"Security Officer approved command: '{command}'")
+    else:
+        logger.warning(f"Security Officer REJECTED command: '{command}'")
+
+    if label in ("SAFE", "UNSAFE"):
+        command_policy.remember_verdict(command, user_prompt, decision)
+    return decision
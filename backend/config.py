@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -13,5 +14,65 @@ class Settings(BaseSettings):
     collection_name: str = "project_memory"
     vault_root: str = os.path.join(os.path.dirname(__file__), '..', 'vault_data')
     database_file: str = "cockpit.db"
+    llm_http2: bool = True
+    llm_max_connections: int = 20
+    llm_max_keepalive_connections: int = 10
+    llm_keepalive_expiry: float = 30.0
+    llm_timeout: float = 300.0
+    llm_connect_timeout: float = 10.0
+    llm_stream_code_generation: bool = True
+    llm_cache_enabled: bool = True
+    data_dir: str = os.path.join(os.path.dirname(__file__), '..', 'data')
+    # None keeps the disk tier under data_dir; an empty string keeps the cache in memory only.
+    llm_cache_path: Optional[str] = None
+    llm_cache_memory_entries: int = 512
+    llm_cache_max_entries: int = 10000
+    llm_cache_ttl_seconds: float = 86400.0
+    security_verdict_cache_size: int = 4096
+    speculative_security_assessment: bool = True
+    max_parallel_steps: int = 4
+    memory_ingest_batch_size: int = 32
+    memory_ingest_flush_ms: float = 50.0
+    memory_ingest_queue_size: int = 256
+    memory_chunk_max_tokens: int = 256
+    memory_chunk_overlap_lines: int = 2
+    memory_context_token_budget: int = 1500
+    # None keeps the cache under data_dir; an empty string disables it.
+    embedding_cache_path: Optional[str] = None
+    memory_query_cache_size: int = 256
+    memory_result_cache_ttl_seconds: float = 30.0
+    memory_scope_to_session: bool = True
+    memory_hybrid_retrieval: bool = False
+    memory_filter_overfetch: int = 4
+    lucidus_ivf_min_facts: int = 200000
+    lucidus_ivf_nprobe: int = 8
+    embedding_workers: int = 1
+    embedding_torch_threads: int = 1
+    embedding_batch_max_items: int = 64
+    embedding_batch_max_ms: float = 5.0
+    embedding_backend: str = "torch"
+    embedding_onnx_int8_file: str = "onnx/model_quint8_avx2.onnx"
+    embedding_onnx_quantization: str = "avx2"
+    embedding_onnx_dir: str = "onnx_models"
+    db_group_commit_ms: float = 2.0
+    db_group_commit_max_requests: int = 256
+    chat_history_token_budget: int = 4000
+    chat_history_rollup_min_tokens: int = 1000
+    chat_history_summary_max_tokens: int = 512
+    sandbox_command_timeout: float = 300.0
+    sandbox_timeout_grace_seconds: float = 10.0
+    sandbox_output_head_bytes: int = 16384
+    sandbox_output_tail_bytes: int = 16384
+    sandbox_spill_max_bytes: int = 64 * 1024 * 1024
+    sandbox_spill_keep_files: int = 50
+    sandbox_progress_interval: float = 1.0
+    git_mirror_root: Optional[str] = None
+    git_mirror_refresh_seconds: float = 60.0
+    git_executor_workers: int = 4
+    file_index_compact_min_records: int = 256
+    file_list_max_entries: int = 1000
+    sandbox_max_workers: int = 32
+    sandbox_prewarm_workers: int = 1
+    sandbox_idle_seconds: float = 600.0
 
 settings = Settings()
@@ -1,14 +1,56 @@
+import asyncio
 import sqlite3
 import json
-from typing import List, Dict, Any
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
 
+from prometheus_client import Histogram
+
+from backend.chunking import estimate_tokens
 from backend.config import settings
 
+logger = logging.getLogger(__name__)
+
+HISTORY_GROUP_COMMIT_SIZE = Histogram(
+    "history_group_commit_requests", "History requests committed together in one transaction.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+SQLITE_MAX_ROWID = 2 ** 63 - 1
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+_local = threading.local()
+
 def get_db_connection():
-    conn = sqlite3.connect(settings.database_file)
-    conn.row_factory = sqlite3.Row
+    # One connection per thread and database file, reused across calls instead of reopened every time.
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(settings.database_file)
+    if conn is None:
+        conn = sqlite3.connect(settings.database_file)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        connections[settings.database_file] = conn
     return conn
 
+def close_db_connections():
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
+
 def create_tables():
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -28,44 +70,286 @@ def create_tables():
                 FOREIGN KEY (session_id) REFERENCES sessions (session_id)
             );
         """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_session ON chat_history (session_id, id);")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chat_summaries (
+                session_id TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                through_id INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (session_id) REFERENCES sessions (session_id)
+            );
+        """)
         conn.commit()
 
-def save_chat_history(session_id: str, history: List[Dict[str, Any]]):
+def _encode_content(content: Any) -> str:
+    return content if isinstance(content, str) else json.dumps(content)
+
+def is_summary_message(message: Dict[str, Any]) -> bool:
+    return message.get("role") == "system" and isinstance(message.get("content"), str) and message["content"].startswith(SUMMARY_PREFIX)
+
+def _append_rows(cursor, session_id: str, messages: List[Dict[str, Any]]):
+    # History is append-only: callers store the messages a turn added, never a reloaded window.
+    # The rolled-up summary lives in chat_summaries, so its synthetic message is never stored.
+    cursor.execute("INSERT OR IGNORE INTO sessions (session_id) VALUES (?)", (session_id,))
+    cursor.executemany(
+        "INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)",
+        [(session_id, entry["role"], _encode_content(entry["content"])) for entry in messages if not is_summary_message(entry)]
+    )
+
+def _decode_row(row) -> Dict[str, Any]:
+    raw = row["content"]
+    try:
+        parsed = json.loads(raw)
+    except json.JSONDecodeError:
+        parsed = raw
+    return {"role": row["role"], "content": parsed}
+
+def _load_rows(cursor, session_id: str) -> List[Dict[str, Any]]:
+    cursor.execute(
+        "SELECT role, content FROM chat_history WHERE session_id = ? ORDER BY id",
+        (session_id,)
+    )
+    return [_decode_row(row) for row in cursor.fetchall()]
+
+def _load_page_rows(cursor, session_id: str, limit: int, before_id: Optional[int] = None) -> Dict[str, Any]:
+    # Pages walk backwards from the newest message; next_before_id is None once the start is reached.
+    cursor.execute(
+        "SELECT id, role, content FROM chat_history WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+        (session_id, before_id if before_id is not None else SQLITE_MAX_ROWID, limit + 1)
+    )
+    rows = cursor.fetchall()
+    page = rows[:limit][::-1]
+    return {
+        "messages": [_decode_row(row) for row in page],
+        "next_before_id": page[0]["id"] if len(rows) > limit else None,
+    }
+
+def _summary_row(cursor, session_id: str):
+    return cursor.execute(
+        "SELECT content, through_id FROM chat_summaries WHERE session_id = ?", (session_id,)
+    ).fetchone()
+
+def _window_rows(cursor, session_id: str, token_budget: int) -> Dict[str, Any]:
+    # Newest-first scan that stops as soon as the budget is spent, so long sessions cost the same
+    # to load as short ones. Messages already covered by the rolled-up summary are never read.
+    summary = _summary_row(cursor, session_id)
+    summarized_through = summary["through_id"] if summary else 0
+    rows = cursor.execute(
+        "SELECT id, role, content FROM chat_history WHERE session_id = ? AND id > ? ORDER BY id DESC",
+        (session_id, summarized_through)
+    )
+    window, spent, overflow_id = [], 0, None
+    for row in rows:
+        tokens = estimate_tokens(row["content"])
+        if window and spent + tokens > token_budget:
+            overflow_id = row["id"]
+            break
+        window.append(row)
+        spent += tokens
+    return {
+        "summary": summary["content"] if summary else None,
+        "summarized_through": summarized_through,
+        "messages": [_decode_row(row) for row in reversed(window)],
+        "tokens": spent,
+        "overflow_through_id": overflow_id,
+    }
+
+def _window_messages(window: Dict[str, Any]) -> List[Dict[str, Any]]:
+    messages = window["messages"]
+    if window["summary"]:
+        messages = [{"role": "system", "content": f"{SUMMARY_PREFIX}{window['summary']}"}] + messages
+    return messages
+
+def _rollup_rows(cursor, session_id: str, token_budget: int) -> Optional[Dict[str, Any]]:
+    # Messages that fell out of the window but are not yet part of the summary.
+    window = _window_rows(cursor, session_id, token_budget)
+    if window["overflow_through_id"] is None:
+        return None
+    rows = cursor.execute(
+        "SELECT id, role, content FROM chat_history WHERE session_id = ? AND id > ? AND id <= ? ORDER BY id",
+        (session_id, window["summarized_through"], window["overflow_through_id"])
+    ).fetchall()
+    return {
+        "summary": window["summary"],
+        "messages": [_decode_row(row) for row in rows],
+        "tokens": sum(estimate_tokens(row["content"]) for row in rows),
+        "through_id": window["overflow_through_id"],
+    }
+
+def _save_summary_row(cursor, session_id: str, content: str, through_id: int):
+    cursor.execute("INSERT OR IGNORE INTO sessions (session_id) VALUES (?)", (session_id,))
+    cursor.execute(
+        "INSERT INTO chat_summaries (session_id, content, through_id) VALUES (?, ?, ?) "
+        "ON CONFLICT(session_id) DO UPDATE SET content = excluded.content, through_id = excluded.through_id, "
+        "updated_at = CURRENT_TIMESTAMP WHERE excluded.through_id > chat_summaries.through_id",
+        (session_id, content, through_id)
+    )
+
+def _clear_rows(cursor, session_id: str):
+    cursor.execute("DELETE FROM chat_history WHERE session_id = ?", (session_id,))
+    cursor.execute("DELETE FROM chat_summaries WHERE session_id = ?", (session_id,))
+    cursor.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+def append_chat_messages(session_id: str, messages: List[Dict[str, Any]]):
+    if not messages:
+        return
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("INSERT OR IGNORE INTO sessions (session_id) VALUES (?)", (session_id,))
-        cursor.execute("DELETE FROM chat_history WHERE session_id = ?", (session_id,))
-        for entry in history:
-            content = entry["content"]
-            if not isinstance(content, str):
-                content = json.dumps(content)
-            cursor.execute(
-                "INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)",
-                (session_id, entry["role"], content)
-            )
+        _append_rows(conn.cursor(), session_id, messages)
         conn.commit()
 
-def load_chat_history(session_id: str) -> List[Dict[str, Any]]:
+def load_chat_history(session_id: str, limit: Optional[int] = None, before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    if limit is not None:
+        return load_chat_page(session_id, limit, before_id)["messages"]
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT role, content FROM chat_history WHERE session_id = ? ORDER BY timestamp",
-            (session_id,)
-        )
-        rows = cursor.fetchall()
-        history = []
-        for row in rows:
-            raw = row["content"]
-            try:
-                parsed = json.loads(raw)
-            except json.JSONDecodeError:
-                parsed = raw
-            history.append({"role": row["role"], "content": parsed})
-        return history
+        return _load_rows(conn.cursor(), session_id)
+
+def load_chat_page(session_id: str, limit: int, before_id: Optional[int] = None) -> Dict[str, Any]:
+    with get_db_connection() as conn:
+        return _load_page_rows(conn.cursor(), session_id, limit, before_id)
+
+def load_chat_window(session_id: str, token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+    token_budget = settings.chat_history_token_budget if token_budget is None else token_budget
+    with get_db_connection() as conn:
+        return _window_messages(_window_rows(conn.cursor(), session_id, token_budget))
+
+def load_chat_rollup(session_id: str, token_budget: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    token_budget = settings.chat_history_token_budget if token_budget is None else token_budget
+    with get_db_connection() as conn:
+        return _rollup_rows(conn.cursor(), session_id, token_budget)
+
+def save_chat_summary(session_id: str, content: str, through_id: int):
+    with get_db_connection() as conn:
+        _save_summary_row(conn.cursor(), session_id, content, through_id)
+        conn.commit()
 
 def clear_session_history(session_id: str):
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM chat_history WHERE session_id = ?", (session_id,))
-        cursor.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        _clear_rows(conn.cursor(), session_id)
         conn.commit()
+
+class AsyncHistoryStore:
+    # Runs every history operation on one dedicated thread so coroutines never block on SQLite.
+    # Requests that arrive within db_group_commit_ms of each other share a single transaction.
+    def __init__(self):
+        self._requests: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="history-db", daemon=True)
+                    self._thread.start()
+
+    async def _submit(self, operation: Callable, *args) -> Any:
+        self._ensure_thread()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._requests.put((operation, args, loop, future))
+        return await future
+
+    def _next_batch(self) -> List[tuple]:
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + settings.db_group_commit_ms / 1000.0
+        while batch[-1] is not None and len(batch) < settings.db_group_commit_max_requests:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            requests = [item for item in batch if item is not None]
+            if requests:
+                try:
+                    self._execute(requests)
+                except Exception as e:
+                    logger.error(f"History database thread failed to run {len(requests)} request(s): {e}", exc_info=True)
+                    for _, _, loop, future in requests:
+                        _deliver(loop, future, False, e)
+            if stop:
+                close_db_connections()
+                return
+
+    def _execute(self, requests: List[tuple]):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        outcomes = []
+        # An explicit BEGIN makes the per-request savepoints nest inside one transaction; a bare
+        # outermost SAVEPOINT would commit on RELEASE.
+        if not conn.in_transaction:
+            cursor.execute("BEGIN")
+        for operation, args, loop, future in requests:
+            # A savepoint per request keeps one failing request from rolling back the rest of the group.
+            cursor.execute("SAVEPOINT request")
+            try:
+                outcomes.append((loop, future, True, operation(cursor, *args)))
+                cursor.execute("RELEASE request")
+            except Exception as e:
+                cursor.execute("ROLLBACK TO request")
+                cursor.execute("RELEASE request")
+                outcomes.append((loop, future, False, e))
+        try:
+            conn.commit()
+            HISTORY_GROUP_COMMIT_SIZE.observe(len(requests))
+        except sqlite3.Error as e:
+            logger.error(f"Group commit of {len(requests)} history request(s) failed: {e}")
+            conn.rollback()
+            outcomes = [(loop, future, False, e) for loop, future, _, _ in outcomes]
+        for loop, future, ok, value in outcomes:
+            _deliver(loop, future, ok, value)
+
+    def shutdown(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._requests.put(None)
+            self._thread.join()
+        self._thread = None
+
+def _deliver(loop: asyncio.AbstractEventLoop, future: asyncio.Future, ok: bool, value: Any):
+    try:
+        loop.call_soon_threadsafe(_resolve, future, ok, value)
+    except RuntimeError:
+        # The caller's loop has already closed; nobody is waiting for this result.
+        pass
+
+def _resolve(future: asyncio.Future, ok: bool, value: Any):
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
+
+history_store = AsyncHistoryStore()
+
+async def aload_chat_history(session_id: str, limit: Optional[int] = None, before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    if limit is not None:
+        return (await aload_chat_page(session_id, limit, before_id))["messages"]
+    return await history_store._submit(_load_rows, session_id)
+
+async def aload_chat_page(session_id: str, limit: int, before_id: Optional[int] = None) -> Dict[str, Any]:
+    return await history_store._submit(_load_page_rows, session_id, limit, before_id)
+
+async def aload_chat_window(session_id: str, token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+    token_budget = settings.chat_history_token_budget if token_budget is None else token_budget
+    return _window_messages(await history_store._submit(_window_rows, session_id, token_budget))
+
+async def aload_chat_rollup(session_id: str, token_budget: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    token_budget = settings.chat_history_token_budget if token_budget is None else token_budget
+    return await history_store._submit(_rollup_rows, session_id, token_budget)
+
+async def asave_chat_summary(session_id: str, content: str, through_id: int):
+    await history_store._submit(_save_summary_row, session_id, content, through_id)
+
+async def aappend_chat_messages(session_id: str, messages: List[Dict[str, Any]]):
+    if messages:
+        await history_store._submit(_append_rows, session_id, list(messages))
+
+async def aclear_session_history(session_id: str):
+    await history_store._submit(_clear_rows, session_id)
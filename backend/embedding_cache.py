@@ -0,0 +1,95 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from prometheus_client import Counter
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_HITS = Counter("embedding_cache_hits_total", "Embeddings served from the persistent embedding cache.")
+EMBEDDING_CACHE_MISSES = Counter("embedding_cache_misses_total", "Embeddings that had to be computed by the model.")
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._conn is None:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS embeddings (
+                        model TEXT NOT NULL,
+                        text_hash TEXT NOT NULL,
+                        vector BLOB NOT NULL,
+                        PRIMARY KEY (model, text_hash)
+                    );
+                """)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Could not open embedding cache at '{self.path}', embeddings will not be cached: {e}")
+                self.path = None
+                self._conn = None
+        return self._conn
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None or not hashes:
+                return found
+            unique = list(dict.fromkeys(hashes))
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+                for digest, blob in rows:
+                    found[digest] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, items: Iterable[tuple]):
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, digest, np.asarray(vector, dtype=np.float32).tobytes()) for digest, vector in items]
+            )
+            conn.commit()
+
+    def encode(self, model_name: str, texts: List[str], encode_fn) -> np.ndarray:
+        hashes = [text_hash(t) for t in texts]
+        cached = self.get_many(model_name, hashes)
+        missing = [i for i, digest in enumerate(hashes) if digest not in cached]
+        EMBEDDING_CACHE_HITS.inc(len(texts) - len(missing))
+        EMBEDDING_CACHE_MISSES.inc(len(missing))
+        if missing:
+            computed = np.asarray(encode_fn([texts[i] for i in missing]), dtype=np.float32)
+            for i, vector in zip(missing, computed):
+                cached[hashes[i]] = vector
+            self.put_many(model_name, [(hashes[i], vector) for i, vector in zip(missing, computed)])
+        return np.stack([cached[digest] for digest in hashes]) if texts else np.zeros((0, 0), dtype=np.float32)
+
+embedding_cache = EmbeddingCache(
+    os.path.join(settings.data_dir, "embedding_cache.db") if settings.embedding_cache_path is None else settings.embedding_cache_path or None
+)
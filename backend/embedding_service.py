@@ -0,0 +1,245 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import re
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingUnavailable(RuntimeError):
+    pass
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+def _onnx_int8_file() -> str:
+    return f"onnx/model_qint8_{settings.embedding_onnx_quantization}.onnx"
+
+def load_sentence_transformer(model_name: str, backend: str = "torch"):
+    # Imported here so that importing the backend never pulls in torch.
+    from sentence_transformers import SentenceTransformer
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+    if backend != "onnx-int8":
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {', '.join(EMBEDDING_BACKENDS)}.")
+
+    try:
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": settings.embedding_onnx_int8_file})
+    except Exception as e:
+        logger.info(f"No prebuilt int8 ONNX file for '{model_name}' ({e}), quantizing it locally.")
+    # Models without a published int8 file are quantized once into embedding_onnx_dir and reused.
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    local_dir = Path(settings.embedding_onnx_dir) / re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+    if not (local_dir / _onnx_int8_file()).exists():
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save_pretrained(str(local_dir))
+        export_dynamic_quantized_onnx_model(model, settings.embedding_onnx_quantization, str(local_dir))
+    return SentenceTransformer(str(local_dir), backend="onnx", model_kwargs={"file_name": _onnx_int8_file()})
+
+def embedding_cache_key(model_name: str, backend: str) -> str:
+    # Quantized or exported models produce slightly different vectors, so they never share cached ones.
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+def _to_float32(vectors) -> np.ndarray:
+    if hasattr(vectors, "detach"):
+        vectors = vectors.detach().cpu().numpy()
+    return np.asarray(vectors, dtype=np.float32)
+
+# State of a pool worker process; each worker loads its own copy of the model once.
+_worker_model = None
+_worker_error: Optional[str] = None
+
+def _init_worker(model_name: str, factory: Callable[[str], Any], torch_threads: int):
+    global _worker_model, _worker_error
+    try:
+        if torch_threads > 0:
+            import torch
+            torch.set_num_threads(torch_threads)
+        _worker_model = factory(model_name)
+    except Exception as e:
+        _worker_error = f"Could not load embedding model '{model_name}' in worker: {e}"
+
+def _worker_encode(texts: List[str]) -> np.ndarray:
+    if _worker_model is None:
+        raise EmbeddingUnavailable(_worker_error or "Embedding worker has no model.")
+    return _to_float32(_worker_model.encode(texts))
+
+class EmbeddingService:
+    def __init__(
+        self, model_name: str, factory: Optional[Callable[[str], Any]] = None, workers: Optional[int] = None,
+        backend: Optional[str] = None
+    ):
+        self.model_name = model_name
+        self.backend = backend or settings.embedding_backend
+        self.cache_key = embedding_cache_key(model_name, self.backend)
+        self.workers = settings.embedding_workers if workers is None else workers
+        # A partial of a module-level function stays picklable, so it can be sent to spawned workers.
+        self._factory = factory or functools.partial(load_sentence_transformer, backend=self.backend)
+        self._model = None
+        self._failed = False
+        self._lock = threading.Lock()
+        self._pool: Optional[Executor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._dispatching = set()
+
+    @property
+    def model(self):
+        # The in-process model; with a worker pool the model lives in the workers instead.
+        if self.workers > 0:
+            return None
+        if self._model is None and not self._failed:
+            with self._lock:
+                if self._model is None and not self._failed:
+                    started = time.perf_counter()
+                    try:
+                        self._model = self._factory(self.model_name)
+                        logger.info(f"Loaded {self.backend} embedding model '{self.model_name}' in {time.perf_counter() - started:.2f}s.")
+                    except Exception as e:
+                        logger.error(f"Could not load embedding model '{self.model_name}': {e}")
+                        self._failed = True
+        return self._model
+
+    @property
+    def available(self) -> bool:
+        if self.workers > 0:
+            return not self._failed
+        return self.model is not None
+
+    def _executor(self) -> Executor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.workers > 0:
+                        # spawn, not fork: forking a process that already runs threads (or torch) is unsafe.
+                        self._pool = ProcessPoolExecutor(
+                            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                            initializer=_init_worker,
+                            initargs=(self.model_name, self._factory, settings.embedding_torch_threads)
+                        )
+                        logger.info(f"Started {self.workers} embedding worker process(es) for '{self.model_name}'.")
+                    else:
+                        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        return self._pool
+
+    def _unavailable(self) -> EmbeddingUnavailable:
+        return EmbeddingUnavailable(f"Embedding model '{self.model_name}' is not available.")
+
+    def _encode_local(self, texts: List[str]) -> np.ndarray:
+        model = self.model
+        if model is None:
+            raise self._unavailable()
+        return _to_float32(model.encode(texts))
+
+    def encode(self, texts):
+        # Synchronous encode for callers already off the event loop (e.g. the memory ingest thread).
+        if self.workers <= 0:
+            model = self.model
+            if model is None:
+                raise self._unavailable()
+            return model.encode(texts)
+        if self._failed:
+            raise self._unavailable()
+        single = isinstance(texts, str)
+        try:
+            vectors = self._executor().submit(_worker_encode, [texts] if single else list(texts)).result()
+        except EmbeddingUnavailable:
+            self._failed = True
+            raise
+        return vectors[0] if single else vectors
+
+    def _ensure_batcher(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._queue_loop is not loop:
+            self._queue = asyncio.Queue()
+            self._queue_loop = loop
+            self._batcher = None
+        if self._batcher is None or self._batcher.done():
+            self._batcher = loop.create_task(self._run_batcher(self._queue))
+        return self._queue
+
+    async def encode_many(self, texts: List[str]) -> np.ndarray:
+        # Concurrent callers are coalesced into one model call of up to embedding_batch_max_items texts.
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        future = asyncio.get_running_loop().create_future()
+        await self._ensure_batcher().put((list(texts), future))
+        return await future
+
+    async def _run_batcher(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        in_flight = asyncio.Semaphore(max(1, self.workers))
+        while True:
+            batch = [await queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + settings.embedding_batch_max_ms / 1000.0
+            while size < settings.embedding_batch_max_items:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            await in_flight.acquire()
+            task = loop.create_task(self._dispatch(batch, in_flight))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+
+    async def _dispatch(self, batch: List[Tuple[List[str], asyncio.Future]], in_flight: asyncio.Semaphore):
+        loop = asyncio.get_running_loop()
+        try:
+            if self._failed:
+                raise self._unavailable()
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            encode = _worker_encode if self.workers > 0 else self._encode_local
+            try:
+                vectors = await loop.run_in_executor(self._executor(), encode, texts)
+            except EmbeddingUnavailable:
+                self._failed = True
+                raise
+            offset = 0
+            for item_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            in_flight.release()
+
+    def shutdown(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+_services: Dict[str, EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+def get_embedding_service(model_name: Optional[str] = None) -> EmbeddingService:
+    model_name = model_name or settings.embedding_model
+    with _services_lock:
+        service = _services.get(model_name)
+        if service is None:
+            service = _services[model_name] = EmbeddingService(model_name)
+        return service
+
+embedding_service = get_embedding_service()
@@ -0,0 +1,204 @@
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR_NAME = ".index"
+LOG_NAME = "files.jsonl"
+# Spilled execute_script output lives in the vault but is not a session file.
+SPILL_DIR_NAME = ".outputs"
+SKIPPED_DIRS = {".git", INDEX_DIR_NAME, SPILL_DIR_NAME}
+
+class FileEntry(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    sha256: str
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class SessionFileIndex:
+    # Path -> (size, mtime, sha256) for every file in one session vault. Changes are appended to a
+    # JSON-lines log as the tools make them, so reading the index never walks the filesystem.
+    # Shell commands can touch anything, so execute_script only marks the index dirty and the next
+    # listing reconciles it against the disk, re-hashing just the files whose size or mtime moved.
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.log_path = self.root / INDEX_DIR_NAME / LOG_NAME
+        self._entries: Dict[str, FileEntry] = {}
+        self._dirty = False
+        self._log_records = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not self.log_path.exists():
+            # No log yet (new session, or a vault from before the index existed): start from a scan.
+            self._dirty = self.root.exists()
+            return
+        with self.log_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    self._apply(json.loads(line))
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    # A torn final line from a crash mid-append, or a malformed record; everything else
+                    # is intact and the next listing rescans whatever that record described.
+                    logger.warning(f"Skipping unreadable file index record in '{self.log_path}'.")
+                    self._dirty = True
+                    continue
+                self._log_records += 1
+
+    def _apply(self, record: Dict):
+        op = record["op"]
+        if op == "put":
+            self._entries[record["path"]] = FileEntry(record["path"], record["size"], record["mtime"], record["sha256"])
+        elif op == "del":
+            self._entries.pop(record["path"], None)
+        elif op == "dirty":
+            self._dirty = True
+        elif op == "clean":
+            self._dirty = False
+
+    def _append(self, records: List[Dict]):
+        if not records:
+            return
+        for record in records:
+            self._apply(record)
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.log_path.open("a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+        self._log_records += len(records)
+        if self._log_records > max(settings.file_index_compact_min_records, 2 * len(self._entries)):
+            self.compact()
+
+    def _relative(self, path: Path) -> str:
+        return Path(os.path.relpath(path, self.root)).as_posix()
+
+    def _put_record(self, path: Path, sha256: Optional[str] = None) -> Dict:
+        stat = path.stat()
+        return {
+            "op": "put", "path": self._relative(path), "size": stat.st_size, "mtime": stat.st_mtime,
+            "sha256": sha256 or _hash_file(path),
+        }
+
+    def record(self, path: Path, content: Optional[bytes] = None) -> FileEntry:
+        # Callers that just wrote the file pass its bytes, which saves reading it back to hash it.
+        sha256 = hashlib.sha256(content).hexdigest() if content is not None else None
+        with self._lock:
+            record = self._put_record(Path(path), sha256)
+            self._append([record])
+            return self._entries[record["path"]]
+
+    def remove(self, path: Path):
+        with self._lock:
+            relative = self._relative(Path(path))
+            if relative in self._entries:
+                self._append([{"op": "del", "path": relative}])
+
+    def record_tree(self, directory: Path):
+        with self._lock:
+            self._append(self._reconcile_records(Path(directory)))
+
+    def mark_dirty(self):
+        with self._lock:
+            if not self._dirty:
+                self._append([{"op": "dirty"}])
+
+    def _walk(self, directory: Path) -> Iterable[Tuple[str, os.stat_result]]:
+        # One relpath per directory, not per file: on a large tree it would dominate the walk.
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [name for name in dirnames if name not in SKIPPED_DIRS]
+            relative_dir = self._relative(Path(dirpath))
+            prefix = "" if relative_dir == "." else relative_dir + "/"
+            for name in filenames:
+                try:
+                    yield prefix + name, os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+
+    def _reconcile_records(self, directory: Path) -> List[Dict]:
+        relative_dir = self._relative(directory)
+        prefix = "" if relative_dir == "." else relative_dir + "/"
+        seen, records = set(), []
+        for relative, stat in self._walk(directory):
+            seen.add(relative)
+            known = self._entries.get(relative)
+            if known is None or known.size != stat.st_size or known.mtime != stat.st_mtime:
+                try:
+                    records.append(self._put_record(self.root / relative))
+                except OSError:
+                    seen.discard(relative)
+        records.extend(
+            {"op": "del", "path": relative} for relative in self._entries
+            if relative.startswith(prefix) and relative not in seen
+        )
+        return records
+
+    def refresh(self):
+        with self._lock:
+            if self._dirty:
+                records = self._reconcile_records(self.root) if self.root.exists() else []
+                self._append(records + [{"op": "clean"}])
+
+    def list(self, prefix: str = "", pattern: Optional[str] = None, recursive: bool = True) -> List[FileEntry]:
+        self.refresh()
+        prefix = prefix.strip("/")
+        prefix = f"{prefix}/" if prefix and prefix != "." else ""
+        with self._lock:
+            entries = [entry for path, entry in self._entries.items() if path.startswith(prefix)]
+        if not recursive:
+            entries = [entry for entry in entries if "/" not in entry.path[len(prefix):]]
+        if pattern:
+            entries = [
+                entry for entry in entries
+                if fnmatch.fnmatch(entry.path, pattern) or fnmatch.fnmatch(entry.path.rsplit("/", 1)[-1], pattern)
+            ]
+        return sorted(entries, key=lambda entry: entry.path)
+
+    def compact(self):
+        # The live entries become the whole log, written beside it and swapped in atomically.
+        with self._lock:
+            temporary = self.log_path.with_suffix(".tmp")
+            records = [{"op": "put", **entry._asdict()} for entry in self._entries.values()]
+            if self._dirty:
+                records.append({"op": "dirty"})
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with temporary.open("w", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.log_path)
+            self._log_records = len(records)
+            logger.info(f"Compacted file index '{self.log_path}' to {len(records)} records.")
+
+class FileIndexRegistry:
+    def __init__(self):
+        self._indexes: Dict[str, SessionFileIndex] = {}
+        self._lock = threading.Lock()
+
+    def for_session(self, session_vault_path: Path) -> SessionFileIndex:
+        key = os.path.realpath(session_vault_path)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = SessionFileIndex(Path(session_vault_path))
+            return index
+
+    def forget(self, session_vault_path: Path):
+        with self._lock:
+            self._indexes.pop(os.path.realpath(session_vault_path), None)
+
+file_indexes = FileIndexRegistry()
@@ -0,0 +1,220 @@
+import asyncio
+import fcntl
+import functools
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import git
+from git.exc import UnsafeOptionError
+from prometheus_client import Counter, Histogram
+
+from backend.config import settings
+from backend.vault import VAULT_ROOT
+
+logger = logging.getLogger(__name__)
+
+GIT_MIRROR_EVENTS = Counter("git_mirror_events_total", "Mirror cache activity for git_clone.", ["event"])
+GIT_OPERATION_SECONDS = Histogram(
+    "git_operation_seconds", "Time git tool operations spend on the git executor.", ["operation"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+GIT_LOCK_WAIT_SECONDS = Histogram(
+    "git_repo_lock_wait_seconds", "Time git tool calls waited for another operation on the same repository.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+def check_clone_url(url: str):
+    # The raw git calls below skip GitPython's clone_from checks, so they are applied here: no
+    # ext:: or other command-running transports, and nothing git could parse as an option.
+    git.Git.check_unsafe_protocols(url)
+    if url.strip().startswith("-"):
+        raise UnsafeOptionError(f"Repository URL '{url}' looks like a git option.")
+
+class MirrorCache:
+    # Bare mirrors of every cloned remote live under one directory. Session clones are made from the
+    # local mirror (copied objects, or a file:// transfer for shallow and sparse clones), so the
+    # network is only touched to create a mirror or to fetch what changed since the last refresh.
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def mirror_path(self, url: str) -> Path:
+        normalized = url.strip().rstrip("/")
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", normalized.split("/")[-1].removesuffix(".git"))[:48] or "repo"
+        return self.root / f"{name}-{hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]}.git"
+
+    @contextmanager
+    def _locked(self, mirror: Path) -> Iterator[None]:
+        # The thread lock orders callers in this process; the file lock orders other worker processes.
+        with self._locks_guard:
+            lock = self._locks.setdefault(str(mirror), threading.Lock())
+        with lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(f"{mirror}.lock", "w") as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def ensure_mirror(self, url: str) -> Path:
+        check_clone_url(url)
+        mirror = self.mirror_path(url)
+        with self._locked(mirror):
+            if not mirror.exists():
+                self._create_mirror(url, mirror)
+            elif time.time() - self._fetched_at(mirror) >= settings.git_mirror_refresh_seconds:
+                logger.info(f"Refreshing git mirror '{mirror.name}' from '{url}'.")
+                git.Git(str(mirror)).fetch("--prune", "origin")
+                self._touch(mirror)
+                GIT_MIRROR_EVENTS.labels(event="fetch").inc()
+            else:
+                GIT_MIRROR_EVENTS.labels(event="fresh").inc()
+        return mirror
+
+    def _create_mirror(self, url: str, mirror: Path):
+        logger.info(f"Creating git mirror '{mirror.name}' for '{url}'.")
+        partial = mirror.with_name(f".{mirror.name}.{uuid.uuid4().hex[:8]}.partial")
+        try:
+            git.Git().clone("--mirror", "--", url, str(partial))
+            mirror_git = git.Git(str(partial))
+            # Shallow and sparse session clones are served from the mirror over file://.
+            mirror_git.config("uploadpack.allowFilter", "true")
+            mirror_git.config("uploadpack.allowAnySHA1InWant", "true")
+            os.replace(partial, mirror)
+        finally:
+            shutil.rmtree(partial, ignore_errors=True)
+        self._touch(mirror)
+        GIT_MIRROR_EVENTS.labels(event="create").inc()
+
+    @staticmethod
+    def _fetched_at(mirror: Path) -> float:
+        try:
+            return (mirror / "mirror-fetched").stat().st_mtime
+        except OSError:
+            return 0.0
+
+    @staticmethod
+    def _touch(mirror: Path):
+        (mirror / "mirror-fetched").touch()
+
+    def clone(
+        self, url: str, destination: Path, branch: Optional[str] = None, depth: Optional[int] = None,
+        sparse_paths: Optional[List[str]] = None,
+    ) -> git.Repo:
+        mirror = self.ensure_mirror(url)
+        options = []
+        if branch:
+            options += ["--branch", branch]
+        if depth:
+            options += ["--depth", str(depth)]
+        if sparse_paths:
+            options += ["--filter=blob:none", "--sparse"]
+        if not depth and not sparse_paths:
+            # Sandboxed commands run as namespace root and could rewrite hardlinked object files,
+            # poisoning the shared mirror for every session, so the local clone copies them instead.
+            options += ["--no-hardlinks"]
+        # --depth and --filter need a real transport rather than a plain path.
+        source = mirror.resolve().as_uri() if depth or sparse_paths else str(mirror)
+
+        # Cloned into a scratch name and renamed, so a failed attempt never leaves a half-made
+        # directory behind for the retry to trip over.
+        partial = destination.with_name(f".{destination.name}.{uuid.uuid4().hex[:8]}.partial")
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            repo = git.Repo.clone_from(source, str(partial), multi_options=options)
+            if sparse_paths:
+                # Run while origin still points at the mirror, so the missing blobs come from it.
+                repo.git.sparse_checkout("set", *sparse_paths)
+            repo.git.remote("set-url", "origin", url)
+            os.rename(partial, destination)
+        finally:
+            shutil.rmtree(partial, ignore_errors=True)
+        GIT_MIRROR_EVENTS.labels(event="clone").inc()
+        return git.Repo(str(destination))
+
+def repository_root(path, boundary) -> Path:
+    # A commit may name any directory inside a clone, so it locks on the clone's top level, the same
+    # key the clone itself used. The search never leaves the session vault.
+    path, boundary = Path(os.path.realpath(path)), Path(os.path.realpath(boundary))
+    for candidate in (path, *path.parents):
+        if boundary not in candidate.parents:
+            break
+        if (candidate / ".git").exists():
+            return candidate
+    return path
+
+class GitRunner:
+    # GitPython calls block, so they run on a small dedicated thread pool. Operations on one
+    # repository path queue behind an asyncio lock (a session's clone, then its commit), while
+    # different repositories proceed in parallel up to git_executor_workers.
+    def __init__(self):
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_guard = threading.Lock()
+        self._locks: Dict[str, List] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_guard:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=settings.git_executor_workers, thread_name_prefix="git")
+        return self._pool
+
+    @asynccontextmanager
+    async def locked(self, repo_path) -> AsyncIterator[None]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # asyncio locks belong to the loop they were first awaited on.
+            self._locks = {}
+            self._loop = loop
+        key = os.path.realpath(repo_path)
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        started = time.perf_counter()
+        try:
+            async with entry[0]:
+                GIT_LOCK_WAIT_SECONDS.observe(time.perf_counter() - started)
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._locks.get(key) is entry:
+                del self._locks[key]
+
+    async def run(self, operation: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().run_in_executor(self._executor(), functools.partial(func, *args, **kwargs))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The thread cannot be stopped, so a cancelled caller (and the repository lock it holds)
+            # waits for git to finish before the cancellation propagates.
+            while not future.done():
+                try:
+                    await asyncio.wait({future})
+                except asyncio.CancelledError:
+                    pass
+            if not future.cancelled():
+                future.exception()
+            raise
+        finally:
+            GIT_OPERATION_SECONDS.labels(operation=operation).observe(time.perf_counter() - started)
+
+    def shutdown(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+git_mirrors = MirrorCache(settings.git_mirror_root or os.path.join(VAULT_ROOT, ".git-mirrors"))
+git_runner = GitRunner()
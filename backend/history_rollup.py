@@ -0,0 +1,52 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from backend.chunking import estimate_tokens
+from backend.config import settings
+from backend.database import aload_chat_rollup, aload_chat_window, asave_chat_summary
+from backend.llm_client import get_llm_response
+
+logger = logging.getLogger(__name__)
+
+def _transcript(messages: List[Dict[str, Any]], max_tokens_per_message: int = 400) -> str:
+    lines = []
+    for message in messages:
+        content = message["content"] if isinstance(message["content"], str) else json.dumps(message["content"])
+        if estimate_tokens(content) > max_tokens_per_message:
+            # Plans and tool output can be huge; their opening is what the summary needs.
+            content = content[:max_tokens_per_message * 4] + " [...]"
+        lines.append(f"{message['role']}: {content}")
+    return "\n".join(lines)
+
+async def summarize_messages(previous_summary: Optional[str], messages: List[Dict[str, Any]]) -> Optional[str]:
+    system_prompt = (
+        "You maintain a running summary of a conversation between a user and a coding agent. "
+        "Merge the existing summary with the new messages into one concise summary. Keep the user's goals, "
+        "decisions, file names, commands and unresolved errors; drop pleasantries and verbatim output. "
+        "Reply with the summary text only."
+    )
+    user_prompt = (
+        f"EXISTING SUMMARY:\n{previous_summary or 'None.'}\n\n"
+        f"NEW MESSAGES:\n{_transcript(messages)}"
+    )
+    response = await get_llm_response(
+        provider="mistral", model_name=settings.mistral_model,
+        messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+        temperature=0.0, top_p=1.0, max_tokens=settings.chat_history_summary_max_tokens
+    )
+    if not response or response.startswith(("API_ERROR", "APP_ERROR")):
+        logger.warning(f"Could not summarize {len(messages)} older chat messages: {response}")
+        return None
+    return response.strip()
+
+async def load_history_window(session_id: str, token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+    # Folds messages that no longer fit the token budget into the session summary once enough of
+    # them have piled up, then returns the summary followed by the most recent messages.
+    rollup = await aload_chat_rollup(session_id, token_budget)
+    if rollup is not None and rollup["tokens"] >= settings.chat_history_rollup_min_tokens:
+        summary = await summarize_messages(rollup["summary"], rollup["messages"])
+        if summary:
+            await asave_chat_summary(session_id, summary, rollup["through_id"])
+            logger.info(f"Rolled {len(rollup['messages'])} older messages of session '{session_id}' into its summary.")
+    return await aload_chat_window(session_id, token_budget)
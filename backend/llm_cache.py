@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_HITS = Counter("llm_cache_hits_total", "LLM responses served from the response cache.", ["tier"])
+LLM_CACHE_MISSES = Counter("llm_cache_misses_total", "Deterministic LLM calls that missed the response cache.")
+
+def make_cache_key(
+    provider: str, model_name: str, messages: List[Dict[str, Any]], temperature: float,
+    top_p: Optional[float], max_tokens: Optional[int], stop_tokens: Optional[List[str]],
+) -> str:
+    material = json.dumps(
+        {
+            "provider": provider.lower(), "model": model_name, "messages": messages,
+            "temperature": temperature, "top_p": top_p, "max_tokens": max_tokens, "stop": stop_tokens or [],
+        },
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    # An in-memory LRU in front of a SQLite table. The async entry points used by the LLM client
+    # answer memory hits inline and run every SQLite read and write on a worker thread, so the
+    # event loop never waits on the disk; _disk_lock serializes those threads on the one connection.
+    def __init__(self, path: Optional[str], max_memory_entries: int, max_disk_entries: int, ttl_seconds: float):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_trim = 0
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._conn is None:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_cache (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL
+                    );
+                """)
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+                self._conn.commit()
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"Could not open LLM response cache at '{self.path}', using memory only: {e}")
+                self.path = None
+                self._conn = None
+        return self._conn
+
+    def _remember(self, key: str, expires_at: float, value: str):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.hits["memory"] += 1
+            LLM_CACHE_HITS.labels(tier="memory").inc()
+            return entry[1]
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        with self._disk_lock:
+            conn = self._get_conn()
+            if conn is not None:
+                try:
+                    row = conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                    if row is not None and row[1] > now:
+                        conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                        conn.commit()
+                        with self._lock:
+                            self._remember(key, row[1], row[0])
+                            self.hits["disk"] += 1
+                        LLM_CACHE_HITS.labels(tier="disk").inc()
+                        return row[0]
+                except sqlite3.Error as e:
+                    logger.warning(f"LLM response cache lookup failed: {e}")
+        with self._lock:
+            self.misses += 1
+        LLM_CACHE_MISSES.inc()
+        return None
+
+    def _disk_set(self, key: str, value: str, expires_at: float, now: float):
+        with self._disk_lock:
+            conn = self._get_conn()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, expires_at, now)
+                )
+                self._writes_since_trim += 1
+                if self._writes_since_trim >= 100:
+                    self._trim(conn, now)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"LLM response cache write failed: {e}")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        value = self._memory_get(key, now)
+        return value if value is not None else self._disk_get(key, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is not None:
+            return value
+        if not self.path:
+            # Memory only: nothing to read, this just records the miss.
+            return self._disk_get(key, now)
+        return await asyncio.to_thread(self._disk_get, key, now)
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, value)
+        self._disk_set(key, value, expires_at, now)
+
+    async def aset(self, key: str, value: str):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, value)
+        if self.path:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at, now)
+
+    def _trim(self, conn: sqlite3.Connection, now: float):
+        self._writes_since_trim = 0
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        with self._disk_lock:
+            conn = self._get_conn()
+            if conn is not None:
+                conn.execute("DELETE FROM llm_cache")
+                conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return {"memory_hits": self.hits["memory"], "disk_hits": self.hits["disk"], "misses": self.misses}
+
+response_cache = ResponseCache(
+    path=os.path.join(settings.data_dir, "llm_cache.db") if settings.llm_cache_path is None else settings.llm_cache_path or None,
+    max_memory_entries=settings.llm_cache_memory_entries,
+    max_disk_entries=settings.llm_cache_max_entries,
+    ttl_seconds=settings.llm_cache_ttl_seconds,
+)
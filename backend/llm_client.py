@@ -1,20 +1,46 @@
-import os
+import json
+import time
+import asyncio
+import functools
 import httpx
 import logging
 import tiktoken
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
+from prometheus_client import Histogram
 
 from backend.config import settings
+from backend.llm_cache import make_cache_key, response_cache
 
 logger = logging.getLogger(__name__)
-try:
-    tokenizer = tiktoken.get_encoding("cl100k_base")
-except Exception:
-    logger.warning("Could not initialize tiktoken, token counts will be unavailable.")
-    tokenizer = None
+
+LLM_TIME_TO_FIRST_BYTE = Histogram(
+    "llm_time_to_first_byte_seconds",
+    "Time from sending a streaming LLM request until the first content token arrives.",
+    ["model"],
+)
+
+class LLMStreamError(Exception):
+    # Only transient failures (timeouts, dropped connections, 5xx, 408 and 429) are worth retrying;
+    # a missing key or a rejected request fails the same way every time.
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+def _is_retryable_status(status_code: int) -> bool:
+    return status_code >= 500 or status_code in (408, 429)
+
+@functools.lru_cache(maxsize=None)
+def _get_tokenizer():
+    # Loaded on first use: fetching the encoding can hit the network, which no import should wait on.
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        logger.warning("Could not initialize tiktoken, token counts will be unavailable.")
+        return None
 
 def _count_tokens(text: str) -> int:
-    if not tokenizer or not isinstance(text, str):
+    tokenizer = _get_tokenizer() if isinstance(text, str) else None
+    if not tokenizer:
         return 0
     return len(tokenizer.encode(text))
 
@@ -42,40 +68,104 @@ def _print_metrics(model: str, input_tokens: int, output_tokens: int):
     )
     print(metrics_str)
 
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _build_http_client() -> httpx.AsyncClient:
+    http2 = settings.llm_http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1.")
+            http2 = False
+    limits = httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive_connections,
+        keepalive_expiry=settings.llm_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(settings.llm_timeout, connect=settings.llm_connect_timeout)
+    return httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        if _http_client is not None and not _http_client.is_closed:
+            # Pooled connections belong to the loop that opened them and cannot be reused here.
+            logger.warning("LLM HTTP client was bound to a different event loop, creating a new one.")
+        _http_client = _build_http_client()
+        _http_client_loop = loop
+        logger.info("Created pooled LLM HTTP client.")
+    return _http_client
+
+async def startup_http_client() -> httpx.AsyncClient:
+    return get_http_client()
+
+async def shutdown_http_client():
+    global _http_client, _http_client_loop
+    client, _http_client, _http_client_loop = _http_client, None, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+        logger.info("Closed pooled LLM HTTP client.")
+
+def _build_request(
+    provider: str, model_name: str, messages: List[Dict[str, Any]], temperature: float,
+    top_p: Optional[float], max_tokens: Optional[int], stop_tokens: Optional[List[str]],
+):
+    if provider.lower() not in ["mistral"]:
+        raise NotImplementedError("Currently, only 'mistral' provider is supported.")
+
+    headers = {"Authorization": f"Bearer {settings.mistral_api_key}", "Content-Type": "application/json"}
+    payload = {
+        "model": model_name, "messages": messages, "temperature": temperature,
+        "top_p": top_p, "max_tokens": max_tokens, "stop": stop_tokens or [],
+    }
+    payload = {k: v for k, v in payload.items() if v is not None}
+    return headers, payload
+
+def _cache_key_for(
+    provider: str, model_name: str, messages: List[Dict[str, Any]], temperature: float,
+    top_p: Optional[float], max_tokens: Optional[int], stop_tokens: Optional[List[str]],
+) -> Optional[str]:
+    # Only greedy decoding is reproducible enough to serve from cache.
+    if not settings.llm_cache_enabled or temperature != 0.0:
+        return None
+    return make_cache_key(provider, model_name, messages, temperature, top_p, max_tokens, stop_tokens)
+
 async def get_llm_response(
     provider: str, model_name: str, messages: List[Dict[str, Any]],
     temperature: float, top_p: Optional[float] = 1.0, max_tokens: Optional[int] = 4096,
     stop_tokens: Optional[List[str]] = None,
 ) -> str:
-    if provider.lower() not in ["mistral"]:
-        raise NotImplementedError("Currently, only 'mistral' provider is supported.")
-
-    api_key = settings.mistral_api_key
+    headers, payload = _build_request(provider, model_name, messages, temperature, top_p, max_tokens, stop_tokens)
     api_url = settings.mistral_api_url
 
-    if not api_key:
+    if not settings.mistral_api_key:
         return "API_ERROR: MISTRAL_API_KEY environment variable not set."
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    payload = {
-        "model": model_name, "messages": messages, "temperature": temperature,
-        "top_p": top_p, "max_tokens": max_tokens, "stop": stop_tokens or [],
-    }
-    payload = {k: v for k, v in payload.items() if v is not None}
+    cache_key = _cache_key_for(provider, model_name, messages, temperature, top_p, max_tokens, stop_tokens)
+    if cache_key:
+        cached = await response_cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"Serving '{model_name}' response from the LLM response cache.")
+            return cached
 
     try:
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            response = await client.post(api_url, headers=headers, json=payload)
-            response.raise_for_status()
+        client = get_http_client()
+        response = await client.post(api_url, headers=headers, json=payload)
+        response.raise_for_status()
 
-            data = response.json()
-            response_content = data["choices"][0]["message"]["content"]
+        data = response.json()
+        response_content = data["choices"][0]["message"]["content"]
 
-            input_tokens = data.get("usage", {}).get("prompt_tokens", 0)
-            output_tokens = data.get("usage", {}).get("completion_tokens", 0)
-            _print_metrics(model_name, input_tokens, output_tokens)
+        input_tokens = data.get("usage", {}).get("prompt_tokens", 0)
+        output_tokens = data.get("usage", {}).get("completion_tokens", 0)
+        _print_metrics(model_name, input_tokens, output_tokens)
 
-            return response_content
+        if cache_key:
+            await response_cache.aset(cache_key, response_content)
+        return response_content
 
     except httpx.ReadTimeout:
         logger.error(f"Request to LLM API timed out.")
@@ -86,3 +176,72 @@ async def get_llm_response(
     except Exception as e:
         logger.error(f"An unexpected error occurred in get_llm_response: {e}", exc_info=True)
         return f"APP_ERROR: {str(e)}"
+
+async def stream_llm_response(
+    provider: str, model_name: str, messages: List[Dict[str, Any]],
+    temperature: float, top_p: Optional[float] = 1.0, max_tokens: Optional[int] = 4096,
+    stop_tokens: Optional[List[str]] = None,
+) -> AsyncIterator[str]:
+    headers, payload = _build_request(provider, model_name, messages, temperature, top_p, max_tokens, stop_tokens)
+    payload["stream"] = True
+
+    if not settings.mistral_api_key:
+        raise LLMStreamError("API_ERROR: MISTRAL_API_KEY environment variable not set.", retryable=False)
+
+    cache_key = _cache_key_for(provider, model_name, messages, temperature, top_p, max_tokens, stop_tokens)
+    if cache_key:
+        cached = await response_cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"Serving '{model_name}' stream from the LLM response cache.")
+            yield cached
+            return
+
+    started = time.perf_counter()
+    first_token_at = None
+    usage = {}
+    output_parts = []
+
+    try:
+        client = get_http_client()
+        async with client.stream("POST", settings.mistral_api_url, headers=headers, json=payload) as response:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    LLM_TIME_TO_FIRST_BYTE.labels(model=model_name).observe(first_token_at - started)
+                    logger.info(f"First token from '{model_name}' after {first_token_at - started:.3f}s.")
+                output_parts.append(delta)
+                yield delta
+
+    except httpx.ReadTimeout:
+        logger.error(f"Streaming request to LLM API timed out.")
+        raise LLMStreamError("API_ERROR: The request to the AI model timed out. The task may be too complex.")
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP error calling LLM API: {e.response.status_code} - {e.response.text}")
+        raise LLMStreamError(
+            f"API_ERROR: HTTP {e.response.status_code} - {e.response.text}", retryable=_is_retryable_status(e.response.status_code)
+        )
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        logger.error(f"Streaming LLM response failed: {e}", exc_info=True)
+        raise LLMStreamError(f"APP_ERROR: {str(e)}")
+
+    input_tokens = usage.get("prompt_tokens", 0)
+    full_output = "".join(output_parts)
+    output_tokens = usage.get("completion_tokens") or _count_tokens(full_output)
+    _print_metrics(model_name, input_tokens, output_tokens)
+    if cache_key and full_output:
+        await response_cache.aset(cache_key, full_output)
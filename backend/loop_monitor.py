@@ -0,0 +1,55 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop woke a periodic probe; anything above a few ms means a coroutine blocked it.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+class LoopLagMonitor:
+    # Sleeps a fixed interval in a loop and records how much later than requested it woke up.
+    def __init__(self, interval: float = 0.01, window: int = 10000):
+        self.interval = interval
+        self.samples: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    async def _probe(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.samples.append(lag)
+            EVENT_LOOP_LAG.observe(lag)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self.samples.clear()
+            self._task = asyncio.get_running_loop().create_task(self._probe())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def summary(self) -> Dict[str, float]:
+        if not self.samples:
+            return {"samples": 0, "max_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0}
+        ordered = sorted(self.samples)
+        return {
+            "samples": len(ordered),
+            "max_ms": ordered[-1] * 1000,
+            "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+            "mean_ms": sum(ordered) / len(ordered) * 1000,
+        }
@@ -1,24 +1,36 @@
 import logging
-from sentence_transformers import SentenceTransformer, util
+from typing import List, Optional
+
+from backend.embedding_service import get_embedding_service
 
 logger = logging.getLogger(__name__)
 
 class EmbeddingModel:
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.model = None
+    # Shares the process-wide embedding service, so Lucidus and MemoryManager load one model between them.
+    def __init__(self, model_name: Optional[str] = None):
         self.load_model(model_name)
 
-    def load_model(self, model_name):
-        try:
-            self.model = SentenceTransformer(model_name)
-        except Exception as e:
-            logger.error(f"Could not load SentenceTransformer model: {e}")
-            self.model = None
+    def load_model(self, model_name: Optional[str]):
+        self.service = get_embedding_service(model_name)
+
+    @property
+    def model(self):
+        return self.service.model
+
+    @property
+    def available(self) -> bool:
+        return self.service.available
 
     def encode(self, text):
-        if self.model is None:
+        if not self.available:
+            logger.error("Embedding model is not loaded.")
+            return None
+        return self.service.encode(text)
+
+    async def encode_many(self, texts: List[str]):
+        if not self.available:
             logger.error("Embedding model is not loaded.")
             return None
-        return self.model.encode(text, convert_to_tensor=True)
+        return await self.service.encode_many(texts)
 
 embedding_model = EmbeddingModel()
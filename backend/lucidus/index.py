@@ -0,0 +1,139 @@
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Keeps a (queries x facts) score block around 64M floats when scoring many snippets at once.
+SCORE_BLOCK_ELEMENTS = 64 * 1024 * 1024
+
+def as_float32_matrix(vectors: Any) -> np.ndarray:
+    # Accepts torch tensors (as returned with convert_to_tensor=True), numpy arrays and lists.
+    if hasattr(vectors, "detach"):
+        vectors = vectors.detach().cpu().numpy()
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix.reshape(1, -1) if matrix.ndim == 1 else matrix
+
+def normalize_rows(matrix: np.ndarray, inplace: bool = False) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    if inplace:
+        matrix /= norms
+        return matrix
+    return matrix / norms
+
+def _select(scores: np.ndarray, top_k: Optional[int], threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    rows = np.flatnonzero(scores >= threshold)
+    if top_k is not None and len(rows) > top_k:
+        rows = rows[np.argpartition(scores[rows], -top_k)[-top_k:]]
+    rows = rows[np.argsort(-scores[rows], kind="stable")]
+    return rows, scores[rows]
+
+class IVFIndex:
+    # Inverted-file index over a matrix whose rows are sorted by cluster: rows offsets[i] to
+    # offsets[i + 1] belong to centroids[i], so a query only scores the n_probe contiguous slices
+    # whose centroids are closest to it. train() clusters rows by spherical k-means and returns the
+    # order the caller must store its rows in; the compile step does that once and saves the result.
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.n_lists = len(centroids)
+
+    @classmethod
+    def train(
+        cls, matrix: np.ndarray, n_lists: Optional[int] = None, n_iter: int = 10, seed: int = 0
+    ) -> Tuple["IVFIndex", np.ndarray]:
+        n_rows = len(matrix)
+        n_lists = max(1, min(n_rows, n_lists or int(np.sqrt(n_rows))))
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(n_rows, size=min(n_rows, n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+        for _ in range(n_iter):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums)
+
+        assignment = np.concatenate([
+            np.argmax(matrix[start:start + 65536] @ centroids.T, axis=1) for start in range(0, n_rows, 65536)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        return cls(centroids, np.searchsorted(assignment[order], np.arange(n_lists + 1))), order
+
+    def search(
+        self, matrix: np.ndarray, query: np.ndarray, top_k: Optional[int], threshold: float, n_probe: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        probe = np.argsort(-(self.centroids @ query))[:max(1, n_probe)]
+        starts, ends = self.offsets[probe], self.offsets[probe + 1]
+        scores = np.concatenate([matrix[start:end] @ query for start, end in zip(starts, ends)])
+        positions = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        rows, selected = _select(scores, top_k, threshold)
+        return positions[rows], selected
+
+class VaultIndex:
+    def __init__(
+        self, entries: Sequence[Dict[str, Any]], ivf_min_facts: Optional[int] = None, n_probe: int = 8,
+        matrix: Optional[np.ndarray] = None, ivf: Optional[IVFIndex] = None
+    ):
+        self.n_probe = n_probe
+        self.ivf = ivf
+        # With a precompiled (already normalized, possibly memory-mapped) matrix, entries[i] is row i.
+        # It is used as-is: reordering it here would copy a memory map into private memory, so any
+        # IVF layout comes precomputed from the compile step along with the matrix.
+        if matrix is not None:
+            self.entries: List[Dict[str, Any]] = list(entries)
+            self.matrix = matrix
+            return
+        self.entries = []
+        vectors = []
+        for entry in entries:
+            if entry.get("embedding") is None:
+                continue
+            self.entries.append(entry)
+            vectors.append(as_float32_matrix(entry["embedding"])[0])
+        self.matrix = normalize_rows(np.stack(vectors), inplace=True) if vectors else np.zeros((0, 0), dtype=np.float32)
+        del vectors
+        if ivf_min_facts is not None and len(self.entries) >= ivf_min_facts:
+            self.ivf, order = IVFIndex.train(self.matrix)
+            self.matrix = self.matrix[order]
+            self.entries = [self.entries[i] for i in order]
+            logger.info(f"Built IVF index over {len(self.entries)} vault facts with {self.ivf.n_lists} lists.")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _hit(self, row: int, score: float) -> Dict[str, Any]:
+        entry = self.entries[row]
+        return {
+            "id": entry.get("id"),
+            "fact": entry.get("fact"),
+            "tags": entry.get("tags", []),
+            "source": entry.get("source"),
+            "similarity": round(float(score), 3)
+        }
+
+    def search(self, query: Any, top_k: Optional[int] = None, threshold: float = 0.5) -> List[Dict[str, Any]]:
+        return self.search_many(query, top_k, threshold)[0]
+
+    def search_many(self, queries: Any, top_k: Optional[int] = None, threshold: float = 0.5) -> List[List[Dict[str, Any]]]:
+        queries = normalize_rows(as_float32_matrix(queries))
+        if not len(self.entries):
+            return [[] for _ in range(len(queries))]
+
+        results = []
+        if self.ivf is not None:
+            for query in queries:
+                rows, scores = self.ivf.search(self.matrix, query, top_k, threshold, self.n_probe)
+                results.append([self._hit(r, s) for r, s in zip(rows, scores)])
+            return results
+
+        block = max(1, SCORE_BLOCK_ELEMENTS // len(self.entries))
+        for start in range(0, len(queries), block):
+            scores = queries[start:start + block] @ self.matrix.T
+            for row_scores in scores:
+                rows, selected = _select(row_scores, top_k, threshold)
+                results.append([self._hit(r, s) for r, s in zip(rows, selected)])
+        return results
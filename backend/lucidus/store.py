@@ -0,0 +1,140 @@
+# backend/lucidus/store.py
+#
+# Compiles the vault's fact embeddings into a versioned sidecar next to the vault JSON:
+#   <vault>.<model>.npy         row-normalized float32 matrix, one row per embedded fact
+#   <vault>.<model>.ivf.npy     IVF centroids, for vaults of at least lucidus_ivf_min_facts facts
+#   <vault>.<model>.index.json  format version, vault hash, model name, row -> vault position and
+#                               IVF list offsets
+# With an IVF the matrix is written already sorted by cluster. Workers np.load it with
+# mmap_mode="r" as-is, so they share page-cache pages and never re-encode or re-cluster.
+#
+#   python -m backend.lucidus.store --vault vault.coding.json --model all-MiniLM-L6-v2 --backend onnx-int8
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from backend.lucidus.index import IVFIndex, as_float32_matrix, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+
+class CompiledEmbeddings(NamedTuple):
+    matrix: np.ndarray
+    positions: List[int]
+    ivf: Optional[IVFIndex] = None
+
+def vault_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+def sidecar_paths(vault_path: Path, model_name: str) -> Tuple[Path, Path]:
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+    base = vault_path.with_name(f"{vault_path.name}.{slug}")
+    return base.with_name(base.name + ".npy"), base.with_name(base.name + ".index.json")
+
+def ivf_sidecar_path(matrix_path: Path) -> Path:
+    return matrix_path.with_name(matrix_path.name.removesuffix(".npy") + ".ivf.npy")
+
+def _atomic_write(path: Path, write):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+def compile_embeddings(
+    vault_path: Path, entries: List[Dict[str, Any]], raw: bytes, model_name: str, encode, batch_size: int = 256,
+    ivf_min_facts: Optional[int] = None
+) -> CompiledEmbeddings:
+    positions = [i for i, entry in enumerate(entries) if entry.get("fact")]
+    blocks = []
+    for start in range(0, len(positions), batch_size):
+        facts = [entries[i]["fact"] for i in positions[start:start + batch_size]]
+        blocks.append(normalize_rows(as_float32_matrix(encode(facts)), inplace=True))
+    matrix = np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+
+    ivf = None
+    if ivf_min_facts is not None and len(positions) >= ivf_min_facts:
+        ivf, order = IVFIndex.train(matrix)
+        matrix = matrix[order]
+        positions = [positions[i] for i in order]
+        logger.info(f"Clustered {len(positions)} vault embeddings into {ivf.n_lists} IVF lists.")
+
+    matrix_path, index_path = sidecar_paths(vault_path, model_name)
+    index = {
+        "format": FORMAT_VERSION,
+        "model": model_name,
+        "vault_sha256": vault_hash(raw),
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "positions": positions,
+        "ivf_offsets": ivf.offsets.tolist() if ivf is not None else None,
+    }
+    # The index is written last, so a reader never pairs a fresh index with a half-written matrix.
+    _atomic_write(matrix_path, lambda f: np.save(f, matrix))
+    if ivf is not None:
+        _atomic_write(ivf_sidecar_path(matrix_path), lambda f: np.save(f, ivf.centroids))
+    _atomic_write(index_path, lambda f: f.write(json.dumps(index).encode("utf-8")))
+    logger.info(f"Compiled {len(positions)} vault embeddings for '{model_name}' into {matrix_path}.")
+    return CompiledEmbeddings(matrix, positions, ivf)
+
+def load_embeddings(vault_path: Path, raw: bytes, model_name: str) -> Optional[CompiledEmbeddings]:
+    matrix_path, index_path = sidecar_paths(vault_path, model_name)
+    if not matrix_path.exists() or not index_path.exists():
+        return None
+    try:
+        index = json.loads(index_path.read_text())
+        if (index.get("format") != FORMAT_VERSION or index.get("model") != model_name
+                or index.get("vault_sha256") != vault_hash(raw)):
+            logger.warning(f"Vault embeddings at {matrix_path} are stale; recompile them with 'python -m backend.lucidus.store'.")
+            return None
+        matrix = np.load(matrix_path, mmap_mode="r")
+        ivf = None
+        if index.get("ivf_offsets") is not None:
+            # Centroids are small (about sqrt(count) rows), so they are read into memory.
+            ivf = IVFIndex(np.load(ivf_sidecar_path(matrix_path)), np.asarray(index["ivf_offsets"]))
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load vault embeddings from {matrix_path}: {e}")
+        return None
+    if (matrix.dtype != np.float32 or len(matrix) != index["count"] or len(index["positions"]) != index["count"]
+            or (ivf is not None and (len(ivf.offsets) != ivf.n_lists + 1 or ivf.offsets[-1] != index["count"]))):
+        logger.error(f"Vault embeddings at {matrix_path} do not match their index, ignoring them.")
+        return None
+    return CompiledEmbeddings(matrix, index["positions"], ivf)
+
+def main():
+    from backend.config import settings
+    from backend.embedding_service import EMBEDDING_BACKENDS, EmbeddingService
+
+    parser = argparse.ArgumentParser(description="Compile Lucidus vault embeddings into a memory-mappable sidecar.")
+    parser.add_argument("--vault", default="vault.coding.json")
+    parser.add_argument("--model", default=settings.embedding_model)
+    parser.add_argument("--backend", default=settings.embedding_backend, choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    vault_path = Path(__file__).resolve().parent / args.vault
+    raw = vault_path.read_bytes()
+    service = EmbeddingService(args.model, workers=0, backend=args.backend)
+    if not service.available:
+        raise SystemExit(f"Could not load {args.backend} embedding model '{args.model}'.")
+    compile_embeddings(
+        vault_path, json.loads(raw), raw, service.cache_key, service.encode, args.batch_size,
+        ivf_min_facts=settings.lucidus_ivf_min_facts
+    )
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
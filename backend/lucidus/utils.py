@@ -1,5 +1,8 @@
+import asyncio
 import logging
-from sentence_transformers import util
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from backend.lucidus.index import VaultIndex
 
 logger = logging.getLogger(__name__)
 
@@ -11,26 +14,45 @@ def get_complexity_level(text: str) -> str:
         return "medium"
     return "low"
 
-def vector_match(response: str, embedding_model, vault, threshold: float = 0.5):
-    if embedding_model.model is None:
-        return []
-
-    response_embedding = embedding_model.encode(response)
-    hits = []
-    for entry in vault:
-        if "embedding" not in entry or entry["embedding"] is None:
-            continue
-        try:
-            sim = util.cos_sim(response_embedding, entry["embedding"]).item()
-            if sim >= threshold:
-                hits.append({
-                    "id": entry.get("id"),
-                    "fact": entry.get("fact"),
-                    "tags": entry.get("tags", []),
-                    "source": entry.get("source"),
-                    "similarity": round(sim, 3)
-                })
-        except Exception as e:
-            logger.warning(f"Error during similarity calculation: {e}")
-            continue
-    return hits
+def _as_index(vault: Union[VaultIndex, Sequence[Dict[str, Any]]]) -> VaultIndex:
+    if isinstance(vault, VaultIndex):
+        return vault
+    index = getattr(vault, "index", None)
+    return index if isinstance(index, VaultIndex) else VaultIndex(vault)
+
+def vector_match(response: str, embedding_model, vault, threshold: float = 0.5, top_k: Optional[int] = None):
+    return vector_match_many([response], embedding_model, vault, threshold, top_k)[0]
+
+def vector_match_many(
+    responses: List[str], embedding_model, vault, threshold: float = 0.5, top_k: Optional[int] = None
+) -> List[List[Dict[str, Any]]]:
+    if not embedding_model.available or not responses:
+        return [[] for _ in responses]
+
+    index = _as_index(vault)
+    if not len(index):
+        return [[] for _ in responses]
+    return _search(index, embedding_model.encode(responses), responses, threshold, top_k)
+
+async def avector_match_many(
+    responses: List[str], embedding_model, vault, threshold: float = 0.5, top_k: Optional[int] = None
+) -> List[List[Dict[str, Any]]]:
+    # Encodes through the shared embedding workers, batched with concurrent callers, and scores off the loop.
+    if not embedding_model.available or not responses:
+        return [[] for _ in responses]
+
+    index = _as_index(vault)
+    if not len(index):
+        return [[] for _ in responses]
+    embeddings = await embedding_model.encode_many(responses)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _search, index, embeddings, responses, threshold, top_k)
+
+def _search(index: VaultIndex, embeddings, responses: List[str], threshold: float, top_k: Optional[int]):
+    if embeddings is None:
+        return [[] for _ in responses]
+    try:
+        return index.search_many(embeddings, top_k, threshold)
+    except ValueError as e:
+        logger.warning(f"Error during similarity calculation: {e}")
+        return [[] for _ in responses]
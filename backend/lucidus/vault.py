@@ -2,29 +2,63 @@ import json
 import logging
 from pathlib import Path
 from backend.config import settings
+from backend.embedding_service import embedding_cache_key
+from backend.lucidus.index import VaultIndex
+from backend.lucidus.store import load_embeddings
 
 logger = logging.getLogger(__name__)
 
 class Vault:
     def __init__(self, vault_path="vault.coding.json"):
         self.vault_path = Path(__file__).resolve().parent / vault_path
+        self._raw = b""
         self.vault = self.load_vault()
+        self._index = None
 
     def load_vault(self):
         if not self.vault_path.exists():
             logger.warning(f"Vault file not found at {self.vault_path}. Lucidus will operate without vault data.")
             return []
         try:
-            with open(self.vault_path, "r") as f:
-                return json.load(f)
+            self._raw = self.vault_path.read_bytes()
+            return json.loads(self._raw)
         except json.JSONDecodeError:
             logger.error(f"Vault file at {self.vault_path} is not a valid JSON file.")
             return []
 
+    @property
+    def index(self) -> VaultIndex:
+        if self._index is None:
+            self._index = VaultIndex(self.vault, settings.lucidus_ivf_min_facts, settings.lucidus_ivf_nprobe)
+        return self._index
+
+    def load_embeddings(self, model_name: str) -> bool:
+        if not self.vault:
+            return False
+        compiled = load_embeddings(self.vault_path, self._raw, model_name)
+        if compiled is None:
+            logger.warning(
+                f"No compiled embeddings for {self.vault_path} and model '{model_name}'. "
+                f"Vector matching is disabled until 'python -m backend.lucidus.store' is run."
+            )
+            return False
+        self._index = VaultIndex(
+            [self.vault[i] for i in compiled.positions], settings.lucidus_ivf_min_facts, settings.lucidus_ivf_nprobe,
+            matrix=compiled.matrix, ivf=compiled.ivf
+        )
+        logger.info(f"Memory-mapped {len(self._index)} vault embeddings for '{model_name}'.")
+        return True
+
     def precompute_embeddings(self, embedding_model):
-        for entry in self.vault:
-            if "fact" in entry and "embedding" not in entry:
-                entry["embedding"] = embedding_model.encode(entry["fact"])
+        pending = [entry for entry in self.vault if "fact" in entry and "embedding" not in entry]
+        if not pending:
+            return
+        embeddings = embedding_model.encode([entry["fact"] for entry in pending])
+        if embeddings is None:
+            return
+        for entry, embedding in zip(pending, embeddings):
+            entry["embedding"] = embedding
+        self._index = None
 
 vault = Vault()
-vault.precompute_embeddings(settings.embedding_model)
+vault.load_embeddings(embedding_cache_key(settings.embedding_model, settings.embedding_backend))
@@ -1,59 +1,394 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
+import asyncio
+import atexit
+import fnmatch
 import logging
-from typing import List
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from prometheus_client import Counter
 
 from backend.config import settings
+from backend.chunking import chunk_document, estimate_tokens
+from backend.embedding_cache import embedding_cache, text_hash
+from backend.embedding_service import EmbeddingService, embedding_service
+from backend.bm25 import BM25Index, reciprocal_rank_fusion
 
 logger = logging.getLogger(__name__)
 
+MemoryItem = Tuple[str, str, str]
+
+MEMORY_CACHE_HITS = Counter("memory_cache_hits_total", "Memory retrieval cache hits.", ["cache"])
+MEMORY_CACHE_MISSES = Counter("memory_cache_misses_total", "Memory retrieval cache misses.", ["cache"])
+MEMORY_CACHE_SECONDS_SAVED = Counter(
+    "memory_cache_seconds_saved_total", "Estimated encode/query time avoided by memory retrieval caches.", ["cache"]
+)
+
 class MemoryManager:
-    def __init__(self):
-        try:
-            self.model = SentenceTransformer(settings.embedding_model)
-            self._db_client = chromadb.PersistentClient(path=settings.chroma_path)
-            self.collection = self._db_client.get_or_create_collection(name=settings.collection_name)
-            logger.info("MemoryManager initialized successfully.")
-        except Exception as e:
-            logger.error(f"Failed to initialize MemoryManager: {e}", exc_info=True)
-            self.model = None
-            self.collection = None
+    def __init__(self, embeddings: Optional[EmbeddingService] = None, collection=None):
+        # The model and the Chroma collection are both loaded on first use, not at import.
+        self.embeddings = embeddings or embedding_service
+        self._collection = collection
+        self._collection_failed = False
+        self._collection_lock = threading.Lock()
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-ingest")
+        self._cache_lock = threading.Lock()
+        self._query_embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._results: "OrderedDict[Tuple, Tuple[float, List[str]]]" = OrderedDict()
+        # Bumped by every collection write; a query only caches its result if no write overlapped it.
+        self._results_generation = 0
+        self._bm25: Optional[BM25Index] = None
+        self._bm25_lock = threading.Lock()
+        # Moving averages of what a miss costs, used to estimate time saved by hits.
+        self._encode_seconds = 0.0
+        self._retrieve_seconds = 0.0
+
+    @property
+    def model(self):
+        return self.embeddings.model
+
+    @property
+    def collection(self):
+        if self._collection is None and not self._collection_failed:
+            with self._collection_lock:
+                if self._collection is None and not self._collection_failed:
+                    try:
+                        import chromadb
+                        client = chromadb.PersistentClient(path=settings.chroma_path)
+                        self._collection = client.get_or_create_collection(name=settings.collection_name)
+                        logger.info("MemoryManager connected to long-term memory.")
+                    except Exception as e:
+                        logger.error(f"Failed to open long-term memory at '{settings.chroma_path}': {e}", exc_info=True)
+                        self._collection_failed = True
+        return self._collection
 
     def add_to_memory(self, content: str, filename: str, session_id: str):
-        if not self.model or not self.collection:
+        self._ingest_batch([(content, filename, session_id)])
+
+    def _ingest_batch(self, batch: List[MemoryItem]):
+        if not self.embeddings.available or not self.collection:
             logger.error("Cannot add to memory, MemoryManager not initialized.")
             return
 
+        # A file written several times within one batch only needs its latest content embedded.
+        latest = {}
+        for content, filename, session_id in batch:
+            latest[f"{session_id}:{filename}"] = (content, filename, session_id)
+
         try:
-            doc_id = f"{session_id}:{filename}"
-            embedding = self.model.encode(content).tolist()
-
-            self.collection.upsert(
-                ids=[doc_id],
-                embeddings=[embedding],
-                documents=[content],
-                metadatas=[{"filename": filename, "session_id": session_id}]
+            existing = self.collection.get(where={"doc_id": {"$in": list(latest)}}, include=["metadatas"])
+            existing_meta = dict(zip(existing["ids"], existing["metadatas"]))
+            stored_doc_hashes = {meta.get("doc_id"): meta.get("doc_hash") for meta in existing_meta.values()}
+
+            now = time.time()
+            new_ids, new_texts, new_metas = [], [], []
+            moved_ids, moved_metas = [], []
+            keep_ids = set()
+            unchanged_docs = []
+            for doc_id, (content, filename, session_id) in latest.items():
+                doc_hash = self._doc_hash(content)
+                if stored_doc_hashes.get(doc_id) == doc_hash:
+                    unchanged_docs.append(doc_id)
+                    keep_ids.update(i for i, meta in existing_meta.items() if meta.get("doc_id") == doc_id)
+                    continue
+                for chunk_id, chunk in self._chunk_ids(doc_id, content, filename):
+                    keep_ids.add(chunk_id)
+                    meta = {
+                        "doc_id": doc_id, "filename": filename, "session_id": session_id, "kind": chunk.kind,
+                        "start_line": chunk.start_line, "end_line": chunk.end_line,
+                        "start_char": chunk.start_char, "end_char": chunk.end_char,
+                        "doc_hash": doc_hash, "content_hash": text_hash(chunk.text), "updated_at": now,
+                    }
+                    if chunk_id not in existing_meta:
+                        new_ids.append(chunk_id)
+                        new_texts.append(chunk.text)
+                        new_metas.append(meta)
+                    elif existing_meta[chunk_id] != meta:
+                        moved_ids.append(chunk_id)
+                        moved_metas.append(meta)
+
+            if len(unchanged_docs) == len(latest):
+                logger.info(f"Skipped {len(latest)} unchanged document(s), long-term memory already up to date.")
+                return
+            self._invalidate_results()
+            if new_ids:
+                embeddings = embedding_cache.encode(self.embeddings.cache_key, new_texts, self.embeddings.encode).tolist()
+                self.collection.upsert(ids=new_ids, embeddings=embeddings, documents=new_texts, metadatas=new_metas)
+            if moved_ids:
+                self.collection.update(ids=moved_ids, metadatas=moved_metas)
+            # Whole-file entries from before chunking used the bare doc_id.
+            stale_ids = [i for i in existing_meta if i not in keep_ids] + [d for d in latest if d not in unchanged_docs]
+            self.collection.delete(ids=stale_ids)
+            with self._bm25_lock:
+                if self._bm25 is not None:
+                    for chunk_id, text, meta in zip(new_ids, new_texts, new_metas):
+                        self._bm25.add(chunk_id, f"{meta['filename']}\n{text}", meta)
+                    for chunk_id, meta in zip(moved_ids, moved_metas):
+                        self._bm25.update_meta(chunk_id, meta)
+                    for chunk_id in stale_ids:
+                        self._bm25.remove(chunk_id)
+            self._invalidate_results()
+            logger.info(
+                f"Indexed {len(latest)} document(s) into long-term memory: {len(new_ids)} new chunk(s), "
+                f"{len(moved_ids)} moved, {len(unchanged_docs)} unchanged document(s) skipped."
             )
-            logger.info(f"Successfully added '{filename}' to long-term memory.")
         except Exception as e:
-            logger.error(f"Failed to add '{filename}' to memory: {e}", exc_info=True)
+            logger.error(f"Failed to add {[filename for _, filename, _ in latest.values()]} to memory: {e}", exc_info=True)
 
-    def retrieve_from_memory(self, query_text: str, n_results: int = 3) -> List[str]:
-        if not self.model or not self.collection or not query_text:
-            return []
+    def _doc_hash(self, content: str) -> str:
+        # Chunking parameters are part of the hash so changing them re-chunks existing documents.
+        return text_hash(f"{settings.memory_chunk_max_tokens}:{settings.memory_chunk_overlap_lines}:{content}")
+
+    def _chunk_ids(self, doc_id: str, content: str, filename: str):
+        # Ids derive from chunk text, so an unchanged function keeps its vector even when it moves.
+        seen = {}
+        for chunk in chunk_document(
+            content, filename, max_tokens=settings.memory_chunk_max_tokens, overlap_lines=settings.memory_chunk_overlap_lines
+        ):
+            digest = text_hash(chunk.text)[:16]
+            seen[digest] = seen.get(digest, -1) + 1
+            suffix = f"-{seen[digest]}" if seen[digest] else ""
+            yield f"{doc_id}#{digest}{suffix}", chunk
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._queue_loop is not loop:
+            self._queue = asyncio.Queue(maxsize=settings.memory_ingest_queue_size)
+            self._queue_loop = loop
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run_ingestion(self._queue))
+        return self._queue
+
+    async def enqueue(self, content: str, filename: str, session_id: str):
+        # put() blocks once the queue is full, which pushes back on writers faster than the model.
+        await self._ensure_worker().put((content, filename, session_id))
+
+    async def _run_ingestion(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        flush_latency = settings.memory_ingest_flush_ms / 1000.0
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + flush_latency
+            while len(batch) < settings.memory_ingest_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await loop.run_in_executor(self._executor, self._ingest_batch, batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def flush(self):
+        if self._queue is not None and self._queue_loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def shutdown(self):
+        await self.flush()
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        self._drain_pending()
+
+    def _drain_pending(self):
+        pending = []
+        while self._queue is not None and not self._queue.empty():
+            try:
+                pending.append(self._queue.get_nowait())
+            except (asyncio.QueueEmpty, RuntimeError):
+                break
+        if pending:
+            logger.info(f"Flushing {len(pending)} queued memory write(s) before exit.")
+            self._ingest_batch(pending)
+
+    def _invalidate_results(self):
+        with self._cache_lock:
+            self._results_generation += 1
+            self._results.clear()
+
+    def _cached_query_embedding(self, query_text: str) -> Optional[List[float]]:
+        with self._cache_lock:
+            embedding = self._query_embeddings.get(query_text)
+            if embedding is not None:
+                self._query_embeddings.move_to_end(query_text)
+        if embedding is not None:
+            MEMORY_CACHE_HITS.labels(cache="embedding").inc()
+            MEMORY_CACHE_SECONDS_SAVED.labels(cache="embedding").inc(self._encode_seconds)
+        else:
+            MEMORY_CACHE_MISSES.labels(cache="embedding").inc()
+        return embedding
 
+    def _remember_query_embedding(self, query_text: str, embedding: List[float], elapsed: float):
+        with self._cache_lock:
+            self._encode_seconds = elapsed if not self._encode_seconds else 0.8 * self._encode_seconds + 0.2 * elapsed
+            self._query_embeddings[query_text] = embedding
+            while len(self._query_embeddings) > settings.memory_query_cache_size:
+                self._query_embeddings.popitem(last=False)
+
+    def _encode_query(self, query_text: str) -> List[float]:
+        embedding = self._cached_query_embedding(query_text)
+        if embedding is None:
+            started = time.perf_counter()
+            embedding = self.embeddings.encode(query_text).tolist()
+            self._remember_query_embedding(query_text, embedding, time.perf_counter() - started)
+        return embedding
+
+    async def _encode_query_async(self, query_text: str) -> List[float]:
+        embedding = self._cached_query_embedding(query_text)
+        if embedding is None:
+            started = time.perf_counter()
+            embedding = (await self.embeddings.encode_many([query_text]))[0].tolist()
+            self._remember_query_embedding(query_text, embedding, time.perf_counter() - started)
+        return embedding
+
+    def _ensure_bm25(self) -> BM25Index:
+        with self._bm25_lock:
+            if self._bm25 is None:
+                index, offset, page = BM25Index(), 0, 5000
+                while True:
+                    batch = self.collection.get(include=["documents", "metadatas"], limit=page, offset=offset)
+                    for chunk_id, text, meta in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+                        meta = meta or {}
+                        index.add(chunk_id, f"{meta.get('filename', '')}\n{text}", meta)
+                    if len(batch["ids"]) < page:
+                        break
+                    offset += page
+                logger.info(f"Built lexical index over {len(index)} memory chunks.")
+                self._bm25 = index
+            return self._bm25
+
+    @staticmethod
+    def _where(session_id: Optional[str], since: Optional[float]) -> Optional[Dict[str, Any]]:
+        clauses = []
+        if session_id is not None:
+            clauses.append({"session_id": session_id})
+        if since is not None:
+            clauses.append({"updated_at": {"$gte": since}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    @staticmethod
+    def _matches(meta: Dict[str, Any], session_id: Optional[str], filename_glob: Optional[str], since: Optional[float]) -> bool:
+        if session_id is not None and meta.get("session_id") != session_id:
+            return False
+        if since is not None and meta.get("updated_at", 0.0) < since:
+            return False
+        if filename_glob is not None and not fnmatch.fnmatch(meta.get("filename", ""), filename_glob):
+            return False
+        return True
+
+    @staticmethod
+    def _result_key(
+        query_text: str, n_results: int = 8, token_budget: Optional[int] = None,
+        session_id: Optional[str] = None, filename_glob: Optional[str] = None, since: Optional[float] = None,
+        hybrid: Optional[bool] = None,
+    ) -> Tuple:
+        token_budget = settings.memory_context_token_budget if token_budget is None else token_budget
+        hybrid = settings.memory_hybrid_retrieval if hybrid is None else hybrid
+        return (query_text, n_results, token_budget, session_id, filename_glob, since, hybrid)
+
+    def _cached_result(self, key: Tuple) -> Optional[List[str]]:
+        with self._cache_lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+        if cached is not None and cached[0] > time.monotonic():
+            MEMORY_CACHE_HITS.labels(cache="result").inc()
+            MEMORY_CACHE_SECONDS_SAVED.labels(cache="result").inc(self._retrieve_seconds)
+            logger.info(f"Reusing {len(cached[1])} recently retrieved chunks from memory.")
+            return list(cached[1])
+        MEMORY_CACHE_MISSES.labels(cache="result").inc()
+        return None
+
+    def retrieve_from_memory(self, query_text: str, **filters) -> List[str]:
+        if not self.embeddings.available or not self.collection or not query_text:
+            return []
+        key = self._result_key(query_text, **filters)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
         try:
-            query_embedding = self.model.encode(query_text).tolist()
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results
-            )
+            return self._query(key, self._encode_query(query_text))
+        except Exception as e:
+            logger.error(f"Failed to retrieve from memory: {e}", exc_info=True)
+            return []
 
-            retrieved_docs = results.get('documents', [[]])[0]
-            logger.info(f"Retrieved {len(retrieved_docs)} documents from memory.")
-            return retrieved_docs
+    async def aretrieve_from_memory(self, query_text: str, **filters) -> List[str]:
+        # Encodes through the batched embedding workers and runs the Chroma query off the event loop.
+        if not self.embeddings.available or not self.collection or not query_text:
+            return []
+        key = self._result_key(query_text, **filters)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
+        try:
+            query_embedding = await self._encode_query_async(query_text)
+            return await asyncio.get_running_loop().run_in_executor(None, self._query, key, query_embedding)
         except Exception as e:
             logger.error(f"Failed to retrieve from memory: {e}", exc_info=True)
             return []
 
+    def _query(self, key: Tuple, query_embedding: List[float]) -> List[str]:
+        query_text, n_results, token_budget, session_id, filename_glob, since, hybrid = key
+        started = time.perf_counter()
+        with self._cache_lock:
+            generation = self._results_generation
+        # Globs cannot be expressed as a Chroma filter, so over-fetch and filter locally.
+        fetch = n_results * settings.memory_filter_overfetch if filename_glob or hybrid else n_results
+        results = self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=fetch,
+            where=self._where(session_id, since),
+            include=["documents", "metadatas"]
+        )
+
+        candidates = {}
+        for chunk_id, text, meta in zip(results["ids"][0], results["documents"][0], results["metadatas"][0]):
+            candidates[chunk_id] = (text, meta or {})
+        ranking = [i for i, (_, meta) in candidates.items() if self._matches(meta, session_id, filename_glob, since)]
+
+        if hybrid:
+            lexical = self._ensure_bm25().search(
+                query_text, fetch, predicate=lambda meta: self._matches(meta, session_id, filename_glob, since)
+            )
+            lexical_ranking = [chunk_id for chunk_id, _ in lexical]
+            missing = [i for i in lexical_ranking if i not in candidates]
+            if missing:
+                extra = self.collection.get(ids=missing, include=["documents", "metadatas"])
+                for chunk_id, text, meta in zip(extra["ids"], extra["documents"], extra["metadatas"]):
+                    candidates[chunk_id] = (text, meta or {})
+            ranking = [i for i, _ in reciprocal_rank_fusion([ranking, lexical_ranking]) if i in candidates]
+
+        retrieved_chunks, used_tokens = [], 0
+        for chunk_id in ranking[:n_results]:
+            text, meta = candidates[chunk_id]
+            if "start_line" in meta:
+                text = f"# {meta.get('filename')} (lines {meta['start_line']}-{meta['end_line']})\n{text}"
+            tokens = estimate_tokens(text)
+            if used_tokens + tokens > token_budget:
+                continue
+            retrieved_chunks.append(text)
+            used_tokens += tokens
+        elapsed = time.perf_counter() - started
+        with self._cache_lock:
+            self._retrieve_seconds = elapsed if not self._retrieve_seconds else 0.8 * self._retrieve_seconds + 0.2 * elapsed
+            if generation == self._results_generation:
+                self._results[key] = (time.monotonic() + settings.memory_result_cache_ttl_seconds, retrieved_chunks)
+                self._results.move_to_end(key)
+                while len(self._results) > settings.memory_query_cache_size:
+                    self._results.popitem(last=False)
+        logger.info(f"Retrieved {len(retrieved_chunks)} chunks ({used_tokens} tokens) from memory.")
+        return list(retrieved_chunks)
+
 memory_manager = MemoryManager()
+atexit.register(memory_manager._drain_pending)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+from backend.schemas import StepModel
+from backend.utils import PLACEHOLDER_PATTERN
+
+logger = logging.getLogger(__name__)
+
+ALL_FILES = "*"
+
+# Tools with side effects we cannot see (shell, git) or that summarise everything before them.
+BARRIER_TOOLS = {"execute_script", "git_clone", "git_commit_and_push", "final_answer"}
+
+StepRunner = Callable[[int, StepModel, Dict[int, Dict[str, Any]]], Awaitable[Dict[str, Any]]]
+
+def _vault_path(filename: str) -> str:
+    # The tools join filenames onto the session vault, so "./a.py", "a.py" and "src/../a.py" are one
+    # file. A name built from an earlier step's output is unknown until run time and may be any file.
+    if PLACEHOLDER_PATTERN.search(filename):
+        return ALL_FILES
+    return os.path.normpath(filename)
+
+def _file_access(step: StepModel) -> Tuple[Set[str], Set[str]]:
+    tool_name = step.tool.name
+    filename = step.parameters.get("filename") if isinstance(step.parameters, dict) else None
+    if isinstance(filename, str) and filename:
+        filename = _vault_path(filename)
+    reads, writes = set(), set()
+    if tool_name == "list_files":
+        reads.add(ALL_FILES)
+    elif tool_name == "read_file" and filename:
+        reads.add(filename)
+    elif tool_name == "write_file" and filename:
+        writes.add(filename)
+    elif tool_name == "refactor_code" and filename:
+        reads.add(filename)
+        writes.add(filename)
+    return reads, writes
+
+def _overlaps(a: Set[str], b: Set[str]) -> bool:
+    if not a or not b:
+        return False
+    return ALL_FILES in a or ALL_FILES in b or not a.isdisjoint(b)
+
+def _placeholder_refs(parameters: Any) -> Set[int]:
+    refs = set()
+    if isinstance(parameters, dict):
+        for value in parameters.values():
+            if isinstance(value, str):
+                for match in PLACEHOLDER_PATTERN.finditer(value):
+                    refs.add(int(match.group(1) or match.group(2)))
+    return refs
+
+def build_dependency_graph(plan: List[StepModel]) -> Dict[int, Set[int]]:
+    graph: Dict[int, Set[int]] = {}
+    accesses = [_file_access(step) for step in plan]
+    for i, step in enumerate(plan):
+        deps = {ref for ref in _placeholder_refs(step.parameters) if ref < i}
+        reads, writes = accesses[i]
+        for j in range(i):
+            prior_reads, prior_writes = accesses[j]
+            if step.tool.name in BARRIER_TOOLS or plan[j].tool.name in BARRIER_TOOLS:
+                deps.add(j)
+            elif _overlaps(prior_writes, reads | writes) or _overlaps(prior_reads, writes):
+                deps.add(j)
+        graph[i] = deps
+    return graph
+
+async def execute_plan(plan: List[StepModel], run_step: StepRunner, max_concurrency: int) -> Dict[int, Dict[str, Any]]:
+    graph = build_dependency_graph(plan)
+    results: Dict[int, Dict[str, Any]] = {}
+    done = {i: asyncio.Event() for i in range(len(plan))}
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    halted = False
+
+    async def run(i: int, step: StepModel):
+        nonlocal halted
+        try:
+            for dep in graph[i]:
+                await done[dep].wait()
+            if halted or any(dep not in results for dep in graph[i]):
+                return
+            async with semaphore:
+                if halted:
+                    return
+                output = await run_step(i, step, results)
+            results[i] = output
+            if output.get("status") == "error":
+                halted = True
+        except BaseException:
+            halted = True
+            raise
+        finally:
+            done[i].set()
+
+    logger.info(f"Executing {len(plan)} steps with up to {max_concurrency} running concurrently.")
+    outcomes = await asyncio.gather(*(run(i, step) for i, step in enumerate(plan)), return_exceptions=True)
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+    return results
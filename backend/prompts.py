@@ -0,0 +1,103 @@
+import hashlib
+import json
+import logging
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from prometheus_client import Histogram
+
+from backend.chunking import estimate_tokens
+from backend.tools import TOOL_DISPATCHER, get_tool_definitions
+
+logger = logging.getLogger(__name__)
+
+PROMPT_SECTION_TOKENS = Histogram(
+    "prompt_section_tokens", "Estimated tokens per section of an assembled prompt.", ["prompt", "section"],
+    buckets=(16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384),
+)
+
+PLANNING_INSTRUCTIONS = (
+    "You are a tactical AI agent. Your only job is to take a single, simple, concrete task and create a JSON plan to execute it using the available tools. "
+    "Your output MUST be a JSON object with a 'plan' key.\n\n"
+    "**CRITICAL RESPONSE FORMATTING:**\n"
+    "1. Your output MUST be a single JSON object with a single root key named \"plan\".\n"
+    "2. The value of \"plan\" MUST be a list of step objects.\n"
+    "3. Each step object in the list MUST have EXACTLY three keys: \"tool\", \"parameters\", and \"reason\".\n"
+    "4. **Each step must represent a single, atomic action.** Do NOT combine multiple commands into one step.\n"
+    "5. The \"parameters\" for the \"execute_script\" tool must contain a single key named \"command\" whose value is a string.\n\n"
+    "Example of a PERFECT response:\n"
+    '{"plan":[{"tool":{"name":"execute_script"},"parameters":{"command":"echo \'hello world\'"},'
+    '"reason":"This is an example step to print hello world."}]}\n\n'
+)
+PLANNING_CLOSING = "Now, create a plan for the user's simple request."
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+class StaticPrefix(NamedTuple):
+    registry_key: Tuple[str, ...]
+    version: str
+    text: str
+    section_tokens: Dict[str, int]
+
+class AssembledPrompt(NamedTuple):
+    messages: List[Dict[str, str]]
+    version: str
+    section_tokens: Dict[str, int]
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.section_tokens.values())
+
+class PlanningPromptBuilder:
+    # The instructions and tool schemas only change when the tool registry does, so that prefix is
+    # serialized and counted once. Each call only splices in the retrieved memory context and the
+    # user's request after it, which also keeps the prefix byte-identical for provider-side caching.
+    def __init__(
+        self, tool_definitions: Callable[[], List[Dict[str, Any]]] = get_tool_definitions,
+        registry: Mapping[str, Any] = TOOL_DISPATCHER,
+    ):
+        self._tool_definitions = tool_definitions
+        self._registry = registry
+        self._prefix: Optional[StaticPrefix] = None
+
+    def static_prefix(self) -> StaticPrefix:
+        registry_key = tuple(self._registry)
+        prefix = self._prefix
+        if prefix is None or prefix.registry_key != registry_key:
+            tool_schemas = compact_json(self._tool_definitions())
+            text = f"{PLANNING_INSTRUCTIONS}AVAILABLE TOOLS:\n{tool_schemas}\n\n"
+            prefix = self._prefix = StaticPrefix(
+                registry_key=registry_key,
+                version=hashlib.sha256(text.encode("utf-8")).hexdigest()[:12],
+                text=text,
+                section_tokens={
+                    "instructions": estimate_tokens(PLANNING_INSTRUCTIONS),
+                    "tool_schemas": estimate_tokens(tool_schemas),
+                },
+            )
+            logger.info(f"Built planning prompt prefix {prefix.version} for {len(registry_key)} tools ({prefix.section_tokens}).")
+        return prefix
+
+    def invalidate(self):
+        self._prefix = None
+
+    def build(self, user_prompt: str, context: str) -> AssembledPrompt:
+        prefix = self.static_prefix()
+        context_block = (
+            "### CONTEXT FROM LONG-TERM MEMORY ###\n"
+            f"{context if context else 'No relevant context found.'}\n"
+            "### END CONTEXT ###\n\n"
+        )
+        section_tokens = dict(prefix.section_tokens)
+        section_tokens["memory_context"] = estimate_tokens(context_block)
+        section_tokens["instructions"] += estimate_tokens(PLANNING_CLOSING)
+        section_tokens["user_prompt"] = estimate_tokens(user_prompt)
+        for section, tokens in section_tokens.items():
+            PROMPT_SECTION_TOKENS.labels(prompt="planning", section=section).observe(tokens)
+        messages = [
+            {"role": "system", "content": f"{prefix.text}{context_block}{PLANNING_CLOSING}"},
+            {"role": "user", "content": user_prompt},
+        ]
+        return AssembledPrompt(messages, prefix.version, section_tokens)
+
+planning_prompt = PlanningPromptBuilder()
@@ -0,0 +1,292 @@
+import asyncio
+import base64
+import itertools
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from prometheus_client import Counter, Histogram
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = str(Path(__file__).with_name("sandbox_worker.py"))
+SANDBOX_PREFIX = ["unshare", "-U", "-r", "-m", "--"]
+TIMEOUT_EXIT_CODE = 124
+BINARY_SNIFF_BYTES = 8192
+
+SANDBOX_WORKER_STARTS = Counter("sandbox_worker_starts_total", "Sandbox worker processes started.", ["reason"])
+SANDBOX_COMMAND_SECONDS = Histogram(
+    "sandbox_command_seconds", "Wall time of commands run in sandbox workers.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+class SandboxError(Exception):
+    pass
+
+class CapturedOutput:
+    # Head and tail of one output stream as raw bytes. Nothing is decoded until render() is called,
+    # and output that looks binary is summarized instead of decoded at all.
+    def __init__(self, head: bytes, tail: bytes, total: int, spill_path: Optional[str] = None, spilled: int = 0):
+        self.head = head
+        self.tail = tail
+        self.total = total
+        self.spill_path = spill_path
+        self.spilled = spilled
+
+    @classmethod
+    def from_reply(cls, reply: Dict[str, Any]) -> "CapturedOutput":
+        return cls(base64.b64decode(reply["head"]), base64.b64decode(reply["tail"]), reply["total"],
+                   reply.get("spill"), reply.get("spilled", 0))
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self.head) + len(self.tail)
+
+    @property
+    def is_binary(self) -> bool:
+        return b"\0" in self.head[:BINARY_SNIFF_BYTES] or b"\0" in self.tail[-BINARY_SNIFF_BYTES:]
+
+    def render(self, spill_label: Optional[str] = None) -> str:
+        saved = ""
+        if self.spill_path:
+            partial = f"first {self.spilled} bytes of the " if self.spilled < self.total else ""
+            saved = f"; {partial}full output saved to '{spill_label or self.spill_path}'"
+        if self.is_binary:
+            return f"[binary output, {self.total} bytes{saved}]"
+        if not self.truncated:
+            return (self.head + self.tail).decode("utf-8", errors="replace")
+        omitted = self.total - len(self.head) - len(self.tail)
+        return (
+            f"{self.head.decode('utf-8', errors='replace')}\n"
+            f"[... {omitted} bytes omitted{saved} ...]\n"
+            f"{self.tail.decode('utf-8', errors='replace')}"
+        )
+
+class SandboxWorker:
+    # One long-lived `unshare` process per session. The user namespace is set up once at start, and
+    # commands are sent as JSON lines over its stdin instead of forking a new sandbox each time;
+    # each command still runs in a fresh mount namespace inside it (see sandbox_worker).
+    def __init__(self, session_id: Optional[str] = None):
+        self.session_id = session_id
+        self.last_used = time.monotonic()
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._progress: Dict[int, Callable[[Dict[str, Any]], None]] = {}
+        self._ids = itertools.count()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.returncode is None and not self._reader.done()
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._pending)
+
+    async def start(self):
+        # A final reply carries head and tail of both streams, base64-encoded, on a single line.
+        line_limit = 4 * (settings.sandbox_output_head_bytes + settings.sandbox_output_tail_bytes) + 65536
+        self._proc = await asyncio.create_subprocess_exec(
+            *SANDBOX_PREFIX, sys.executable, "-u", WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+            limit=line_limit,
+        )
+        self._reader = asyncio.get_running_loop().create_task(self._read_replies())
+
+    async def _read_replies(self):
+        try:
+            while True:
+                line = await self._proc.stdout.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                if reply.get("event") == "progress":
+                    self._report_progress(reply)
+                    continue
+                future = self._pending.pop(reply["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        except Exception as e:
+            logger.error(f"Sandbox worker for session '{self.session_id}' sent an unreadable reply: {e}")
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(SandboxError("Sandbox worker exited while a command was running."))
+            self._pending.clear()
+
+    def _report_progress(self, event: Dict[str, Any]):
+        callback = self._progress.get(event["id"])
+        if callback is None:
+            return
+        try:
+            callback({"stream": event["stream"], "bytes": event["bytes"]})
+        except Exception as e:
+            logger.warning(f"Sandbox progress callback failed: {e}")
+
+    async def run(
+        self, command: str, cwd: str, timeout: float, head_bytes: int, tail_bytes: int,
+        spill: Optional[str] = None, spill_max: int = 0,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        if not self.alive:
+            raise SandboxError("Sandbox worker is not running.")
+        self.last_used = time.monotonic()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        if on_progress is not None:
+            self._progress[request_id] = on_progress
+        request = {
+            "id": request_id, "command": command, "cwd": cwd, "timeout": timeout,
+            "head_bytes": head_bytes, "tail_bytes": tail_bytes, "spill": spill, "spill_max": spill_max,
+            "progress": settings.sandbox_progress_interval if on_progress is not None else None,
+        }
+        self._proc.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+        try:
+            await self._proc.stdin.drain()
+            # The worker enforces the timeout itself; the margin only covers a wedged worker.
+            reply = await asyncio.wait_for(future, timeout + settings.sandbox_timeout_grace_seconds)
+            return {
+                "exit_code": reply["exit_code"],
+                "timed_out": reply["timed_out"],
+                "stdout": CapturedOutput.from_reply(reply["stdout"]),
+                "stderr": CapturedOutput.from_reply(reply["stderr"]),
+            }
+        except asyncio.TimeoutError:
+            logger.error(f"Sandbox worker for session '{self.session_id}' stopped responding, killing it.")
+            await self.close()
+            raise SandboxError(f"Sandbox worker did not answer within {timeout}s.")
+        except (BrokenPipeError, ConnectionResetError):
+            raise SandboxError("Sandbox worker exited before accepting the command.")
+        finally:
+            self._pending.pop(request_id, None)
+            self._progress.pop(request_id, None)
+            self.last_used = time.monotonic()
+
+    async def close(self):
+        if self._proc is None:
+            return
+        if self._proc.returncode is None:
+            try:
+                # Closing stdin lets the worker kill its running commands and exit on its own.
+                self._proc.stdin.close()
+                await asyncio.wait_for(self._proc.wait(), 2.0)
+            except (asyncio.TimeoutError, BrokenPipeError, ConnectionResetError):
+                self._proc.kill()
+                await self._proc.wait()
+        if self._reader is not None:
+            await self._reader
+
+class SandboxPool:
+    # Hands each session its own worker and reuses it across that session's steps. A few spare
+    # workers are started ahead of time so a new session does not pay the startup either.
+    def __init__(self):
+        self._workers: "OrderedDict[str, SandboxWorker]" = OrderedDict()
+        self._spares: List[SandboxWorker] = []
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._prewarm: Optional[asyncio.Task] = None
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Subprocess transports belong to the loop that created them.
+            if self._workers or self._spares:
+                logger.warning("Sandbox pool was bound to a different event loop, starting fresh workers.")
+            self._workers.clear()
+            self._spares = []
+            self._lock = asyncio.Lock()
+            self._loop = loop
+            self._prewarm = None
+
+    async def _new_worker(self, reason: str) -> SandboxWorker:
+        worker = SandboxWorker()
+        await worker.start()
+        SANDBOX_WORKER_STARTS.labels(reason=reason).inc()
+        return worker
+
+    async def _fill_spares(self):
+        while len(self._spares) < settings.sandbox_prewarm_workers:
+            try:
+                self._spares.append(await self._new_worker("prewarm"))
+            except Exception as e:
+                logger.warning(f"Could not prewarm a sandbox worker: {e}")
+                return
+
+    def _schedule_prewarm(self):
+        if settings.sandbox_prewarm_workers > 0 and (self._prewarm is None or self._prewarm.done()):
+            self._prewarm = self._loop.create_task(self._fill_spares())
+
+    def _take_stale(self) -> List[SandboxWorker]:
+        now = time.monotonic()
+        stale = [
+            session_id for session_id, worker in self._workers.items()
+            if not worker.alive or (not worker.busy and now - worker.last_used > settings.sandbox_idle_seconds)
+        ]
+        # Over capacity, the least recently used idle sessions give up their worker.
+        idle = (s for s, worker in self._workers.items() if s not in stale and not worker.busy)
+        while len(self._workers) - len(stale) >= settings.sandbox_max_workers:
+            victim = next(idle, None)
+            if victim is None:
+                break
+            stale.append(victim)
+        return [self._workers.pop(session_id) for session_id in stale]
+
+    async def worker_for(self, session_id: str) -> SandboxWorker:
+        self._bind_loop()
+        async with self._lock:
+            worker = self._workers.get(session_id)
+            if worker is not None and worker.alive:
+                self._workers.move_to_end(session_id)
+                return worker
+            retired = self._take_stale()
+            while self._spares and not self._spares[-1].alive:
+                retired.append(self._spares.pop())
+            worker = self._spares.pop() if self._spares else await self._new_worker("session")
+            worker.session_id = session_id
+            self._workers[session_id] = worker
+        for stale in retired:
+            await stale.close()
+        self._schedule_prewarm()
+        return worker
+
+    async def run(
+        self, session_id: str, command: str, cwd: str, timeout: Optional[float] = None,
+        head_bytes: Optional[int] = None, tail_bytes: Optional[int] = None, spill: Optional[str] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        timeout = settings.sandbox_command_timeout if timeout is None else timeout
+        head_bytes = settings.sandbox_output_head_bytes if head_bytes is None else head_bytes
+        tail_bytes = settings.sandbox_output_tail_bytes if tail_bytes is None else tail_bytes
+        worker = await self.worker_for(session_id)
+        started = time.perf_counter()
+        try:
+            return await worker.run(
+                command, cwd, timeout, head_bytes, tail_bytes, spill=spill,
+                spill_max=settings.sandbox_spill_max_bytes, on_progress=on_progress
+            )
+        finally:
+            SANDBOX_COMMAND_SECONDS.observe(time.perf_counter() - started)
+
+    async def release(self, session_id: str):
+        worker = self._workers.pop(session_id, None)
+        if worker is not None:
+            await worker.close()
+
+    async def shutdown(self):
+        workers = list(self._workers.values()) + self._spares
+        self._workers.clear()
+        self._spares = []
+        if self._prewarm is not None:
+            self._prewarm.cancel()
+            self._prewarm = None
+        for worker in workers:
+            await worker.close()
+
+sandbox_pool = SandboxPool()
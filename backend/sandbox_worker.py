@@ -0,0 +1,162 @@
+# Runs inside the per-session user/mount namespace started by backend.sandbox and executes the
+# shell commands it is sent over stdin, one JSON request per line. Each command produces optional
+# "progress" lines and one final "exit" line.
+# Standard library only: it is launched by path so it never imports the backend package.
+import base64
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+# The worker's own mount namespace lives as long as the session; each command also gets a
+# private one of its own, so a mount made by one step is gone before the next step runs.
+COMMAND_PREFIX = ["unshare", "-m", "--"]
+
+_write_lock = threading.Lock()
+_active_lock = threading.Lock()
+_active = set()
+
+def _reply(message):
+    line = json.dumps(message) + "\n"
+    with _write_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+def _kill_group(pid):
+    # The whole process group goes, so background children cannot outlive the command.
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+class Capture:
+    # Keeps the first head_bytes and a ring of the last tail_bytes of a stream as raw bytes. Once
+    # the stream outgrows both, everything is also written to the spill file, up to spill_max bytes.
+    def __init__(self, name, head_bytes, tail_bytes, spill_path, spill_max):
+        self.name = name
+        self.head_bytes, self.tail_bytes = head_bytes, tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+        self.spill_path, self.spill_max = spill_path, spill_max
+        self.spill = None
+        self.spilled = 0
+
+    def feed(self, chunk):
+        self.total += len(chunk)
+        if len(self.head) < self.head_bytes:
+            take = self.head_bytes - len(self.head)
+            self.head += chunk[:take]
+            chunk = chunk[take:]
+        if self.spill is None and self.spill_path and self.total > self.head_bytes + self.tail_bytes:
+            # Nothing has been dropped yet, so head + tail + chunk is the complete output so far.
+            try:
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                self.spill = open(self.spill_path, "wb")
+                self._spill(bytes(self.head) + bytes(self.tail))
+            except OSError:
+                # Without a spill file the output is still captured, just truncated.
+                self.spill_path = None
+        if self.spill is not None:
+            self._spill(chunk)
+        self.tail += chunk
+        if len(self.tail) > self.tail_bytes:
+            del self.tail[:len(self.tail) - self.tail_bytes]
+
+    def _spill(self, data):
+        room = self.spill_max - self.spilled
+        if room > 0 and data:
+            self.spill.write(data[:room])
+            self.spilled += min(room, len(data))
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+
+    def result(self):
+        # Raw bytes travel base64-encoded; decoding to text is left to whoever reads them.
+        return {
+            "head": base64.b64encode(bytes(self.head)).decode("ascii"),
+            "tail": base64.b64encode(bytes(self.tail)).decode("ascii"),
+            "total": self.total,
+            "spill": self.spill_path if self.spill is not None else None,
+            "spilled": self.spilled,
+        }
+
+def _drain(stream, capture, request_id, progress):
+    last_progress = time.monotonic()
+    while True:
+        chunk = stream.read1(65536)
+        if not chunk:
+            break
+        capture.feed(chunk)
+        now = time.monotonic()
+        if progress is not None and now - last_progress >= progress:
+            last_progress = now
+            _reply({"id": request_id, "event": "progress", "stream": capture.name, "bytes": capture.total})
+    stream.close()
+    capture.close()
+
+def _run(request):
+    request_id = request["id"]
+    spill = request.get("spill")
+    captures = [
+        Capture(name, request["head_bytes"], request["tail_bytes"], f"{spill}.{name}.log" if spill else None,
+                request.get("spill_max", 0))
+        for name in ("stdout", "stderr")
+    ]
+    try:
+        proc = subprocess.Popen(
+            COMMAND_PREFIX + ["sh", "-c", request["command"]], cwd=request["cwd"], stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True
+        )
+    except OSError as e:
+        captures[1].feed(str(e).encode("utf-8"))
+        _reply({"id": request_id, "event": "exit", "exit_code": 127, "timed_out": False,
+                "stdout": captures[0].result(), "stderr": captures[1].result()})
+        return
+    readers = [
+        threading.Thread(target=_drain, args=(stream, capture, request_id, request.get("progress")), daemon=True)
+        for stream, capture in zip((proc.stdout, proc.stderr), captures)
+    ]
+    for reader in readers:
+        reader.start()
+    with _active_lock:
+        _active.add(proc.pid)
+    deadline = time.monotonic() + request["timeout"]
+    timed_out = False
+    try:
+        proc.wait(timeout=request["timeout"])
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        _kill_group(proc.pid)
+        proc.wait()
+    for reader in readers:
+        reader.join(max(0.0, deadline - time.monotonic()))
+    if any(reader.is_alive() for reader in readers):
+        # Background children still hold the pipes open after the shell exited.
+        _kill_group(proc.pid)
+        for reader in readers:
+            reader.join()
+    with _active_lock:
+        _active.discard(proc.pid)
+    _reply({"id": request_id, "event": "exit", "exit_code": proc.returncode, "timed_out": timed_out,
+            "stdout": captures[0].result(), "stderr": captures[1].result()})
+
+def main():
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        # Commands from one session may run concurrently (parallel plan steps), each on its own thread.
+        threading.Thread(target=_run, args=(request,), daemon=True).start()
+    # stdin closed: the pool released this worker, so nothing may keep running behind it.
+    with _active_lock:
+        for pid in _active:
+            _kill_group(pid)
+
+if __name__ == "__main__":
+    main()
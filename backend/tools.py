@@ -1,57 +1,25 @@
 import os
-import json
 import logging
-import subprocess
 import asyncio
-from typing import Any, Dict, List, NamedTuple
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 import git
 from pathlib import Path
 
-from backend.llm_client import get_llm_response
+from backend.llm_client import LLMStreamError, get_llm_response, stream_llm_response
 from backend.vault import VAULT_ROOT
 from backend.memory_manager import memory_manager
 from backend.config import settings
 from backend.schemas import ToolModel
-from backend.utils import retry_with_backoff, SecurityDecision
+from backend.utils import retry_with_backoff
+from backend.command_policy import assess_command
+from backend.sandbox import TIMEOUT_EXIT_CODE, sandbox_pool
+from backend.git_cache import check_clone_url, git_mirrors, git_runner, repository_root
+from backend.file_index import SPILL_DIR_NAME, file_indexes
 
 logger = logging.getLogger(__name__)
 
-async def assess_command(command: str, user_prompt: str) -> SecurityDecision:
-    safe_commands = ["ls", "cat", "pwd", "pip list", "echo"]
-    if any(command.strip().startswith(safe_cmd) for safe_cmd in safe_commands):
-        logger.info(f"Command '{command}' passed pre-filter as safe.")
-        return SecurityDecision(is_safe=True, reasoning="Command passed pre-filter as safe.")
-
-    logger.info(f"Engaging AI Security Officer to assess command: '{command}'")
-
-    security_prompt = (
-        "You are an AI Security Officer. Your only job is to determine if a shell command is safe to execute in the context of a user's request. "
-        "The command is considered 'SAFE' if it is not destructive (e.g., no `rm -rf`, `mv` on important files, `dd`), is not trying to access sensitive system files outside its workspace, and is directly related to the user's goal. "
-        "The command is 'UNSAFE' if it is destructive, tries to escalate privileges (`sudo`), or is clearly unrelated to the goal.\n\n"
-        f"User's Goal: \"{user_prompt}\"\n"
-        f"Command to Assess: \"{command}\"\n\n"
-        "Is this command SAFE or UNSAFE? Respond with ONLY the word SAFE or UNSAFE, followed by the reasoning."
-    )
-
-    messages = [{"role": "system", "content": security_prompt}]
-
-    response = await get_llm_response(
-        provider="mistral", model_name=settings.mistral_model, messages=messages,
-        temperature=0.0, max_tokens=50
-    )
-
-    parts = response.strip().split(None, 1)
-    label = parts[0].upper()
-    reasoning = parts[1] if len(parts) > 1 else ""
-    is_safe = label == "SAFE"
-
-    if is_safe:
-        logger.info(f"Security Officer approved command: '{command}'")
-    else:
-        logger.warning(f"Security Officer REJECTED command: '{command}'")
-
-    return SecurityDecision(is_safe=is_safe, reasoning=reasoning)
-
 def get_tool_definitions() -> List[Dict[str, Any]]:
     return [
         {
@@ -62,12 +30,22 @@ def get_tool_definitions() -> List[Dict[str, Any]]:
         {
             "name": "execute_script",
             "description": "Executes a single shell command.",
-            "parameters": { "type": "object", "properties": {"command": {"type": "string"}, "working_dir": {"type": "string"}}, "required": ["command"] },
+            "parameters": { "type": "object", "properties": {"command": {"type": "string"}, "working_dir": {"type": "string"}, "timeout": {"type": "number"}}, "required": ["command"] },
         },
         {
             "name": "git_clone",
             "description": "Clones a remote Git repository.",
-            "parameters": { "type": "object", "properties": {"repo_url": {"type": "string"}, "local_path": {"type": "string"}}, "required": ["repo_url"] },
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "repo_url": {"type": "string"},
+                    "local_path": {"type": "string"},
+                    "branch": {"type": "string", "description": "Branch or tag to check out instead of the default branch."},
+                    "depth": {"type": "integer", "description": "Only fetch this many most recent commits."},
+                    "sparse_paths": {"type": "array", "items": {"type": "string"}, "description": "Only check out these directories."}
+                },
+                "required": ["repo_url"]
+            },
         },
         {
             "name": "git_commit_and_push",
@@ -91,8 +69,16 @@ def get_tool_definitions() -> List[Dict[str, Any]]:
         },
         {
             "name": "list_files",
-            "description": "Lists all files in the session.",
-            "parameters": {"type": "object", "properties": {}, "required": []},
+            "description": "Lists files in the session, recursively by default, optionally under a directory or matching a glob pattern.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "Directory to list, relative to the session root."},
+                    "pattern": {"type": "string", "description": "Glob pattern matched against the file name or relative path, e.g. '*.py'."},
+                    "recursive": {"type": "boolean", "description": "Include files in subdirectories. Defaults to true."}
+                },
+                "required": []
+            },
         },
         {
             "name": "refactor_code",
@@ -112,18 +98,37 @@ async def handle_final_answer(params: Dict[str, Any], **kwargs) -> Dict[str, Any
     answer = params.get("answer", "I have processed the request.")
     return {"status": "success", "data": answer}
 
-def run_in_user_namespace(command: str, cwd: str) -> Dict[str, Any]:
-    result = subprocess.run(
-        ["unshare", "-U", "-r", "-m", "--", "sh", "-c", command],
-        cwd=cwd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
+def _prune_spill_files(spill_dir: Path):
+    try:
+        spills = sorted(spill_dir.iterdir(), key=lambda path: path.stat().st_mtime)
+    except OSError:
+        return
+    for old in spills[:-settings.sandbox_spill_keep_files or None]:
+        old.unlink(missing_ok=True)
+
+async def run_in_user_namespace(
+    command: str, cwd: str, session_id: Optional[str] = None, timeout: Optional[float] = None,
+    spill_dir: Optional[Path] = None, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    timeout = settings.sandbox_command_timeout if timeout is None else min(timeout, settings.sandbox_command_timeout)
+    spill = str(spill_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}") if spill_dir else None
+    result = await sandbox_pool.run(
+        session_id or "shared", command, cwd, timeout=timeout, spill=spill, on_progress=on_progress
     )
+    captured = result["stdout"] if result["exit_code"] == 0 else result["stderr"]
+    output_file = None
+    if captured.spill_path:
+        output_file = os.path.relpath(captured.spill_path, spill_dir.parent)
+        _prune_spill_files(spill_dir)
+    output = captured.render(output_file)
+    if result["timed_out"]:
+        output = f"Command timed out after {timeout}s.\n{output}"
     return {
-        "status": "success" if result.returncode == 0 else "error",
-        "output": result.stdout if result.returncode == 0 else result.stderr,
-        "exit_code": result.returncode
+        "status": "success" if result["exit_code"] == 0 and not result["timed_out"] else "error",
+        "output": output,
+        "exit_code": TIMEOUT_EXIT_CODE if result["timed_out"] else result["exit_code"],
+        "output_bytes": captured.total,
+        "output_file": output_file,
     }
 
 @retry_with_backoff(max_retries=3, base_delay=2.0, max_delay=10.0)
@@ -140,32 +145,68 @@ async def handle_execute_script(params: Dict[str, Any], session_id: str, user_pr
     if not target_cwd.is_dir():
         return {"status": "error", "message": f"Working directory '{working_dir_name}' does not exist."}
 
-    risk_assessment = await assess_command(command, user_prompt)
+    timeout = params.get("timeout")
+    if timeout is not None and (not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout <= 0):
+        return {"status": "error", "message": "'timeout' must be a positive number of seconds."}
+
+    risk_assessment = kwargs.get("security_verdicts", {}).get(command)
+    if risk_assessment is None:
+        risk_assessment = await assess_command(command, user_prompt)
     if not risk_assessment.is_safe:
         return {"status": "error", "message": f"Execution of command '{command}' was denied by AI Security Officer. Reason: {risk_assessment.reasoning}"}
 
     logger.info(f"Executing AI-approved shell command: '{command}' in '{target_cwd}'", extra={"session_id": session_id, "command": command, "tool": "execute_script"})
 
-    result = run_in_user_namespace(command, str(target_cwd))
+    progress_callback = kwargs.get("on_progress")
+
+    def report_progress(event: Dict[str, Any]):
+        progress_callback({"tool": "execute_script", "command": command, **event})
+
+    try:
+        result = await run_in_user_namespace(
+            command, str(target_cwd), session_id=session_id, timeout=timeout,
+            spill_dir=session_vault_path / SPILL_DIR_NAME, on_progress=report_progress if progress_callback else None,
+        )
+    finally:
+        # The command may have changed any file; the next listing reconciles the index with the disk.
+        file_indexes.for_session(session_vault_path).mark_dirty()
 
     if result["status"] == "success":
-        return {"status": "success", "data": result["output"]}
+        response = {"status": "success", "data": result["output"]}
     else:
-        return {"status": "error", "message": result["output"], "exit_code": result["exit_code"]}
+        response = {"status": "error", "message": result["output"], "exit_code": result["exit_code"]}
+    if result.get("output_file"):
+        response["output_file"] = result["output_file"]
+    return response
 
 @retry_with_backoff(max_retries=3, base_delay=2.0, max_delay=10.0)
 async def handle_git_clone(params: Dict[str, Any], session_id: str, **kwargs) -> Dict[str, Any]:
     repo_url = params.get("repo_url")
     if not repo_url:
         return {"status": "error", "message": "Missing 'repo_url' parameter."}
+    try:
+        check_clone_url(repo_url)
+    except (git.exc.UnsafeProtocolError, git.exc.UnsafeOptionError) as e:
+        return {"status": "error", "message": f"Refusing to clone '{repo_url}': {e}"}
     repo_name = repo_url.split('/')[-1].replace('.git', '')
     local_path = params.get("local_path", repo_name)
     session_vault_path = Path(VAULT_ROOT) / session_id
     clone_path = session_vault_path / local_path
-    if clone_path.exists():
-        return {"status": "error", "message": f"Directory '{local_path}' already exists."}
-    logger.info(f"Cloning repository from '{repo_url}' into '{clone_path}'...", extra={"session_id": session_id, "tool": "git_clone", "repo_url": repo_url})
-    git.Repo.clone_from(repo_url, str(clone_path))
+    depth = params.get("depth")
+    if depth is not None and (not isinstance(depth, int) or isinstance(depth, bool) or depth < 1):
+        return {"status": "error", "message": "'depth' must be a positive integer."}
+    sparse_paths = params.get("sparse_paths") or None
+    if sparse_paths is not None and (not isinstance(sparse_paths, list) or not all(isinstance(p, str) and p for p in sparse_paths)):
+        return {"status": "error", "message": "'sparse_paths' must be a list of paths."}
+    async with git_runner.locked(clone_path):
+        if clone_path.exists():
+            return {"status": "error", "message": f"Directory '{local_path}' already exists."}
+        logger.info(f"Cloning repository from '{repo_url}' into '{clone_path}'...", extra={"session_id": session_id, "tool": "git_clone", "repo_url": repo_url})
+        await git_runner.run(
+            "clone", git_mirrors.clone, repo_url, clone_path,
+            branch=params.get("branch"), depth=depth, sparse_paths=sparse_paths
+        )
+        await asyncio.to_thread(file_indexes.for_session(session_vault_path).record_tree, clone_path)
     return {"status": "success", "data": f"Successfully cloned repository into '{local_path}'."}
 
 @retry_with_backoff(max_retries=3, base_delay=2.0, max_delay=10.0)
@@ -179,6 +220,10 @@ async def handle_git_commit_and_push(params: Dict[str, Any], session_id: str, **
     if not full_repo_path.is_dir():
         return {"status": "error", "message": f"Repository path '{repo_path}' does not exist."}
     logger.info(f"Committing and pushing changes in '{full_repo_path}'...", extra={"session_id": session_id, "tool": "git_commit_and_push", "repo_path": repo_path})
+    async with git_runner.locked(repository_root(full_repo_path, session_vault_path)):
+        return await git_runner.run("commit_and_push", _commit_and_push, full_repo_path, commit_message)
+
+def _commit_and_push(full_repo_path: Path, commit_message: str) -> Dict[str, Any]:
     repo = git.Repo(str(full_repo_path))
     repo.git.add(A=True)
     if not repo.is_dirty(untracked_files=True):
@@ -191,20 +236,39 @@ async def handle_git_commit_and_push(params: Dict[str, Any], session_id: str, **
         return {"status": "error", "message": f"Failed to push to remote: {error_summary}"}
     return {"status": "success", "data": f"Successfully committed and pushed changes with message: '{commit_message}'."}
 
+CODE_GEN_SYSTEM_PROMPT = "You are a code generation engine..."
+
+def _code_generation_messages(prompt: str) -> List[Dict[str, str]]:
+    return [{"role": "system", "content": CODE_GEN_SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+def stream_code_generation(prompt: str) -> AsyncIterator[str]:
+    return stream_llm_response(
+        provider="mistral", model_name="codestral-latest", messages=_code_generation_messages(prompt),
+        temperature=0.0, top_p=1.0, max_tokens=4096, stop_tokens=[]
+    )
+
 @retry_with_backoff(max_retries=5, base_delay=5.0, max_delay=30.0)
 async def handle_code_generation(params: Dict[str, Any], **kwargs) -> Dict[str, Any]:
     prompt = params.get("prompt")
     if not prompt:
         return {"status": "error", "message": "Missing 'prompt'."}
-    code_gen_system_prompt = "You are a code generation engine..."
-    code_string = await get_llm_response(
-        provider="mistral", model_name="codestral-latest",
-        messages=[{"role": "system", "content": code_gen_system_prompt}, {"role": "user", "content": prompt}],
-        temperature=0.0, top_p=1.0, max_tokens=4096, stop_tokens=[]
-    )
+    if settings.llm_stream_code_generation:
+        try:
+            code_string = "".join([chunk async for chunk in stream_code_generation(prompt)])
+        except LLMStreamError as e:
+            if e.retryable:
+                raise
+            return {"status": "error", "message": str(e)}
+    else:
+        code_string = await get_llm_response(
+            provider="mistral", model_name="codestral-latest", messages=_code_generation_messages(prompt),
+            temperature=0.0, top_p=1.0, max_tokens=4096, stop_tokens=[]
+        )
     return {"status": "success", "data": code_string}
 
-async def handle_write_file(params: Dict[str, Any], session_id: str, **kwargs) -> Dict[str, Any]:
+async def handle_write_file(
+    params: Dict[str, Any], session_id: str, content_stream: Optional[AsyncIterator[str]] = None, **kwargs
+) -> Dict[str, Any]:
     filename = params.get("filename")
     content = params.get("content", "")
     if not filename:
@@ -212,9 +276,26 @@ async def handle_write_file(params: Dict[str, Any], session_id: str, **kwargs) -
     session_vault_path = Path(VAULT_ROOT) / session_id
     file_path = session_vault_path / filename
     file_path.parent.mkdir(parents=True, exist_ok=True)
-    with file_path.open('w', encoding='utf-8') as f:
-        f.write(content)
-    memory_manager.add_to_memory(content=content, filename=filename, session_id=session_id)
+    if content_stream is None:
+        with file_path.open('w', encoding='utf-8') as f:
+            f.write(content)
+    else:
+        # Streamed into a scratch file and swapped in whole, so readers never see a half-written file
+        # and a failed stream leaves the original untouched.
+        partial = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex[:8]}.partial")
+        try:
+            parts = []
+            with partial.open('w', encoding='utf-8') as f:
+                async for chunk in content_stream:
+                    f.write(chunk)
+                    parts.append(chunk)
+            os.replace(partial, file_path)
+        finally:
+            if partial.exists():
+                partial.unlink()
+        content = "".join(parts)
+    file_indexes.for_session(session_vault_path).record(file_path, content.encode('utf-8'))
+    await memory_manager.enqueue(content=content, filename=filename, session_id=session_id)
     return {"status": "success", "data": f"Successfully wrote {len(content.encode('utf-8'))} bytes to '{filename}'."}
 
 async def handle_read_file(params: Dict[str, Any], session_id: str, **kwargs) -> Dict[str, Any]:
@@ -239,11 +320,29 @@ async def handle_list_files(params: Dict[str, Any], session_id: str, **kwargs) -
     session_vault_path = Path(VAULT_ROOT) / session_id
     if not session_vault_path.exists():
         return {"status": "success", "data": "No files in session."}
-    files = [f.name for f in session_vault_path.iterdir() if f.is_file()]
-    if not files:
+    index = file_indexes.for_session(session_vault_path)
+    # Served from the session's file index; only a listing after execute_script touches the disk.
+    entries = await asyncio.to_thread(
+        index.list, prefix=params.get("path") or "", pattern=params.get("pattern"), recursive=params.get("recursive", True)
+    )
+    if not entries:
         return {"status": "success", "data": "No files in session."}
+    files = [entry.path for entry in entries[:settings.file_list_max_entries]]
+    if len(entries) > len(files):
+        files.append(f"... {len(entries) - len(files)} more files; narrow the listing with 'path' or 'pattern'.")
     return {"status": "success", "data": "\n".join(files)}
 
+@retry_with_backoff(max_retries=5, base_delay=5.0, max_delay=30.0)
+async def _stream_refactored_code(filename: str, prompt: str, session_id: str) -> Dict[str, Any]:
+    try:
+        return await handle_write_file(
+            {"filename": filename}, session_id=session_id, content_stream=stream_code_generation(prompt)
+        )
+    except LLMStreamError as e:
+        if e.retryable:
+            raise
+        return {"status": "error", "message": str(e)}
+
 async def handle_refactor_code(params: Dict[str, Any], session_id: str, **kwargs) -> Dict[str, Any]:
     filename = params.get("filename")
     refactoring_prompt = params.get("refactoring_prompt")
@@ -264,16 +363,17 @@ async def handle_refactor_code(params: Dict[str, Any], session_id: str, **kwargs
         f"Respond with ONLY the complete, refactored code. Do not add any commentary or explanations."
     )
 
-    generation_result = await handle_code_generation({"prompt": full_prompt})
-    if generation_result["status"] == "error":
-        return generation_result
-
-    refactored_code = generation_result["data"]
+    if settings.llm_stream_code_generation:
+        write_result = await _stream_refactored_code(filename, full_prompt, session_id)
+    else:
+        generation_result = await handle_code_generation({"prompt": full_prompt})
+        if generation_result["status"] == "error":
+            return generation_result
 
-    write_result = await handle_write_file(
-        {"filename": filename, "content": refactored_code},
-        session_id=session_id
-    )
+        write_result = await handle_write_file(
+            {"filename": filename, "content": generation_result["data"]},
+            session_id=session_id
+        )
 
     if write_result["status"] == "success":
         return {"status": "success", "data": f"Successfully refactored and saved '{filename}'."}
@@ -292,9 +392,9 @@ TOOL_DISPATCHER = {
     "refactor_code": handle_refactor_code,
 }
 
-async def execute_tool(tool: ToolModel, parameters: Dict[str, Any], session_id: str, user_prompt: str) -> Dict[str, Any]:
+async def execute_tool(tool: ToolModel, parameters: Dict[str, Any], session_id: str, user_prompt: str, **context) -> Dict[str, Any]:
     tool_name = tool.name
     if tool_name in TOOL_DISPATCHER:
-        return await TOOL_DISPATCHER[tool_name](parameters, session_id=session_id, user_prompt=user_prompt)
+        return await TOOL_DISPATCHER[tool_name](parameters, session_id=session_id, user_prompt=user_prompt, **context)
     else:
         return {"status": "error", "message": f"Tool '{tool_name}' not found."}
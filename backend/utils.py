@@ -15,6 +15,8 @@ from backend.schemas import PlanModel, StepModel
 
 logger = logging.getLogger(__name__)
 
+PLACEHOLDER_PATTERN = re.compile(r"<ref:step_(\d+)_result>|{{\s*step_(\d+)_result\s*}}")
+
 class SecurityDecision(NamedTuple):
     is_safe: bool
     reasoning: str
@@ -63,14 +65,13 @@ def substitute_placeholders(parameters: Dict[str, Any], results: Dict[int, Any])
     output_params = parameters.copy()
     for key, value in output_params.items():
         if isinstance(value, str):
-            placeholder_pattern = r"<ref:step_(\d+)_result>|{{\s*step_(\d+)_result\s*}}"
             def replace_match(match):
                 step_index_str = match.group(1) or match.group(2)
                 step_index = int(step_index_str)
                 if step_index in results:
                     return str(results[step_index].get("data", ""))
                 return match.group(0)
-            output_params[key] = re.sub(placeholder_pattern, replace_match, value)
+            output_params[key] = PLACEHOLDER_PATTERN.sub(replace_match, value)
     return output_params
 
 def plan_sanity_check(plan: List[StepModel], user_prompt: str) -> (bool, str):
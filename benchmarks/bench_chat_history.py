@@ -0,0 +1,69 @@
+# benchmarks/bench_chat_history.py
+#
+# Replays conversations turn by turn, once saving the full history after every turn with the old
+# strategy (fresh connection, DELETE the session, re-INSERT every message row by row) and once
+# appending each turn's new messages to the current append-only store.
+#
+#   python -m benchmarks.bench_chat_history --sessions 20 --turns 200
+import argparse
+import json
+import logging
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from backend import database
+
+def legacy_save(path: str, session_id: str, history):
+    with sqlite3.connect(path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT OR IGNORE INTO sessions (session_id) VALUES (?)", (session_id,))
+        cursor.execute("DELETE FROM chat_history WHERE session_id = ?", (session_id,))
+        for entry in history:
+            content = entry["content"]
+            if not isinstance(content, str):
+                content = json.dumps(content)
+            cursor.execute(
+                "INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)",
+                (session_id, entry["role"], content)
+            )
+        conn.commit()
+
+def replay(save, sessions: int, turns: int) -> float:
+    histories = {f"s{i}": [] for i in range(sessions)}
+    started = time.perf_counter()
+    for turn in range(turns):
+        for session_id, history in histories.items():
+            history.append({"role": "user", "content": f"request {turn} " * 20})
+            history.append({"role": "assistant", "content": {"response": f"answer {turn} " * 40}})
+            save(session_id, history)
+    return time.perf_counter() - started
+
+def main(sessions: int, turns: int):
+    saves = sessions * turns
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = str(Path(tmp) / "legacy.db")
+        with patch("backend.database.settings.database_file", legacy_path):
+            database.create_tables()
+            database.get_db_connection().execute("PRAGMA journal_mode=DELETE")
+            database.close_db_connections()
+        legacy = replay(lambda s, h: legacy_save(legacy_path, s, h), sessions, turns)
+
+        with patch("backend.database.settings.database_file", str(Path(tmp) / "current.db")):
+            database.create_tables()
+            current = replay(lambda s, h: database.append_chat_messages(s, h[-2:]), sessions, turns)
+            database.close_db_connections()
+
+    print(f"{sessions} sessions x {turns} turns ({saves} saves, {2 * turns} messages per session at the end)")
+    print(f"delete + re-insert  {legacy:8.2f}s  {legacy / saves * 1000:8.2f}ms/save")
+    print(f"append-only, WAL    {current:8.2f}s  {current / saves * 1000:8.2f}ms/save")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    main(args.sessions, args.turns)
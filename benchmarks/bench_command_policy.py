@@ -0,0 +1,70 @@
+# benchmarks/bench_command_policy.py
+#
+# Replays a synthetic stream of execute_script commands through assess_command and
+# counts how many still reach the Security Officer LLM, against the old five-prefix filter.
+#
+#   python -m benchmarks.bench_command_policy --commands 1000
+import argparse
+import asyncio
+import logging
+import random
+import time
+from unittest.mock import AsyncMock, patch
+
+from backend import command_policy
+
+GOALS = [
+    "Run the test suite",
+    "Set up the build directory",
+    "Install the project dependencies",
+    "Inspect the repository layout",
+    "Generate the release artifacts",
+]
+
+COMMANDS = [
+    ("python -m pytest", 20), ("python -m pytest -q tests", 10), ("mkdir build", 8), ("mkdir -p build/out", 6),
+    ("ls -la", 10), ("cat setup.py", 6), ("git status", 6), ("git diff --stat", 4), ("pip list", 4),
+    ("pip install -r requirements.txt", 6), ("python setup.py sdist", 5), ("python scripts/release.py", 4),
+    ("rm -rf build", 3), ("npm install", 3), ("make", 3), ("grep -rn TODO src", 4), ("sudo make install", 1),
+    ("chmod +x run.sh", 2), ("./run.sh", 2), ("tar czf dist.tar.gz dist", 2),
+]
+
+OLD_SAFE_PREFIXES = ["ls", "cat", "pwd", "pip list", "echo"]
+
+def _generate(n: int, seed: int):
+    rng = random.Random(seed)
+    population = [c for c, _ in COMMANDS]
+    weights = [w for _, w in COMMANDS]
+    for _ in range(n):
+        command = rng.choices(population, weights)[0]
+        # Every few commands gets a unique file argument so the stream keeps some genuinely new work.
+        if rng.random() < 0.05:
+            command = f"python tools/task_{rng.randrange(10_000)}.py"
+        yield command, rng.choice(GOALS)
+
+async def main(n: int, seed: int):
+    commands = list(_generate(n, seed))
+    baseline_calls = sum(1 for c, _ in commands if not any(c.strip().startswith(p) for p in OLD_SAFE_PREFIXES))
+
+    policy = command_policy.CommandPolicy(command_policy.ALLOW_RULES, command_policy.DENY_BINARIES, cache_size=4096)
+    with patch.object(command_policy, "command_policy", policy), \
+            patch.object(command_policy, "get_llm_response", new_callable=AsyncMock, return_value="SAFE ok") as mock_llm:
+        started = time.perf_counter()
+        for command, goal in commands:
+            await command_policy.assess_command(command, goal)
+        elapsed = time.perf_counter() - started
+
+    per_1k = 1000 / n
+    print(f"commands assessed:           {n}")
+    print(f"LLM calls, prefix filter:    {baseline_calls} ({baseline_calls * per_1k:.0f} per 1k)")
+    print(f"LLM calls, policy + cache:   {mock_llm.await_count} ({mock_llm.await_count * per_1k:.0f} per 1k)")
+    print(f"LLM calls avoided per 1k:    {(baseline_calls - mock_llm.await_count) * per_1k:.0f}")
+    print(f"local decision overhead:     {elapsed / n * 1e6:.1f} us/command")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commands", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(main(args.commands, args.seed))
@@ -0,0 +1,110 @@
+# benchmarks/bench_embedding_backends.py
+#
+# Loads the embedding model once per backend (torch, onnx, onnx-int8), each in a fresh process so
+# peak RSS is comparable, and reports load time, memory, single-text latency, batch throughput and
+# recall@10 of a fixed synthetic corpus against the float32 torch baseline.
+# Needs the model weights and, for the ONNX backends, `pip install sentence-transformers[onnx]`.
+#
+#   python -m benchmarks.bench_embedding_backends --backends torch onnx onnx-int8 --docs 2000
+import argparse
+import json
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+WORDS = (
+    "load save parse render fetch update delete config payment invoice user session token cache index "
+    "retry queue worker batch stream socket file path request response handler error timeout schema"
+).split()
+
+def corpus(n_docs: int, n_queries: int, seed: int):
+    rng = random.Random(seed)
+    docs = [" ".join(rng.choices(WORDS, k=rng.randint(6, 24))) for _ in range(n_docs)]
+    queries = [" ".join(rng.choices(WORDS, k=rng.randint(3, 8))) for _ in range(n_queries)]
+    return docs, queries
+
+def child(backend: str, model_name: str, n_docs: int, n_queries: int, seed: int, out_dir: str):
+    from backend.embedding_service import EmbeddingService
+
+    docs, queries = corpus(n_docs, n_queries, seed)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    service = EmbeddingService(model_name, workers=0, backend=backend)
+    started = time.perf_counter()
+    if not service.available:
+        print(json.dumps({"error": f"could not load {backend} model"}))
+        return
+    load_seconds = time.perf_counter() - started
+
+    service.encode(queries[:4])
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        service.encode([query])
+        latencies.append((time.perf_counter() - started) * 1000)
+    started = time.perf_counter()
+    doc_vectors = np.asarray(service.encode(docs), dtype=np.float32)
+    batch_seconds = time.perf_counter() - started
+    np.save(Path(out_dir) / f"{backend}-docs.npy", doc_vectors)
+    np.save(Path(out_dir) / f"{backend}-queries.npy", np.asarray(service.encode(queries), dtype=np.float32))
+    print(json.dumps({
+        "load_seconds": load_seconds,
+        "rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024,
+        "p50_ms": statistics.median(latencies),
+        "docs_per_second": len(docs) / batch_seconds,
+    }))
+
+def _top_k(out_dir: Path, backend: str, k: int):
+    docs = np.load(out_dir / f"{backend}-docs.npy")
+    queries = np.load(out_dir / f"{backend}-queries.npy")
+    docs /= np.linalg.norm(docs, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return [set(np.argsort(-row)[:k]) for row in queries @ docs.T]
+
+def main(backends, model_name: str, n_docs: int, n_queries: int, seed: int):
+    with tempfile.TemporaryDirectory() as out_dir:
+        results = {}
+        for backend in backends:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_embedding_backends", "--child", backend, "--model", model_name,
+                 "--docs", str(n_docs), "--queries", str(n_queries), "--seed", str(seed), "--out", out_dir],
+                cwd=REPO_ROOT, capture_output=True, text=True
+            ).stdout.strip().splitlines()
+            results[backend] = json.loads(output[-1]) if output else {"error": "benchmark process failed"}
+
+        baseline = _top_k(Path(out_dir), "torch", 10) if "load_seconds" in results.get("torch", {}) else None
+        print(f"{model_name}: {n_docs} docs, {n_queries} queries")
+        for backend, result in results.items():
+            if "error" in result:
+                print(f"{backend:<10} {result['error']}")
+                continue
+            recall = "-"
+            if baseline is not None:
+                got = _top_k(Path(out_dir), backend, 10)
+                recall = f"{statistics.mean(len(a & b) / 10 for a, b in zip(got, baseline)):.3f}"
+            print(
+                f"{backend:<10} load={result['load_seconds']:6.2f}s rss=+{result['rss_mb']:7.1f}MB "
+                f"p50={result['p50_ms']:7.2f}ms batch={result['docs_per_second']:8.1f} docs/s recall@10={recall}"
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.model, args.docs, args.queries, args.seed, args.out)
+    else:
+        main(args.backends, args.model, args.docs, args.queries, args.seed)
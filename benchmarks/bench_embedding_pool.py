@@ -0,0 +1,96 @@
+# benchmarks/bench_embedding_pool.py
+#
+# Simulates concurrent sessions asking for embeddings while the event loop also has to stay
+# responsive. The model is a stand-in that burns CPU in pure Python (holding the GIL, like the
+# tokenizer/pre/post-processing around a real forward pass) with a fixed per-call overhead, so it
+# shows both the loop stall of encoding inline and the effect of batching concurrent requests.
+#
+#   python -m benchmarks.bench_embedding_pool --sessions 32 --requests 8 --workers 1 2
+import argparse
+import asyncio
+import logging
+import time
+from unittest.mock import patch
+
+import numpy as np
+
+from backend.embedding_service import EmbeddingService
+
+class BusyModel:
+    def __init__(self, call_ms: float, text_ms: float):
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+
+    def _spin(self, ms: float):
+        deadline = time.perf_counter() + ms / 1000
+        while time.perf_counter() < deadline:
+            pass
+
+    def encode(self, texts):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        self._spin(self.call_ms + self.text_ms * len(texts))
+        vectors = np.ones((len(texts), 8), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+def busy_factory(name: str) -> BusyModel:
+    call_ms, text_ms = (float(x) for x in name.split(":")[1:])
+    return BusyModel(call_ms, text_ms)
+
+async def _measure(encode, sessions: int, requests: int):
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            expected = loop.time() + 0.001
+            await asyncio.sleep(0.001)
+            lags.append(max(0.0, loop.time() - expected) * 1000)
+
+    async def session(i: int):
+        for j in range(requests):
+            await encode([f"session {i} request {j}"])
+
+    tick = asyncio.ensure_future(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    lags.sort()
+    return elapsed, lags[int(len(lags) * 0.99) - 1] if lags else 0.0, lags[-1] if lags else 0.0
+
+async def main(sessions: int, requests: int, worker_counts, call_ms: float, text_ms: float):
+    model_name = f"busy:{call_ms}:{text_ms}"
+    total = sessions * requests
+    print(f"{sessions} sessions x {requests} requests, model: {call_ms}ms/call + {text_ms}ms/text")
+
+    inline = busy_factory(model_name)
+    async def encode_inline(texts):
+        return inline.encode(texts)
+    runs = [("inline on event loop", encode_inline, None)]
+    for workers in [0] + list(worker_counts):
+        service = EmbeddingService(model_name, factory=busy_factory, workers=workers)
+        label = "batched, thread" if workers == 0 else f"batched, {workers} process(es)"
+        runs.append((label, service.encode_many, service))
+
+    for label, encode, service in runs:
+        if service is not None:
+            await encode(["warm up"])
+        elapsed, p99, worst = await _measure(encode, sessions, requests)
+        print(f"{label:<26} {total / elapsed:8.1f} encodes/s  loop lag p99={p99:7.1f}ms max={worst:7.1f}ms")
+        if service is not None:
+            service.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--call-ms", type=float, default=8.0)
+    parser.add_argument("--text-ms", type=float, default=0.5)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    with patch("backend.embedding_service.settings.embedding_torch_threads", 0):
+        asyncio.run(main(args.sessions, args.requests, args.workers, args.call_ms, args.text_ms))
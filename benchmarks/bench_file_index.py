@@ -0,0 +1,68 @@
+# benchmarks/bench_file_index.py
+#
+# Lists a session vault holding a cloned-repository-sized tree, once by walking and stat-ing the
+# directory (what a recursive list_files would otherwise cost) and once from the session file
+# index, clean and after execute_script marked it dirty. Also times recording one written file.
+#
+#   python -m benchmarks.bench_file_index --files 20000 --repeat 20
+import argparse
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from backend.file_index import SessionFileIndex
+
+def build_tree(root: Path, files: int):
+    for i in range(files):
+        path = root / f"pkg{i % 50}" / f"mod{i % 7}" / f"file{i}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"value = {i}\n")
+
+def walk_listing(root: Path):
+    listing = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if name not in (".git", ".index")]
+        for name in filenames:
+            path = Path(dirpath) / name
+            listing.append((path.relative_to(root).as_posix(), path.stat().st_size))
+    return sorted(listing)
+
+def timed(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        build_tree(root, args.files)
+        started = time.perf_counter()
+        index = SessionFileIndex(root)
+        index.refresh()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        def dirty_listing():
+            index.mark_dirty()
+            index.list()
+
+        written = root / "pkg0" / "mod0" / "file0.py"
+        content = written.read_bytes()
+        print(f"{args.files} files, initial index build {build_ms:.0f}ms")
+        print(f"walk + stat listing:      {timed(lambda: walk_listing(root), args.repeat):8.2f}ms")
+        print(f"index listing (clean):    {timed(index.list, args.repeat):8.2f}ms")
+        print(f"index listing (filtered): {timed(lambda: index.list(prefix='pkg3/mod1', pattern='*.py'), args.repeat):8.2f}ms")
+        print(f"index listing (dirty):    {timed(dirty_listing, args.repeat):8.2f}ms")
+        print(f"record one written file:  {timed(lambda: index.record(written, content), args.repeat * 10):8.3f}ms")
+        print(f"reopen from log:          {timed(lambda: SessionFileIndex(root), args.repeat):8.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/bench_git_clone.py
+#
+# Builds a synthetic origin repository and clones it into several session directories, once with
+# a direct git.Repo.clone_from per session (what git_clone used to do) and once through the mirror
+# cache. The origin is reached over file://, so every direct clone pays a full pack transfer as it
+# would over the network; the mirror cache pays it once. Disk usage counts hardlinked files once.
+#
+#   python -m benchmarks.bench_git_clone --sessions 8 --files 2000 --commits 20
+import argparse
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import git
+
+from backend.git_cache import MirrorCache
+
+def build_origin(path: Path, files: int, commits: int):
+    path.mkdir(parents=True)
+    subprocess.run(["git", "init", "-q", "-b", "main"], cwd=path, check=True)
+    for commit in range(commits):
+        for i in range(files):
+            if commit == 0 or i % commits == commit:
+                target = path / f"pkg{i % 50}" / f"module_{i}.py"
+                target.parent.mkdir(exist_ok=True)
+                target.write_text(f"# revision {commit}\n" + f"def f_{i}(x):\n    return x * {i}\n" * 40)
+        subprocess.run(["git", "add", "-A"], cwd=path, check=True)
+        subprocess.run(["git", "-c", "user.name=b", "-c", "user.email=b@example.com", "commit", "-q", "-m", f"c{commit}"],
+                       cwd=path, check=True)
+
+def disk_usage(root: Path) -> int:
+    seen, total = set(), 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            stat = os.lstat(os.path.join(dirpath, name))
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+def run(label: str, clone, sessions: int, root: Path):
+    started = time.perf_counter()
+    first = None
+    for i in range(sessions):
+        clone(root / f"s{i}" / "project")
+        if first is None:
+            first = time.perf_counter() - started
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22} first={first:6.2f}s  all={elapsed:6.2f}s  disk={disk_usage(root) / 2**20:8.1f}MB")
+
+def main(sessions: int, files: int, commits: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        build_origin(tmp / "origin", files, commits)
+        url = (tmp / "origin").as_uri()
+        print(f"{sessions} session clones of a {files}-file, {commits}-commit repository")
+        run("direct clone_from", lambda dest: git.Repo.clone_from(url, str(dest)), sessions, tmp / "direct")
+        cache = MirrorCache(str(tmp / "cached" / ".git-mirrors"))
+        run("mirror cache", lambda dest: cache.clone(url, dest), sessions, tmp / "cached")
+        run("mirror, depth=1", lambda dest: cache.clone(url, dest, depth=1), sessions, tmp / "shallow")
+        run("mirror, sparse 1 dir", lambda dest: cache.clone(url, dest, depth=1, sparse_paths=["pkg0"]), sessions, tmp / "sparse")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--commits", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    main(args.sessions, args.files, args.commits)
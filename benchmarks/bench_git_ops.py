@@ -0,0 +1,64 @@
+# benchmarks/bench_git_ops.py
+#
+# Several sessions clone a repository and commit to it concurrently on one event loop, once with
+# the git calls made inline in the coroutines (what the git tools used to do) and once through the
+# git executor with per-repository locks. A probe task reports how late the event loop woke it.
+#
+#   python -m benchmarks.bench_git_ops --sessions 8 --files 1000
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from backend.git_cache import GitRunner, MirrorCache
+from backend.loop_monitor import LoopLagMonitor
+from benchmarks.bench_git_clone import build_origin
+
+def clone_and_commit(cache: MirrorCache, url: str, destination: Path):
+    repo = cache.clone(url, destination)
+    (destination / "CHANGE.md").write_text(f"{destination}\n")
+    repo.git.add(A=True)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "b")
+        config.set_value("user", "email", "b@example.com")
+    repo.index.commit("change")
+
+async def inline(cache: MirrorCache, url: str, destination: Path, runner: GitRunner):
+    clone_and_commit(cache, url, destination)
+    await asyncio.sleep(0)
+
+async def pooled(cache: MirrorCache, url: str, destination: Path, runner: GitRunner):
+    async with runner.locked(destination):
+        await runner.run("bench", clone_and_commit, cache, url, destination)
+
+async def measure(step, sessions: int, url: str, root: Path):
+    cache, runner = MirrorCache(str(root / ".git-mirrors")), GitRunner()
+    cache.ensure_mirror(url)
+    monitor = LoopLagMonitor(interval=0.005)
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*[step(cache, url, root / f"s{i}" / "project", runner) for i in range(sessions)])
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+    runner.shutdown()
+    return elapsed, monitor.summary()
+
+def main(sessions: int, files: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        build_origin(tmp / "origin", files, 5)
+        url = (tmp / "origin").as_uri()
+        print(f"{sessions} concurrent sessions: clone from the mirror cache + commit ({files}-file repository)")
+        for label, step in (("inline in coroutines", inline), ("git executor + repo locks", pooled)):
+            elapsed, lag = asyncio.run(measure(step, sessions, url, tmp / label.split()[0]))
+            print(f"{label:<26} {elapsed:6.2f}s  loop lag p99={lag['p99_ms']:8.2f}ms max={lag['max_ms']:8.2f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--files", type=int, default=1000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    main(args.sessions, args.files)
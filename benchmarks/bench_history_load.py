@@ -0,0 +1,74 @@
+# benchmarks/bench_history_load.py
+#
+# Runs many concurrent sessions on one event loop. Each turn loads the session history, awaits a
+# simulated LLM call, and appends the turn's two new messages. The run is done once with the synchronous
+# database functions called straight from the coroutines, and once with the async history store
+# (dedicated DB thread plus group commit). A probe task reports how late the event loop woke it.
+#
+#   python -m benchmarks.bench_history_load --sessions 200 --turns 20
+import argparse
+import asyncio
+import logging
+import random
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from backend import database
+from backend.loop_monitor import LoopLagMonitor
+
+async def session(load, save, session_id: str, turns: int, think_ms: float, rng: random.Random):
+    for turn in range(turns):
+        history = await load(session_id)
+        history.append({"role": "user", "content": f"request {turn} " * 20})
+        await asyncio.sleep(rng.uniform(0, 2 * think_ms) / 1000.0)
+        history.append({"role": "assistant", "content": {"response": f"answer {turn} " * 40}})
+        await save(session_id, history)
+
+async def run(load, save, sessions: int, turns: int, think_ms: float, seed: int):
+    rng = random.Random(seed)
+    monitor = LoopLagMonitor(interval=0.005)
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*[session(load, save, f"s{i}", turns, think_ms, rng) for i in range(sessions)])
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+    return elapsed, monitor.summary()
+
+async def sync_load(session_id: str):
+    return database.load_chat_history(session_id)
+
+async def sync_save(session_id: str, history):
+    database.append_chat_messages(session_id, history[-2:])
+
+async def async_save(session_id: str, history):
+    await database.aappend_chat_messages(session_id, history[-2:])
+
+def main(sessions: int, turns: int, think_ms: float, seed: int):
+    operations = sessions * turns * 2
+    print(f"{sessions} concurrent sessions x {turns} turns ({operations} history operations), think time ~{think_ms}ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, load, save in (
+            ("sync sqlite in coroutines", sync_load, sync_save),
+            ("async store, group commit", database.aload_chat_history, async_save),
+        ):
+            with patch("backend.database.settings.database_file", str(Path(tmp) / f"{label.split()[0]}.db")):
+                database.create_tables()
+                elapsed, lag = asyncio.run(run(load, save, sessions, turns, think_ms, seed))
+                database.history_store.shutdown()
+                database.close_db_connections()
+            print(
+                f"{label:<26} {elapsed:7.2f}s {operations / elapsed:8.0f} ops/s  "
+                f"loop lag mean={lag['mean_ms']:6.2f}ms p99={lag['p99_ms']:7.2f}ms max={lag['max_ms']:7.2f}ms"
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--think-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    main(args.sessions, args.turns, args.think_ms, args.seed)
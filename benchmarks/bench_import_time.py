@@ -0,0 +1,52 @@
+# benchmarks/bench_import_time.py
+#
+# Times a cold `import <module>` in a fresh interpreter for the modules the CLI, tests and
+# non-memory workers start from, and reports whether any heavy ML/storage dependency was pulled in.
+# Exits non-zero when a module loads one of them or exceeds --max-seconds, so it can guard CI.
+#
+#   python -m benchmarks.bench_import_time --runs 5 --max-seconds 1.0
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+MODULES = ["backend.tools", "backend.memory_manager", "backend.lucidus.utils", "backend.lucidus.vault"]
+HEAVY_MODULES = ["torch", "chromadb", "sentence_transformers", "transformers", "onnxruntime"]
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = (
+    "import importlib, json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "importlib.import_module(sys.argv[1])\n"
+    "elapsed = time.perf_counter() - started\n"
+    "print(json.dumps({'seconds': elapsed, 'heavy': [m for m in json.loads(sys.argv[2]) if m in sys.modules]}))\n"
+)
+
+def probe(module: str) -> dict:
+    env = dict(os.environ, HF_HUB_OFFLINE="1")
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, module, json.dumps(HEAVY_MODULES)],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(runs: int, max_seconds: float) -> int:
+    failures = 0
+    for module in MODULES:
+        results = [probe(module) for _ in range(runs)]
+        median = statistics.median(r["seconds"] for r in results)
+        heavy = sorted({m for r in results for m in r["heavy"]})
+        ok = median <= max_seconds and not heavy
+        failures += not ok
+        print(f"{module:<26} {median * 1000:8.1f}ms  heavy={','.join(heavy) or '-':<20} {'ok' if ok else 'FAIL'}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+    sys.exit(main(args.runs, args.max_seconds))
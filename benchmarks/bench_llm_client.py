@@ -0,0 +1,118 @@
+# benchmarks/bench_llm_client.py
+#
+# Compares the old client-per-call behaviour of get_llm_response with the pooled
+# client against a local mock chat-completions server.
+#
+#   python -m benchmarks.bench_llm_client --calls 200 --latency-ms 5
+#
+# The mock server speaks plain HTTP/1.1, so the pooled run measures keep-alive reuse;
+# HTTP/2 is only negotiated via ALPN against a TLS endpoint such as the real API.
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import statistics
+import time
+from typing import List
+
+import httpx
+
+from backend import llm_client
+from backend.config import settings
+
+COMPLETION = json.dumps({
+    "choices": [{"message": {"role": "assistant", "content": "OK"}}],
+    "usage": {"prompt_tokens": 12, "completion_tokens": 1},
+}).encode()
+
+class MockChatServer:
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000.0
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode("latin-1").split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                await asyncio.sleep(self.latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(COMPLETION)}\r\n\r\n".encode()
+                    + COMPLETION
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v1/chat/completions"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+async def _call_per_request_client(url: str):
+    # Reproduces the previous behaviour: a fresh AsyncClient (and TCP handshake) per call.
+    async with httpx.AsyncClient(timeout=300.0) as client:
+        response = await client.post(url, json={"model": "bench", "messages": []})
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+async def _call_pooled(url: str):
+    return await llm_client.get_llm_response(
+        provider="mistral", model_name="bench", messages=[{"role": "user", "content": "ping"}], temperature=0.0
+    )
+
+async def _run(name: str, call, url: str, server: MockChatServer, calls: int, concurrency: int):
+    server.connections = 0
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call(url)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(one() for _ in range(calls)))
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{name:<22} calls={calls:<5} handshakes={server.connections:<5} "
+        f"p50={statistics.median(latencies):7.2f}ms p99={p99:7.2f}ms"
+    )
+
+async def main(calls: int, concurrency: int, latency_ms: float):
+    server = MockChatServer(latency_ms)
+    url = await server.start()
+    settings.mistral_api_url = url
+    try:
+        await _run("client-per-call", _call_per_request_client, url, server, calls, concurrency)
+        await _run("pooled", lambda _url: _call_pooled(_url), url, server, calls, concurrency)
+    finally:
+        await llm_client.shutdown_http_client()
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.calls, args.concurrency, args.latency_ms))
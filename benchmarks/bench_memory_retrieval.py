@@ -0,0 +1,110 @@
+# benchmarks/bench_memory_retrieval.py
+#
+# Loads a synthetic corpus (default 100k chunks across 1k sessions) into an in-memory Chroma
+# collection and compares unscoped, session-scoped and hybrid BM25 + vector retrieval through
+# MemoryManager.retrieve_from_memory. Vectors are random, and each query vector is its target's
+# vector plus heavy noise, so pure vector search is deliberately weak at exact identifier lookups.
+#
+#   python -m benchmarks.bench_memory_retrieval --docs 100000 --queries 200
+import argparse
+import logging
+import os
+import random
+import statistics
+import time
+import uuid
+from unittest.mock import MagicMock, patch
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+import chromadb
+import numpy as np
+
+from backend.embedding_service import EmbeddingService
+from backend.memory_manager import MemoryManager
+
+WORDS = "load save parse render fetch update delete config payment invoice user session token cache index".split()
+
+def _corpus(n_docs: int, n_sessions: int, dim: int, rng: random.Random):
+    np_rng = np.random.default_rng(rng.randrange(2**32))
+    vectors = np_rng.standard_normal((n_docs, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    for i in range(n_docs):
+        identifier = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}"
+        text = f"def {identifier}(value):\n    return {rng.choice(WORDS)}(value)\n"
+        meta = {
+            "doc_id": f"s{i % n_sessions}:file_{i}.py", "filename": f"file_{i}.py", "session_id": f"s{i % n_sessions}",
+            "kind": "function", "start_line": 1, "end_line": 2, "start_char": 0, "end_char": len(text),
+            "updated_at": float(i),
+        }
+        yield f"{meta['doc_id']}#0", text, vectors[i], meta, identifier
+
+def _timed(fn, queries):
+    latencies, hits = [], 0
+    for query, expected in queries:
+        started = time.perf_counter()
+        chunks = fn(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += any(f"# {expected} " in c for c in chunks)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1], hits / len(queries)
+
+def main(n_docs: int, n_sessions: int, n_queries: int, dim: int, seed: int):
+    rng = random.Random(seed)
+    collection = chromadb.EphemeralClient().get_or_create_collection(name=f"bench-{uuid.uuid4().hex}")
+    query_vectors = {}
+
+    model = MagicMock()
+    model.encode = MagicMock(side_effect=lambda text: query_vectors[text])
+    manager = MemoryManager(EmbeddingService("bench", factory=lambda name: model, workers=0), collection)
+
+    started = time.perf_counter()
+    targets = []
+    batch = []
+    for row in _corpus(n_docs, n_sessions, dim, rng):
+        batch.append(row)
+        if len(batch) == 5000:
+            collection.add(ids=[r[0] for r in batch], documents=[r[1] for r in batch],
+                           embeddings=[r[2].tolist() for r in batch], metadatas=[r[3] for r in batch])
+            targets.extend(rng.sample(batch, max(1, n_queries // (n_docs // 5000 or 1))))
+            batch = []
+    if batch:
+        collection.add(ids=[r[0] for r in batch], documents=[r[1] for r in batch],
+                       embeddings=[r[2].tolist() for r in batch], metadatas=[r[3] for r in batch])
+        targets.extend(rng.sample(batch, min(len(batch), n_queries)))
+    print(f"loaded {collection.count()} chunks in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    manager._ensure_bm25()
+    print(f"built lexical index in {time.perf_counter() - started:.1f}s")
+
+    np_rng = np.random.default_rng(seed)
+    queries = []
+    for _, _, vector, meta, identifier in targets[:n_queries]:
+        noisy = vector + np_rng.standard_normal(dim).astype(np.float32) * 0.6
+        query_vectors[identifier] = noisy / np.linalg.norm(noisy)
+        queries.append((identifier, meta["filename"], meta["session_id"]))
+
+    plain = [(q, f) for q, f, _ in queries]
+    sessions = {q: s for q, _, s in queries}
+    runs = {
+        "vector, unscoped": lambda q: manager.retrieve_from_memory(q, n_results=5, hybrid=False),
+        "vector, session": lambda q: manager.retrieve_from_memory(q, n_results=5, hybrid=False, session_id=sessions[q]),
+        "hybrid, unscoped": lambda q: manager.retrieve_from_memory(q, n_results=5, hybrid=True),
+        "hybrid, session": lambda q: manager.retrieve_from_memory(q, n_results=5, hybrid=True, session_id=sessions[q]),
+    }
+    with patch("backend.memory_manager.settings.memory_result_cache_ttl_seconds", 0.0):
+        for name, fn in runs.items():
+            p50, p99, recall = _timed(fn, plain)
+            print(f"{name:<18} p50={p50:8.2f}ms p99={p99:8.2f}ms recall@5={recall:.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    main(args.docs, args.sessions, args.queries, args.dim, args.seed)
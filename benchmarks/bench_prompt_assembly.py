@@ -0,0 +1,54 @@
+# benchmarks/bench_prompt_assembly.py
+#
+# Builds the planning prompt the way run_agent used to (get_tool_definitions + json.dumps(indent=2)
+# + one big f-string per attempt) and with the cached PlanningPromptBuilder, and reports assembly
+# time and prompt size per section. Token counts fall back to ~4 chars/token without tiktoken.
+#
+#   python -m benchmarks.bench_prompt_assembly --iterations 2000
+import argparse
+import json
+import logging
+import time
+
+from backend.chunking import estimate_tokens
+from backend.prompts import PLANNING_CLOSING, PLANNING_INSTRUCTIONS, planning_prompt
+from backend.tools import get_tool_definitions
+
+CONTEXT = "\n\n---\n\n".join(f"def helper_{i}(path):\n    return open(path).read()\n" for i in range(6))
+
+def legacy_prompt(context_str: str) -> str:
+    tool_schemas_str = json.dumps(get_tool_definitions(), indent=2)
+    return (
+        f"{PLANNING_INSTRUCTIONS}"
+        "### CONTEXT FROM LONG-TERM MEMORY ###\n"
+        f"{context_str if context_str else 'No relevant context found.'}\n"
+        "### END CONTEXT ###\n\n"
+        "AVAILABLE TOOLS:\n"
+        f"{tool_schemas_str}\n\n"
+        f"{PLANNING_CLOSING}"
+    )
+
+def main(iterations: int):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        legacy = legacy_prompt(CONTEXT)
+        estimate_tokens(legacy)
+    legacy_us = (time.perf_counter() - started) / iterations * 1e6
+
+    planning_prompt.build("warm up", CONTEXT)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        prompt = planning_prompt.build("create a build directory", CONTEXT)
+    cached_us = (time.perf_counter() - started) / iterations * 1e6
+
+    legacy_tools = estimate_tokens(json.dumps(get_tool_definitions(), indent=2))
+    print(f"{iterations} assemblies with a {estimate_tokens(CONTEXT)}-token memory context")
+    print(f"legacy f-string + indent=2   {legacy_us:8.1f}us/prompt  ~{estimate_tokens(legacy)} tokens (tool schemas ~{legacy_tools})")
+    print(f"cached prefix + compact JSON {cached_us:8.1f}us/prompt  ~{prompt.total_tokens} tokens {prompt.section_tokens}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    main(args.iterations)
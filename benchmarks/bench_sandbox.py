@@ -0,0 +1,98 @@
+# benchmarks/bench_sandbox.py
+#
+# Runs shell commands for several concurrent sessions, once the old way (a blocking
+# `unshare ... sh -c` subprocess.run per command, called from the coroutine) and once through the
+# persistent per-session sandbox workers, reporting wall time, per-command latency and event-loop
+# lag. A single-session run of an instant command isolates the per-command overhead, and a final
+# run of one very large output compares full in-memory capture with head/tail capture plus spill.
+#
+#   python -m benchmarks.bench_sandbox --sessions 8 --commands 10 --sleep 0.05 --big-lines 5000000
+import argparse
+import asyncio
+import logging
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from backend.loop_monitor import LoopLagMonitor
+from backend.sandbox import SandboxPool
+
+def legacy_runner(command: str):
+    async def run(session_id: str, cwd: str):
+        subprocess.run(["unshare", "-U", "-r", "-m", "--", "sh", "-c", command], cwd=cwd, capture_output=True, text=True)
+    return run
+
+def pooled_runner(pool: SandboxPool, command: str):
+    async def run(session_id: str, cwd: str):
+        await pool.run(session_id, command, cwd)
+    return run
+
+async def session(run, session_id: str, commands: int, cwd: str, latencies):
+    for _ in range(commands):
+        started = time.perf_counter()
+        await run(session_id, cwd)
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.005)
+
+async def measure(run, sessions: int, commands: int, cwd: str):
+    latencies = []
+    monitor = LoopLagMonitor(interval=0.005)
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*[session(run, f"s{i}", commands, cwd, latencies) for i in range(sessions)])
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+    return elapsed, statistics.median(latencies), monitor.summary()
+
+async def main(sessions: int, commands: int, sleep: float, big_lines: int):
+    command = f"sleep {sleep}; ls -la . > /dev/null; echo ok"
+    with tempfile.TemporaryDirectory() as cwd:
+        pool = SandboxPool()
+        # Start each session's worker up front so the comparison is steady-state reuse.
+        await asyncio.gather(*[pool.run(f"s{i}", "true", cwd) for i in range(sessions)])
+
+        print(f"{sessions} sessions x {commands} commands: {command!r}")
+        for label, run in (("fork-per-command unshare", legacy_runner(command)), ("persistent sandbox pool", pooled_runner(pool, command))):
+            elapsed, p50, lag = await measure(run, sessions, commands, cwd)
+            print(
+                f"{label:<25} {elapsed:6.2f}s  p50={p50:7.2f}ms/command  "
+                f"loop lag p99={lag['p99_ms']:7.2f}ms max={lag['max_ms']:7.2f}ms"
+            )
+        print(f"1 session x {commands * sessions} commands: 'true'")
+        for label, run in (("fork-per-command unshare", legacy_runner("true")), ("persistent sandbox pool", pooled_runner(pool, "true"))):
+            _, p50, _ = await measure(run, 1, commands * sessions, cwd)
+            print(f"{label:<25} p50={p50:7.2f}ms/command")
+
+        big = f"seq 1 {big_lines}"
+        print(f"1 command: {big!r}")
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        legacy = subprocess.run(["unshare", "-U", "-r", "-m", "--", "sh", "-c", big], cwd=cwd, capture_output=True, text=True)
+        print(
+            f"{'full capture, text=True':<25} {time.perf_counter() - started:6.2f}s  returned {len(legacy.stdout):>10} chars  "
+            f"peak RSS +{(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) / 1024:7.1f}MB"
+        )
+        del legacy
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        result = await pool.run("s0", big, cwd, spill=str(Path(cwd) / ".outputs" / "big"))
+        text = result["stdout"].render()
+        print(
+            f"{'head/tail + spill':<25} {time.perf_counter() - started:6.2f}s  returned {len(text):>10} chars  "
+            f"peak RSS +{(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) / 1024:7.1f}MB  "
+            f"spilled {result['stdout'].spilled} bytes"
+        )
+        await pool.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--commands", type=int, default=10)
+    parser.add_argument("--sleep", type=float, default=0.05)
+    parser.add_argument("--big-lines", type=int, default=5000000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(main(args.sessions, args.commands, args.sleep, args.big_lines))
@@ -0,0 +1,84 @@
+# benchmarks/bench_vault_index.py
+#
+# Compares the old per-entry cos_sim loop in vector_match with the packed VaultIndex (exact
+# matrix-vector scoring, batched scoring, and the IVF index) on synthetic vaults of 1k/100k/1M
+# facts. Facts are drawn around topic centres, like real sentence embeddings; queries are noisy
+# copies of facts.
+#
+#   python -m benchmarks.bench_vault_index --sizes 1000 100000 1000000
+import argparse
+import logging
+import statistics
+import time
+
+import numpy as np
+
+from backend.lucidus.index import VaultIndex
+
+def _legacy_match(query, vault, threshold):
+    from sentence_transformers import util
+    hits = []
+    for entry in vault:
+        sim = util.cos_sim(query, entry["embedding"]).item()
+        if sim >= threshold:
+            hits.append(entry["id"])
+    return hits
+
+def _p50_ms(fn, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def run(n_facts: int, dim: int, n_queries: int, batch: int, legacy_limit: int, rng: np.random.Generator):
+    centres = rng.standard_normal((max(10, n_facts // 500), dim), dtype=np.float32)
+    vectors = centres[rng.integers(len(centres), size=n_facts)]
+    vectors += rng.standard_normal((n_facts, dim), dtype=np.float32) * 0.7
+    vault = [{"id": i, "fact": f"fact {i}", "embedding": vectors[i]} for i in range(n_facts)]
+    queries = vectors[rng.choice(n_facts, n_queries)] + rng.standard_normal((n_queries, dim), dtype=np.float32) * 0.5
+
+    print(f"--- {n_facts} facts, dim {dim}")
+    if n_facts <= legacy_limit:
+        legacy = _p50_ms(lambda q: _legacy_match(q, vault, 0.5), queries[:3])
+        print(f"per-entry loop     p50={legacy:10.2f}ms/query")
+
+    started = time.perf_counter()
+    exact = VaultIndex(vault)
+    print(f"exact build        {time.perf_counter() - started:10.2f}s")
+    print(f"exact              p50={_p50_ms(lambda q: exact.search(q, top_k=10, threshold=0.5), queries):10.2f}ms/query")
+
+    block = queries[:batch]
+    started = time.perf_counter()
+    exact.search_many(block, top_k=10, threshold=0.5)
+    print(f"exact, batched     {(time.perf_counter() - started) * 1000 / len(block):14.2f}ms/query ({len(block)} per call)")
+
+    if n_facts >= 10000:
+        truth = [{h["id"] for h in exact.search(q, top_k=10, threshold=-1.0)} for q in queries]
+        del exact
+        started = time.perf_counter()
+        approximate = VaultIndex(vault, ivf_min_facts=0)
+        print(f"ivf build          {time.perf_counter() - started:10.2f}s ({approximate.ivf.n_lists} lists)")
+        for n_probe in (8, 32):
+            approximate.n_probe = n_probe
+            p50 = _p50_ms(lambda q: approximate.search(q, top_k=10, threshold=0.5), queries)
+            recall = statistics.mean(
+                len(want & {h["id"] for h in approximate.search(q, top_k=10, threshold=-1.0)}) / 10
+                for q, want in zip(queries, truth)
+            )
+            print(f"ivf, nprobe={n_probe:<3}    p50={p50:10.2f}ms/query  recall@10={recall:.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--legacy-limit", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    rng = np.random.default_rng(args.seed)
+    for size in args.sizes:
+        run(size, args.dim, args.queries, args.batch, args.legacy_limit, rng)
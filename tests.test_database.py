@@ -1,66 +1,91 @@
+import asyncio
 import pytest
 import sqlite3
 import json
+import threading
 from unittest.mock import patch, MagicMock
+from prometheus_client import REGISTRY
 from backend.database import (
-    get_db_connection, create_tables, save_chat_history, load_chat_history, clear_session_history
+    get_db_connection, close_db_connections, create_tables, append_chat_messages,
+    load_chat_history, load_chat_page, load_chat_window, load_chat_rollup, save_chat_summary, clear_session_history,
+    AsyncHistoryStore, _append_rows,
+    _load_rows
 )
 
 @pytest.fixture
 def mock_db_connection():
+    close_db_connections()
     with patch('backend.database.sqlite3.connect') as mock_connect:
         mock_conn = MagicMock()
+        mock_conn.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value.execute.return_value.fetchone.return_value = (0,)
         mock_connect.return_value = mock_conn
         yield mock_conn
+    close_db_connections()
+
+@pytest.fixture
+def db(tmp_path):
+    close_db_connections()
+    with patch('backend.database.settings.database_file', str(tmp_path / "cockpit.db")):
+        create_tables()
+        yield
+        close_db_connections()
 
 def test_get_db_connection(mock_db_connection):
     conn = get_db_connection()
     assert conn is not None
     assert conn.row_factory == sqlite3.Row
+    mock_db_connection.execute.assert_any_call("PRAGMA journal_mode=WAL")
+    mock_db_connection.execute.assert_any_call("PRAGMA synchronous=NORMAL")
+
+def test_connection_is_reused_per_thread(db):
+    conn = get_db_connection()
+    assert get_db_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(get_db_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
 
 def test_create_tables(mock_db_connection):
     create_tables()
     cursor = mock_db_connection.cursor()
     cursor.execute.assert_any_call("""
-        CREATE TABLE IF NOT EXISTS sessions (
-            session_id TEXT PRIMARY KEY,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    cursor.execute.assert_any_call("""
-        CREATE TABLE IF NOT EXISTS chat_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            role TEXT NOT NULL,
-            content TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES sessions (session_id)
-        );
-    """)
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+    cursor.execute.assert_any_call(
+        "CREATE INDEX IF NOT EXISTS idx_chat_history_session ON chat_history (session_id, id);"
+    )
     mock_db_connection.commit.assert_called_once()
 
-def test_save_chat_history(mock_db_connection):
+def test_append_chat_messages(mock_db_connection):
     session_id = "test-session"
     history = [
         {"role": "user", "content": "Hello"},
         {"role": "assistant", "content": {"response": "Hi"}}
     ]
 
-    save_chat_history(session_id, history)
+    append_chat_messages(session_id, history)
     cursor = mock_db_connection.cursor()
 
     cursor.execute.assert_any_call("INSERT OR IGNORE INTO sessions (session_id) VALUES (?)", (session_id,))
-    cursor.execute.assert_any_call("DELETE FROM chat_history WHERE session_id = ?", (session_id,))
-    cursor.execute.assert_any_call(
-        "INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)",
-        (session_id, "user", "Hello")
-    )
-    cursor.execute.assert_any_call(
+    cursor.executemany.assert_called_once_with(
         "INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)",
-        (session_id, "assistant", json.dumps({"response": "Hi"}))
+        [(session_id, "user", "Hello"), (session_id, "assistant", json.dumps({"response": "Hi"}))]
     )
     mock_db_connection.commit.assert_called_once()
 
+def test_append_chat_messages_keeps_sessions_separate(db):
+    append_chat_messages("s1", [{"role": "user", "content": "one"}])
+    append_chat_messages("s2", [{"role": "user", "content": "other"}])
+    append_chat_messages("s1", [{"role": "assistant", "content": "two"}])
+    assert [m["content"] for m in load_chat_history("s1")] == ["one", "two"]
+
 def test_load_chat_history(mock_db_connection):
     session_id = "test-session"
     mock_cursor = mock_db_connection.cursor()
@@ -72,7 +97,7 @@ def test_load_chat_history(mock_db_connection):
     history = load_chat_history(session_id)
     cursor = mock_db_connection.cursor()
     cursor.execute.assert_called_once_with(
-        "SELECT role, content FROM chat_history WHERE session_id = ? ORDER BY timestamp",
+        "SELECT role, content FROM chat_history WHERE session_id = ? ORDER BY id",
         (session_id,)
     )
     assert history == [
@@ -88,3 +113,100 @@ def test_clear_session_history(mock_db_connection):
     cursor.execute.assert_any_call("DELETE FROM chat_history WHERE session_id = ?", (session_id,))
     cursor.execute.assert_any_call("DELETE FROM sessions WHERE session_id = ?", (session_id,))
     mock_db_connection.commit.assert_called_once()
+
+@pytest.fixture
+def store(db):
+    history_store = AsyncHistoryStore()
+    yield history_store
+    history_store.shutdown()
+
+@pytest.mark.asyncio
+async def test_async_store_reads_its_own_writes(store):
+    await store._submit(_append_rows, "s1", [{"role": "user", "content": "Hello"}])
+    await store._submit(_append_rows, "s1", [{"role": "assistant", "content": {"response": "Hi"}}])
+    assert await store._submit(_load_rows, "s1") == [
+        {"role": "user", "content": "Hello"},
+        {"role": "assistant", "content": {"response": "Hi"}}
+    ]
+    assert load_chat_history("s1") == await store._submit(_load_rows, "s1")
+
+@pytest.mark.asyncio
+async def test_concurrent_sessions_share_a_group_commit(store):
+    def committed_groups():
+        return REGISTRY.get_sample_value("history_group_commit_requests_count") or 0
+
+    before = committed_groups()
+    with patch('backend.database.settings.db_group_commit_ms', 50.0):
+        await asyncio.gather(*[
+            store._submit(_append_rows, f"s{i}", [{"role": "user", "content": f"message {i}"}]) for i in range(20)
+        ])
+    assert committed_groups() - before < 20
+    assert [m["content"] for m in load_chat_history("s7")] == ["message 7"]
+
+@pytest.mark.asyncio
+async def test_failing_request_does_not_roll_back_the_group(store):
+    def broken(cursor, session_id):
+        cursor.execute("INSERT INTO chat_history (session_id, role, content) VALUES (?, 'user', 'lost')", (session_id,))
+        raise ValueError("boom")
+
+    with patch('backend.database.settings.db_group_commit_ms', 50.0):
+        results = await asyncio.gather(
+            store._submit(_append_rows, "ok", [{"role": "user", "content": "kept"}]),
+            store._submit(broken, "bad"),
+            return_exceptions=True
+        )
+    assert isinstance(results[1], ValueError)
+    assert load_chat_history("ok") == [{"role": "user", "content": "kept"}]
+    assert load_chat_history("bad") == []
+
+def _turns(n):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"} for i in range(n)]
+
+def test_load_chat_page_walks_backwards(db):
+    append_chat_messages("s1", _turns(5))
+    first = load_chat_page("s1", limit=2)
+    assert [m["content"] for m in first["messages"]] == ["message 3", "message 4"]
+    second = load_chat_page("s1", limit=2, before_id=first["next_before_id"])
+    assert [m["content"] for m in second["messages"]] == ["message 1", "message 2"]
+    last = load_chat_page("s1", limit=2, before_id=second["next_before_id"])
+    assert [m["content"] for m in last["messages"]] == ["message 0"] and last["next_before_id"] is None
+    assert load_chat_history("s1", limit=1) == [{"role": "user", "content": "message 4"}]
+
+def test_load_chat_window_keeps_the_newest_messages_within_budget(db):
+    append_chat_messages("s1", _turns(10))
+    with patch('backend.database.estimate_tokens', return_value=10):
+        window = load_chat_window("s1", token_budget=35)
+        assert [m["content"] for m in window] == ["message 7", "message 8", "message 9"]
+        # The newest message is always returned, even when it alone exceeds the budget.
+        assert [m["content"] for m in load_chat_window("s1", token_budget=5)] == ["message 9"]
+
+def test_summary_replaces_rolled_up_messages(db):
+    append_chat_messages("s1", _turns(10))
+    with patch('backend.database.estimate_tokens', return_value=10):
+        rollup = load_chat_rollup("s1", token_budget=35)
+        assert [m["content"] for m in rollup["messages"]] == [f"message {i}" for i in range(7)]
+        assert rollup["tokens"] == 70 and rollup["summary"] is None
+
+        save_chat_summary("s1", "the user counted to six", rollup["through_id"])
+        window = load_chat_window("s1", token_budget=35)
+        assert window[0] == {"role": "system", "content": "Summary of the earlier conversation:\nthe user counted to six"}
+        assert [m["content"] for m in window[1:]] == ["message 7", "message 8", "message 9"]
+        assert load_chat_rollup("s1", token_budget=35) is None
+    assert len(load_chat_history("s1")) == 10
+
+    clear_session_history("s1")
+    assert load_chat_window("s1") == []
+
+def test_appending_after_a_window_keeps_the_stored_history(db):
+    append_chat_messages("s1", _turns(10))
+    with patch('backend.database.estimate_tokens', return_value=10):
+        save_chat_summary("s1", "the user counted to six", load_chat_rollup("s1", token_budget=35)["through_id"])
+        window = load_chat_window("s1", token_budget=35)
+    # What a turn hands back: the window it was given plus its new messages; only the latter are stored.
+    turn = window + [{"role": "user", "content": "message 10"}]
+    append_chat_messages("s1", turn[len(window):])
+    append_chat_messages("s1", [window[0]])
+
+    assert [m["content"] for m in load_chat_history("s1")] == [f"message {i}" for i in range(11)]
+    with patch('backend.database.estimate_tokens', return_value=10):
+        assert [m["content"] for m in load_chat_window("s1", token_budget=35)[1:]] == ["message 8", "message 9", "message 10"]
@@ -1,21 +1,33 @@
 import pytest
 import json
+from contextlib import contextmanager
 from unittest.mock import patch, AsyncMock
 from backend.agent_core import run_agent
+from backend.utils import SecurityDecision
+
+MKDIR_STEP = {
+    "tool": {"name": "execute_script"},
+    "parameters": {"command": "mkdir my_test_project"},
+    "reason": "Create a new directory for the Python project."
+}
+
+@contextmanager
+def _agent_patches(plan_response: str, tool_result=None):
+    plan = json.loads(plan_response).get("plan")
+    approved = SecurityDecision(is_safe=True, reasoning="Test")
+    with patch('backend.agent_core.get_llm_response', new_callable=AsyncMock, return_value=plan_response), \
+         patch('backend.agent_core.memory_manager.aretrieve_from_memory', new_callable=AsyncMock, return_value=[]), \
+         patch('backend.agent_core.validate_plan_semantically', new_callable=AsyncMock, return_value=(True, "Test approval", plan)), \
+         patch('backend.agent_core.assess_command', new_callable=AsyncMock, return_value=approved), \
+         patch('backend.agent_core.execute_tool', new_callable=AsyncMock, return_value=tool_result) as mock_execute:
+        yield mock_execute
 
 @pytest.mark.asyncio
 async def test_run_agent_success():
     user_prompt = "Create a new directory called 'my_test_project'."
-    session_id = "test-session-id"
-    chat_history = []
-
     mock_plan_json_string = json.dumps({
         "plan": [
-            {
-                "tool": {"name": "execute_script"},
-                "parameters": {"command": "mkdir my_test_project"},
-                "reason": "Create a new directory for the Python project."
-            },
+            MKDIR_STEP,
             {
                 "tool": {"name": "execute_script"},
                 "parameters": {"command": "ls"},
@@ -24,83 +36,58 @@ async def test_run_agent_success():
         ]
     })
 
-    with patch('backend.llm_client.get_llm_response', new_callable=AsyncMock, return_value=mock_plan_json_string):
-        with patch('backend.memory_manager.memory_manager.retrieve_from_memory', return_value=[]):
-            with patch('backend.tools.get_tool_definitions', return_value=[]):
-                with patch('backend.utils.parse_json_from_response', return_value=json.loads(mock_plan_json_string)):
-                    with patch('backend.utils.plan_sanity_check', return_value=(True, "")):
-                        with patch('backend.utils.validate_plan_semantically', new_callable=AsyncMock, return_value=(True, "Test approval", json.loads(mock_plan_json_string)['plan'])):
-                            with patch('backend.tools.execute_tool', new_callable=AsyncMock, return_value={"status": "success", "data": "Directory created."}):
-                                result = await run_agent(user_prompt, session_id, chat_history)
+    with _agent_patches(mock_plan_json_string, {"status": "success", "data": "Directory created."}) as mock_execute:
+        result = await run_agent(user_prompt, "test-session-id", [])
 
-                                assert result['response'] == "Directory created."
+    assert result['response'] == "Directory created."
+    assert mock_execute.await_count == 2
+    assert result['new_messages'][0] == {"role": "user", "content": user_prompt}
 
 @pytest.mark.asyncio
 async def test_run_agent_plan_generation_failure():
-    user_prompt = "Create a new directory called 'my_test_project'."
-    session_id = "test-session-id"
-    chat_history = []
-
     mock_invalid_plan_json_string = json.dumps({"invalid_key": "invalid_value"})
 
-    with patch('backend.llm_client.get_llm_response', new_callable=AsyncMock, return_value=mock_invalid_plan_json_string):
-        with patch('backend.memory_manager.memory_manager.retrieve_from_memory', return_value=[]):
-            with patch('backend.tools.get_tool_definitions', return_value=[]):
-                with patch('backend.utils.parse_json_from_response', return_value=json.loads(mock_invalid_plan_json_string)):
-                    result = await run_agent(user_prompt, session_id, chat_history)
+    with _agent_patches(mock_invalid_plan_json_string) as mock_execute:
+        result = await run_agent("Create a new directory called 'my_test_project'.", "test-session-id", [])
 
-                    assert "Invalid plan structure" in result['response']
+    assert "Invalid plan structure" in result['response']
+    mock_execute.assert_not_awaited()
 
 @pytest.mark.asyncio
 async def test_run_agent_execution_failure():
-    user_prompt = "Create a new directory called 'my_test_project'."
-    session_id = "test-session-id"
-    chat_history = []
+    mock_plan_json_string = json.dumps({"plan": [MKDIR_STEP]})
 
-    mock_plan_json_string = json.dumps({
-        "plan": [
-            {
-                "tool": {"name": "execute_script"},
-                "parameters": {"command": "mkdir my_test_project"},
-                "reason": "Create a new directory for the Python project."
-            }
-        ]
-    })
-
-    with patch('backend.llm_client.get_llm_response', new_callable=AsyncMock, return_value=mock_plan_json_string):
-        with patch('backend.memory_manager.memory_manager.retrieve_from_memory', return_value=[]):
-            with patch('backend.tools.get_tool_definitions', return_value=[]):
-                with patch('backend.utils.parse_json_from_response', return_value=json.loads(mock_plan_json_string)):
-                    with patch('backend.utils.plan_sanity_check', return_value=(True, "")):
-                        with patch('backend.utils.validate_plan_semantically', new_callable=AsyncMock, return_value=(True, "Test approval", json.loads(mock_plan_json_string)['plan'])):
-                            with patch('backend.tools.execute_tool', new_callable=AsyncMock, return_value={"status": "error", "message": "Command not found"}):
-                                result = await run_agent(user_prompt, session_id, chat_history)
+    with _agent_patches(mock_plan_json_string, {"status": "error", "message": "Permission denied"}):
+        result = await run_agent("Create a new directory called 'my_test_project'.", "test-session-id", [])
 
-                                assert "Command not found" in result['response']
+    assert "Permission denied" in result['response']
 
 @pytest.mark.asyncio
 async def test_run_agent_max_retries_exceeded():
-    user_prompt = "Create a new directory called 'my_test_project'."
-    session_id = "test-session-id"
-    chat_history = []
+    mock_plan_json_string = json.dumps({"plan": [MKDIR_STEP]})
 
-    mock_plan_json_string = json.dumps({
-        "plan": [
-            {
-                "tool": {"name": "execute_script"},
-                "parameters": {"command": "mkdir my_test_project"},
-                "reason": "Create a new directory for the Python project."
-            }
-        ]
-    })
+    with _agent_patches(mock_plan_json_string, {"status": "error", "message": "Command not found"}) as mock_execute, \
+         patch('backend.agent_core.settings.max_retries', 1):
+        result = await run_agent("Create a new directory called 'my_test_project'.", "test-session-id", [])
 
-    with patch('backend.llm_client.get_llm_response', new_callable=AsyncMock, return_value=mock_plan_json_string):
-        with patch('backend.memory_manager.memory_manager.retrieve_from_memory', return_value=[]):
-            with patch('backend.tools.get_tool_definitions', return_value=[]):
-                with patch('backend.utils.parse_json_from_response', return_value=json.loads(mock_plan_json_string)):
-                    with patch('backend.utils.plan_sanity_check', return_value=(True, "")):
-                        with patch('backend.utils.validate_plan_semantically', new_callable=AsyncMock, return_value=(True, "Test approval", json.loads(mock_plan_json_string)['plan'])):
-                            with patch('backend.tools.execute_tool', new_callable=AsyncMock, return_value={"status": "error", "message": "Command not found"}):
-                                result = await run_agent(user_prompt, session_id, chat_history)
+    assert "Agent failed after 1 attempts. Last error: Execution stopped at step 1" in result['response']
+    assert mock_execute.await_count == 1
 
-                                assert "Agent failed after 1 attempts. Last error: Execution stopped at step 1" in result['response']
+@pytest.mark.asyncio
+async def test_run_agent_pre_assesses_shell_steps_alongside_critic():
+    plan = [
+        {"tool": {"name": "execute_script"}, "parameters": {"command": "mkdir build"}, "reason": "Create build dir."},
+        {"tool": {"name": "execute_script"}, "parameters": {"command": "cat <ref:step_0_result>"}, "reason": "Depends on step 0."},
+    ]
+    approved = SecurityDecision(is_safe=True, reasoning="Test")
+
+    with patch('backend.agent_core.get_llm_response', new_callable=AsyncMock, return_value=json.dumps({"plan": plan})):
+        with patch('backend.agent_core.memory_manager.aretrieve_from_memory', new_callable=AsyncMock, return_value=[]):
+            with patch('backend.agent_core.validate_plan_semantically', new_callable=AsyncMock, return_value=(True, "Test approval", plan)):
+                with patch('backend.agent_core.assess_command', new_callable=AsyncMock, return_value=approved) as mock_assess:
+                    with patch('backend.agent_core.execute_tool', new_callable=AsyncMock, return_value={"status": "success", "data": "done"}) as mock_execute:
+                        result = await run_agent("Create a build directory.", "test-session-id", [])
+
+    assert result['response'] == "done"
+    mock_assess.assert_awaited_once_with("mkdir build", "Create a build directory.")
+    assert mock_execute.await_args.kwargs["security_verdicts"] == {"mkdir build": approved}
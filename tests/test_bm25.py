@@ -0,0 +1,30 @@
+from backend.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("def retrieveFromMemory(session_id):") == [
+        "def", "retrievefrommemory", "retrieve", "from", "memory", "session_id", "session", "id"
+    ]
+
+def test_search_ranks_rare_identifier_matches_first():
+    index = BM25Index()
+    index.add("a", "def parse_config(path): return load(path)", {"session_id": "s1"})
+    index.add("b", "def load(path): return open(path).read()", {"session_id": "s1"})
+    index.add("c", "def parse_config(path): pass", {"session_id": "s2"})
+
+    assert [doc_id for doc_id, _ in index.search("parse_config", 3)][:2] in (["a", "c"], ["c", "a"])
+    assert [doc_id for doc_id, _ in index.search("parse_config", 3, lambda m: m["session_id"] == "s1")] == ["a"]
+
+def test_add_replaces_and_remove_forgets():
+    index = BM25Index()
+    index.add("a", "alpha beta")
+    index.add("a", "gamma")
+    assert index.search("alpha", 5) == []
+    assert [doc_id for doc_id, _ in index.search("gamma", 5)] == ["a"]
+    index.remove("a")
+    assert len(index) == 0
+    assert index.search("gamma", 5) == []
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = [doc_id for doc_id, _ in reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])]
+    assert fused[0] == "b"
+    assert set(fused) == {"a", "b", "c", "d"}
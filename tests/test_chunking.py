@@ -0,0 +1,40 @@
+from backend.chunking import chunk_document
+
+def test_python_files_split_on_top_level_definitions():
+    source = (
+        "import os\n"
+        "\n"
+        "@decorator\n"
+        "def first():\n"
+        "    return 1\n"
+        "\n"
+        "class Second:\n"
+        "    pass\n"
+        "\n"
+        "MAIN = first()\n"
+    )
+    chunks = chunk_document(source, "module.py")
+    assert [(c.kind, c.start_line, c.end_line) for c in chunks] == [
+        ("module", 1, 2), ("function", 3, 5), ("class", 7, 8), ("module", 9, 10)
+    ]
+    for chunk in chunks:
+        assert source[chunk.start_char:chunk.end_char] == chunk.text
+
+def test_large_definitions_and_plain_text_fall_back_to_windows():
+    body = "".join(f"    value_{i} = compute({i})\n" for i in range(200))
+    chunks = chunk_document("def huge():\n" + body, "big.py", max_tokens=100, overlap_lines=2)
+    assert len(chunks) > 1
+    assert all(c.kind == "function" for c in chunks)
+    assert chunks[1].start_line <= chunks[0].end_line
+
+    text_chunks = chunk_document("line of prose\n" * 300, "notes.md", max_tokens=50)
+    assert len(text_chunks) > 1
+    assert all(c.kind == "window" for c in text_chunks)
+
+def test_unparseable_python_uses_windows():
+    chunks = chunk_document("def broken(:\n    pass\n", "broken.py")
+    assert [c.kind for c in chunks] == ["window"]
+
+def test_empty_content_has_no_chunks():
+    assert chunk_document("", "empty.py") == []
+    assert chunk_document("\n\n", "blank.txt") == []
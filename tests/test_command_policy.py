@@ -0,0 +1,127 @@
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from backend.command_policy import ALLOW_RULES, DENY_BINARIES, CommandPolicy, assess_command
+from backend.utils import SecurityDecision
+
+@pytest.fixture
+def policy():
+    return CommandPolicy(ALLOW_RULES, DENY_BINARIES, cache_size=2)
+
+@pytest.mark.parametrize("command", [
+    "ls -la",
+    "python -m pytest -q tests",
+    "mkdir -p build/output",
+    "pip list",
+    "cat README.md | grep Cockpit",
+    "echo 'hello world' > notes.txt",
+    "git status && git diff --stat",
+])
+def test_policy_allows_known_safe_commands(policy, command):
+    decision = policy.evaluate(command)
+    assert decision is not None and decision.is_safe
+
+@pytest.mark.parametrize("command", [
+    "sudo apt-get install vim",
+    "rm -rf /",
+    "rm -fr ~",
+    "ls && dd if=/dev/zero of=disk.img",
+    "/sbin/mkfs.ext4 /dev/sda1",
+])
+def test_policy_denies_dangerous_commands(policy, command):
+    decision = policy.evaluate(command)
+    assert decision is not None and not decision.is_safe
+
+@pytest.mark.parametrize("command", [
+    "cat /etc/shadow",
+    "ls ../other-session",
+    "python script.py",
+    "echo $(whoami)",
+    "find . -delete",
+    "mkdir -m 777 build",
+    "./ls",
+    "echo pwned > /etc/motd",
+    "pip install requests",
+    "rm -rf build",
+    "cat .?/.?/.env",
+    "cat .[.]/.[.]/.env",
+    "ls .*/..",
+    "echo hi >> .?/.?/x",
+    "cat src/[.]?/x",
+])
+def test_policy_defers_unknown_commands_to_llm(policy, command):
+    assert policy.evaluate(command) is None
+
+@pytest.mark.parametrize("command", [
+    "ls;(reboot)",
+    "echo rm -rf . |(sh)",
+    "cat x|(python3 -c 'import os')",
+    "ls &(reboot)",
+    "ls |& sh",
+    "cat <(whoami)",
+    "ls; { reboot; }",
+    "echo hi ;; ls",
+])
+def test_policy_never_approves_subshells_or_merged_operators(policy, command):
+    assert policy.evaluate(command) is None
+
+@pytest.mark.parametrize("command", [
+    "sort -o/etc/passwd README.md",
+    "sort -ro/etc/passwd README.md",
+    "grep -f/etc/shadow .",
+    "tree -o/etc/x",
+    "ls -l/etc",
+    "git show HEAD:../../x",
+    "git show HEAD:/etc/passwd",
+])
+def test_policy_checks_attached_option_values_and_rev_paths(policy, command):
+    assert policy.evaluate(command) is None
+
+@pytest.mark.parametrize("command", [
+    "sort -S 1 --compress-program=sh data.txt",
+    "sort --compress-program=./x.sh data.txt",
+    "sort --compress=sh data.txt",
+    "sort --compress-program sh data.txt",
+])
+def test_policy_never_approves_sort_compress_program(policy, command):
+    assert policy.evaluate(command) is None
+
+@pytest.mark.parametrize("command", [
+    "sort -rn -ooutput.txt data.txt",
+    "head -n5 README.md",
+    "git show HEAD:README.md",
+])
+def test_policy_allows_workspace_option_values(policy, command):
+    decision = policy.evaluate(command)
+    assert decision is not None and decision.is_safe
+
+def test_normalize_collapses_quoting_and_whitespace(policy):
+    assert policy.normalize("python   'script.py'  --fast") == policy.normalize('python script.py --fast')
+
+def test_verdict_cache_is_lru(policy):
+    approved = SecurityDecision(is_safe=True, reasoning="ok")
+    policy.remember_verdict("python a.py", "goal", approved)
+    policy.remember_verdict("python b.py", "goal", approved)
+    assert policy.get_cached_verdict("python  a.py", "goal") == approved
+    policy.remember_verdict("python c.py", "goal", approved)
+    assert policy.get_cached_verdict("python b.py", "goal") is None
+    assert policy.get_cached_verdict("python a.py", "other goal") is None
+
+@pytest.mark.asyncio
+async def test_assess_command_only_asks_llm_once_per_command_and_goal():
+    with patch('backend.command_policy.get_llm_response', new_callable=AsyncMock, return_value="SAFE Builds the project.") as mock_llm:
+        first = await assess_command("python build_release.py", "Build the release")
+        second = await assess_command("python  build_release.py", "Build the release")
+        safe = await assess_command("ls", "Build the release")
+
+    assert first.is_safe and second.is_safe and safe.is_safe
+    assert mock_llm.await_count == 1
+
+@pytest.mark.asyncio
+async def test_assess_command_does_not_cache_api_errors():
+    with patch('backend.command_policy.get_llm_response', new_callable=AsyncMock, return_value="API_ERROR: HTTP 500") as mock_llm:
+        first = await assess_command("python flaky_endpoint.py", "Check the endpoint")
+        await assess_command("python flaky_endpoint.py", "Check the endpoint")
+
+    assert not first.is_safe
+    assert mock_llm.await_count == 2
@@ -0,0 +1,83 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+
+from backend.config import settings
+from backend.embedding_service import EmbeddingService, embedding_cache_key, load_sentence_transformer
+
+@pytest.fixture
+def fake_sentence_transformers():
+    module = types.SimpleNamespace(SentenceTransformer=MagicMock(), export_dynamic_quantized_onnx_model=MagicMock())
+    with patch.dict(sys.modules, {"sentence_transformers": module}):
+        yield module
+
+def test_backends_map_to_sentence_transformers_options(fake_sentence_transformers):
+    st = fake_sentence_transformers.SentenceTransformer
+    load_sentence_transformer("model-a", "torch")
+    load_sentence_transformer("model-a", "onnx")
+    load_sentence_transformer("model-a", "onnx-int8")
+
+    assert st.call_args_list[0].args == ("model-a",) and st.call_args_list[0].kwargs == {}
+    assert st.call_args_list[1].kwargs == {"backend": "onnx"}
+    assert st.call_args_list[2].kwargs == {"backend": "onnx", "model_kwargs": {"file_name": settings.embedding_onnx_int8_file}}
+    with pytest.raises(ValueError):
+        load_sentence_transformer("model-a", "tensorrt")
+
+def test_int8_is_quantized_locally_when_no_prebuilt_file(fake_sentence_transformers, tmp_path):
+    st = fake_sentence_transformers.SentenceTransformer
+    st.side_effect = [OSError("file not found"), MagicMock(), MagicMock()]
+    with patch('backend.embedding_service.settings.embedding_onnx_dir', str(tmp_path)):
+        load_sentence_transformer("org/model-a", "onnx-int8")
+
+    export = fake_sentence_transformers.export_dynamic_quantized_onnx_model
+    export.assert_called_once()
+    assert export.call_args.args[2] == str(tmp_path / "org_model-a")
+    assert st.call_args.args == (str(tmp_path / "org_model-a"),)
+    assert st.call_args.kwargs["model_kwargs"]["file_name"].startswith("onnx/model_qint8_")
+
+def test_cache_key_separates_backends():
+    assert EmbeddingService("model-a", workers=0, backend="torch").cache_key == "model-a"
+    assert embedding_cache_key("model-a", "onnx-int8") == "model-a@onnx-int8"
+
+CORPUS = [
+    "def read_config(path): load the YAML configuration file from disk",
+    "class PaymentGateway handles card charges and refunds",
+    "def refund(payment): reverse a captured card payment",
+    "SQL migration adding an index on the users email column",
+    "async def fetch_user(session, user_id): query the users table",
+    "Dockerfile installs python dependencies from requirements.txt",
+    "def parse_args(): build the argparse command line parser",
+    "git clone the repository and check out the release branch",
+    "def render_invoice(order): produce a PDF invoice for an order",
+    "pytest fixture creating a temporary sqlite database",
+    "def retry_with_backoff(fn): retry a coroutine with exponential delay",
+    "the cache evicts the least recently used entries first",
+    "def tokenize(text): split source code into identifier tokens",
+    "nginx reverse proxy configuration with TLS termination",
+    "def send_email(to, subject, body): deliver mail through SMTP",
+    "Kubernetes deployment manifest with three replicas",
+]
+QUERIES = ["load settings from a yaml file", "reverse a card charge", "create a pdf for an order",
+           "retry failed requests", "deliver an email", "database index on email"]
+
+def _ranked(service):
+    vectors, queries = np.asarray(service.encode(CORPUS)), np.asarray(service.encode(QUERIES))
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return [list(np.argsort(-row)) for row in queries @ vectors.T]
+
+def test_onnx_int8_retrieval_matches_float32_baseline():
+    pytest.importorskip("optimum.onnxruntime")
+    baseline = EmbeddingService(settings.embedding_model, workers=0, backend="torch")
+    quantized = EmbeddingService(settings.embedding_model, workers=0, backend="onnx-int8")
+    if not baseline.available or not quantized.available:
+        pytest.skip("embedding model could not be loaded")
+
+    expected, actual = _ranked(baseline), _ranked(quantized)
+
+    assert [r[0] for r in actual] == [r[0] for r in expected]
+    overlap = np.mean([len(set(a[:5]) & set(e[:5])) / 5 for a, e in zip(actual, expected)])
+    assert overlap >= 0.8
@@ -0,0 +1,31 @@
+import numpy as np
+from unittest.mock import MagicMock
+
+from backend.embedding_cache import EmbeddingCache, text_hash
+
+def test_encode_only_computes_missing_texts(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"))
+    encode = MagicMock(side_effect=lambda texts: np.array([[len(t), 1.0] for t in texts]))
+
+    first = cache.encode("model-a", ["alpha", "beta"], encode)
+    second = cache.encode("model-a", ["beta", "gamma", "alpha"], encode)
+
+    assert encode.call_args_list[0].args[0] == ["alpha", "beta"]
+    assert encode.call_args_list[1].args[0] == ["gamma"]
+    np.testing.assert_array_equal(second, [[4, 1], [5, 1], [5, 1]])
+    assert first.dtype == np.float32
+
+def test_cache_is_keyed_by_model_and_persistent(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    EmbeddingCache(path).put_many("model-a", [(text_hash("alpha"), np.array([1.0, 2.0]))])
+
+    reopened = EmbeddingCache(path)
+    assert list(reopened.get_many("model-a", [text_hash("alpha")])) == [text_hash("alpha")]
+    assert reopened.get_many("model-b", [text_hash("alpha")]) == {}
+
+def test_disabled_cache_always_encodes():
+    cache = EmbeddingCache(None)
+    encode = MagicMock(side_effect=lambda texts: np.ones((len(texts), 2)))
+    cache.encode("model-a", ["alpha"], encode)
+    cache.encode("model-a", ["alpha"], encode)
+    assert encode.call_count == 2
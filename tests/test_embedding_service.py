@@ -0,0 +1,112 @@
+import asyncio
+import json
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+
+from backend.embedding_service import EmbeddingService, EmbeddingUnavailable, get_embedding_service
+from backend.lucidus.embeddings import EmbeddingModel
+from backend.memory_manager import memory_manager
+
+class LengthModel:
+    def encode(self, texts):
+        return np.array([[len(t), 1.0] for t in texts])
+
+def length_model_factory(name):
+    return LengthModel()
+
+def broken_factory(name):
+    raise OSError("offline")
+
+def test_model_is_loaded_once_on_first_use_across_threads():
+    model = MagicMock()
+    factory = MagicMock(side_effect=lambda name: model)
+    service = EmbeddingService("model-a", factory=factory, workers=0)
+    factory.assert_not_called()
+
+    threads = [threading.Thread(target=lambda: service.encode(["x"])) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    factory.assert_called_once_with("model-a")
+    assert model.encode.call_count == 8
+
+def test_failed_load_is_not_retried():
+    factory = MagicMock(side_effect=OSError("offline"))
+    service = EmbeddingService("model-a", factory=factory, workers=0)
+
+    assert service.model is None and not service.available
+    with pytest.raises(RuntimeError):
+        service.encode(["x"])
+    assert factory.call_count == 1
+
+def test_memory_manager_and_lucidus_share_one_service():
+    assert EmbeddingModel().service is memory_manager.embeddings
+    assert get_embedding_service("other-model") is get_embedding_service("other-model")
+    assert get_embedding_service("other-model") is not memory_manager.embeddings
+
+def test_importing_tools_does_not_load_ml_dependencies():
+    heavy = ["torch", "chromadb", "sentence_transformers"]
+    code = f"import json, sys, backend.tools; print(json.dumps([m for m in {heavy!r} if m in sys.modules]))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True, text=True, check=True
+    ).stdout
+    assert json.loads(output.strip().splitlines()[-1]) == []
+
+@pytest.mark.asyncio
+async def test_concurrent_encode_many_calls_are_batched():
+    model = MagicMock()
+    model.encode.side_effect = LengthModel().encode
+    service = EmbeddingService("model-a", factory=lambda name: model, workers=0)
+
+    with patch('backend.embedding_service.settings.embedding_batch_max_ms', 50.0):
+        results = await asyncio.gather(*(service.encode_many(["x" * i, "y"]) for i in range(1, 6)))
+
+    assert model.encode.call_count == 1
+    assert len(model.encode.call_args.args[0]) == 10
+    for i, vectors in enumerate(results, start=1):
+        np.testing.assert_array_equal(vectors, [[i, 1.0], [1, 1.0]])
+    service.shutdown()
+
+@pytest.mark.asyncio
+async def test_batches_are_capped_by_item_count():
+    model = MagicMock()
+    model.encode.side_effect = LengthModel().encode
+    service = EmbeddingService("model-a", factory=lambda name: model, workers=0)
+
+    with patch('backend.embedding_service.settings.embedding_batch_max_ms', 50.0), \
+            patch('backend.embedding_service.settings.embedding_batch_max_items', 3):
+        await asyncio.gather(*(service.encode_many([str(i)]) for i in range(7)))
+
+    assert [len(c.args[0]) for c in model.encode.call_args_list] == [3, 3, 1]
+    service.shutdown()
+
+@pytest.mark.asyncio
+async def test_worker_pool_encodes_out_of_process():
+    service = EmbeddingService("model-a", factory=length_model_factory, workers=1)
+    with patch('backend.embedding_service.settings.embedding_torch_threads', 0):
+        try:
+            assert service.model is None and service.available
+            np.testing.assert_array_equal(await service.encode_many(["abc"]), [[3, 1.0]])
+            np.testing.assert_array_equal(service.encode("ab"), [2, 1.0])
+        finally:
+            service.shutdown()
+
+@pytest.mark.asyncio
+async def test_worker_load_failure_marks_service_unavailable():
+    service = EmbeddingService("model-a", factory=broken_factory, workers=1)
+    with patch('backend.embedding_service.settings.embedding_torch_threads', 0):
+        try:
+            with pytest.raises(EmbeddingUnavailable):
+                await service.encode_many(["abc"])
+            assert not service.available
+        finally:
+            service.shutdown()
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+from unittest.mock import patch
+
+from backend.file_index import SessionFileIndex, _hash_file
+from backend.tools import handle_list_files, handle_write_file
+
+def _write(root, name: str, content: str):
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    return path
+
+def test_log_replays_into_a_new_instance(tmp_path):
+    index = SessionFileIndex(tmp_path)
+    index.record(_write(tmp_path, "a.txt", "one"))
+    index.record(_write(tmp_path, "src/b.py", "two"), b"two")
+    os.remove(tmp_path / "a.txt")
+    index.remove(tmp_path / "a.txt")
+
+    reloaded = SessionFileIndex(tmp_path)
+    assert [entry.path for entry in reloaded.list()] == ["src/b.py"]
+    assert reloaded.list()[0] == index.list()[0]
+
+def test_compaction_keeps_entries_and_shrinks_the_log(tmp_path):
+    index = SessionFileIndex(tmp_path)
+    path = _write(tmp_path, "a.txt", "x")
+    with patch('backend.file_index.settings.file_index_compact_min_records', 10):
+        for i in range(25):
+            path.write_text("x" * i)
+            index.record(path)
+
+    assert len(index.log_path.read_text().splitlines()) <= 10
+    assert not index.log_path.with_suffix(".tmp").exists()
+    assert SessionFileIndex(tmp_path).list()[0].size == 24
+
+def test_dirty_index_reconciles_external_changes(tmp_path):
+    _write(tmp_path, "kept.txt", "same")
+    _write(tmp_path, "gone.txt", "bye")
+    index = SessionFileIndex(tmp_path)
+    assert [entry.path for entry in index.list()] == ["gone.txt", "kept.txt"]
+
+    os.remove(tmp_path / "gone.txt")
+    _write(tmp_path, "made/by/script.sh", "echo")
+    assert [entry.path for entry in index.list()] == ["gone.txt", "kept.txt"]
+    index.mark_dirty()
+    with patch('backend.file_index._hash_file', wraps=_hash_file) as hashed:
+        assert [entry.path for entry in index.list()] == ["kept.txt", "made/by/script.sh"]
+    assert hashed.call_count == 1
+
+def test_malformed_records_are_skipped_and_rescanned(tmp_path):
+    index = SessionFileIndex(tmp_path)
+    index.record(_write(tmp_path, "a.txt", "one"))
+    with index.log_path.open("a", encoding="utf-8") as f:
+        f.write('{"op": "put", "path": "b.txt"}\n["not", "a", "record"]\n')
+    _write(tmp_path, "b.txt", "two")
+    _write(tmp_path, ".outputs/spill.log", "noise")
+
+    reloaded = SessionFileIndex(tmp_path)
+    assert [entry.path for entry in reloaded.list()] == ["a.txt", "b.txt"]
+
+def test_listing_filters(tmp_path):
+    index = SessionFileIndex(tmp_path)
+    for name in ("README.md", "src/app.py", "src/util/io.py", "docs/guide.md"):
+        index.record(_write(tmp_path, name, name))
+    _write(tmp_path, ".git/HEAD", "ref")
+    index.record_tree(tmp_path)
+
+    assert [entry.path for entry in index.list(prefix="src")] == ["src/app.py", "src/util/io.py"]
+    assert [entry.path for entry in index.list(prefix="src/", recursive=False)] == ["src/app.py"]
+    assert [entry.path for entry in index.list(recursive=False)] == ["README.md"]
+    assert [entry.path for entry in index.list(pattern="*.md")] == ["README.md", "docs/guide.md"]
+    assert [entry.path for entry in index.list(pattern="src/util/*")] == ["src/util/io.py"]
+
+@pytest.mark.asyncio
+async def test_list_files_tool_uses_the_index(tmp_path):
+    with patch('backend.tools.VAULT_ROOT', str(tmp_path)), patch('backend.tools.memory_manager.enqueue'), \
+         patch('backend.tools.settings.file_list_max_entries', 2):
+        assert await handle_list_files({}, session_id="s1") == {"status": "success", "data": "No files in session."}
+        for name in ("a.py", "lib/b.py", "lib/c.txt"):
+            await handle_write_file({"filename": name, "content": "pass"}, session_id="s1")
+        capped = await handle_list_files({}, session_id="s1")
+        filtered = await handle_list_files({"path": "lib", "pattern": "*.py"}, session_id="s1")
+
+    assert capped["data"].splitlines()[:2] == ["a.py", "lib/b.py"]
+    assert capped["data"].splitlines()[2].startswith("... 1 more files")
+    assert filtered == {"status": "success", "data": "lib/b.py"}
@@ -0,0 +1,197 @@
+import asyncio
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from unittest.mock import patch
+
+from backend.git_cache import GIT_MIRROR_EVENTS, GitRunner, MirrorCache, repository_root
+from backend.tools import _commit_and_push, handle_git_clone, handle_git_commit_and_push
+
+def _git(cwd: Path, *args: str):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+def _commit(repo: Path, files, message: str):
+    for name, content in files.items():
+        path = repo / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    _git(repo, "add", "-A")
+    _git(repo, "-c", "user.name=t", "-c", "user.email=t@example.com", "commit", "-m", message)
+
+@pytest.fixture
+def origin(tmp_path):
+    repo = tmp_path / "origin" / "project"
+    repo.mkdir(parents=True)
+    _git(repo, "init", "-b", "main")
+    _commit(repo, {"README.md": "one\n", "src/app.py": "print('hi')\n", "docs/guide.md": "guide\n"}, "first")
+    _commit(repo, {"README.md": "two\n"}, "second")
+    _git(repo, "branch", "release")
+    return repo
+
+@pytest.fixture
+def cache(tmp_path):
+    return MirrorCache(str(tmp_path / "mirrors"))
+
+def _event(name: str) -> float:
+    return GIT_MIRROR_EVENTS.labels(event=name)._value.get()
+
+def test_second_clone_reuses_the_mirror(origin, cache, tmp_path):
+    url = origin.as_uri()
+    created = _event("create")
+    first = cache.clone(url, tmp_path / "s1" / "project")
+    second = cache.clone(url, tmp_path / "s2" / "project")
+
+    assert _event("create") - created == 1
+    assert (tmp_path / "s2" / "project" / "README.md").read_text() == "two\n"
+    assert second.remotes.origin.url == url
+    assert first.head.commit.hexsha == second.head.commit.hexsha
+    assert not list((tmp_path / "s1").glob(".*partial"))
+
+def test_stale_mirror_fetches_new_commits(origin, cache, tmp_path):
+    url = origin.as_uri()
+    cache.clone(url, tmp_path / "s1" / "project")
+    _commit(origin, {"README.md": "three\n"}, "third")
+
+    with patch('backend.git_cache.settings.git_mirror_refresh_seconds', 0.0):
+        cache.clone(url, tmp_path / "s2" / "project")
+    assert (tmp_path / "s2" / "project" / "README.md").read_text() == "three\n"
+
+def test_shallow_sparse_branch_clone(origin, cache, tmp_path):
+    destination = tmp_path / "s1" / "project"
+    repo = cache.clone(origin.as_uri(), destination, branch="release", depth=1, sparse_paths=["src"])
+
+    assert repo.active_branch.name == "release"
+    assert (destination / ".git" / "shallow").exists()
+    assert len(list(repo.iter_commits())) == 1
+    assert (destination / "src" / "app.py").exists()
+    assert not (destination / "docs").exists()
+    assert repo.remotes.origin.url == origin.as_uri()
+
+@pytest.mark.asyncio
+async def test_git_clone_tool_uses_the_cache(origin, cache, tmp_path):
+    with patch('backend.tools.VAULT_ROOT', str(tmp_path / "vault")), patch('backend.tools.git_mirrors', cache):
+        result = await handle_git_clone({"repo_url": origin.as_uri(), "depth": 1}, session_id="s1")
+        invalid = await handle_git_clone({"repo_url": origin.as_uri(), "local_path": "other", "depth": 0}, session_id="s1")
+
+    assert result["status"] == "success"
+    assert (tmp_path / "vault" / "s1" / "project" / "README.md").read_text() == "two\n"
+    assert invalid == {"status": "error", "message": "'depth' must be a positive integer."}
+    assert cache.mirror_path(origin.as_uri()).exists()
+
+@pytest.mark.asyncio
+async def test_same_repo_serializes_while_other_repos_overlap(tmp_path):
+    runner = GitRunner()
+    active, peak = {}, {}
+    guard = threading.Lock()
+
+    def work(repo: str):
+        with guard:
+            active[repo] = active.get(repo, 0) + 1
+            peak[repo] = max(peak.get(repo, 0), active[repo])
+            peak["all"] = max(peak.get("all", 0), sum(active.values()))
+        time.sleep(0.05)
+        with guard:
+            active[repo] -= 1
+
+    async def step(repo: str):
+        async with runner.locked(tmp_path / repo):
+            await runner.run("test", work, repo)
+
+    with patch('backend.git_cache.settings.git_executor_workers', 4):
+        await asyncio.gather(*[step(repo) for repo in ("a", "a", "a", "b", "b")])
+    runner.shutdown()
+    assert peak["a"] == 1 and peak["b"] == 1 and peak["all"] == 2
+    assert runner._locks == {}
+
+@pytest.mark.asyncio
+async def test_cancelled_run_holds_the_lock_until_git_finishes(tmp_path):
+    runner = GitRunner()
+    finished = threading.Event()
+    order = []
+
+    def slow():
+        time.sleep(0.1)
+        order.append("slow done")
+        finished.set()
+
+    async def first():
+        async with runner.locked(tmp_path / "a"):
+            await runner.run("test", slow)
+
+    async def second():
+        async with runner.locked(tmp_path / "a"):
+            order.append("second")
+
+    task = asyncio.ensure_future(first())
+    await asyncio.sleep(0.02)
+    waiter = asyncio.ensure_future(second())
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert finished.is_set()
+    await waiter
+    runner.shutdown()
+    assert order == ["slow done", "second"]
+
+def test_commits_in_subdirectories_lock_on_the_clone(tmp_path):
+    vault = tmp_path / "vault"
+    (vault / "project" / ".git").mkdir(parents=True)
+    (vault / "project" / "src").mkdir()
+    assert repository_root(vault / "project" / "src", vault) == vault / "project"
+    assert repository_root(vault / "project", vault) == vault / "project"
+    assert repository_root(vault / "loose", vault) == vault / "loose"
+
+@pytest.mark.asyncio
+async def test_commit_and_push_runs_off_the_event_loop(origin, cache, tmp_path):
+    bare = tmp_path / "remote.git"
+    _git(tmp_path, "clone", "--bare", str(origin), str(bare))
+    vault = tmp_path / "vault"
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    with patch('backend.tools.VAULT_ROOT', str(vault)), patch('backend.tools.git_mirrors', cache):
+        await handle_git_clone({"repo_url": bare.as_uri(), "local_path": "work"}, session_id="s1")
+        (vault / "s1" / "work" / "NEW.md").write_text("new\n")
+        repo = vault / "s1" / "work"
+        _git(repo, "config", "user.name", "t")
+        _git(repo, "config", "user.email", "t@example.com")
+        task = asyncio.get_running_loop().create_task(ticker())
+        with patch('backend.tools._commit_and_push', _slow_commit_and_push):
+            result = await handle_git_commit_and_push({"repo_path": "work", "commit_message": "add new"}, session_id="s1")
+        task.cancel()
+
+    assert result["status"] == "success"
+    assert subprocess.run(["git", "log", "-1", "--format=%s"], cwd=bare, capture_output=True, text=True).stdout == "add new\n"
+    assert ticks >= 10
+
+def _slow_commit_and_push(*args):
+    # Stands in for a slow commit on a large repository.
+    time.sleep(0.2)
+    return _commit_and_push(*args)
+
+def test_session_clone_does_not_share_object_files_with_the_mirror(origin, cache, tmp_path):
+    destination = tmp_path / "s1" / "project"
+    cache.clone(origin.as_uri(), destination)
+    objects = [p for p in (destination / ".git" / "objects").rglob("*") if p.is_file()]
+    assert objects and all(p.stat().st_nlink == 1 for p in objects)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("url", ["--upload-pack=touch /tmp/pwned", "ext::sh -c touch% /tmp/pwned"])
+async def test_git_clone_refuses_option_and_command_urls(url, cache, tmp_path):
+    with patch('backend.tools.VAULT_ROOT', str(tmp_path / "vault")), patch('backend.tools.git_mirrors', cache), \
+         patch('backend.utils.asyncio.sleep') as sleep:
+        result = await handle_git_clone({"repo_url": url, "local_path": "x"}, session_id="s1")
+    assert result["status"] == "error" and result["message"].startswith("Refusing to clone")
+    sleep.assert_not_called()
+    with pytest.raises(Exception):
+        cache.ensure_mirror(url)
+    assert not cache.root.exists() or not any(cache.root.glob("*.git"))
@@ -0,0 +1,40 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from backend.database import close_db_connections, create_tables, append_chat_messages, history_store
+from backend.history_rollup import load_history_window
+
+@pytest.fixture
+def db(tmp_path):
+    close_db_connections()
+    with patch('backend.database.settings.database_file', str(tmp_path / "cockpit.db")):
+        create_tables()
+        append_chat_messages("s1", [{"role": "user", "content": f"message {i}"} for i in range(10)])
+        yield
+        history_store.shutdown()
+        close_db_connections()
+
+@pytest.mark.asyncio
+async def test_overflow_is_rolled_into_the_summary(db):
+    with patch('backend.database.estimate_tokens', return_value=10), \
+         patch('backend.history_rollup.settings.chat_history_rollup_min_tokens', 50), \
+         patch('backend.history_rollup.get_llm_response', new_callable=AsyncMock, return_value="counted to six") as llm:
+        window = await load_history_window("s1", token_budget=35)
+        assert "message 6" in llm.call_args.kwargs["messages"][1]["content"]
+        assert window[0]["content"].endswith("counted to six")
+        assert [m["content"] for m in window[1:]] == ["message 7", "message 8", "message 9"]
+
+        await load_history_window("s1", token_budget=35)
+        llm.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_small_overflow_or_llm_failure_keeps_plain_window(db):
+    with patch('backend.database.estimate_tokens', return_value=10), \
+         patch('backend.history_rollup.get_llm_response', new_callable=AsyncMock, return_value="API_ERROR: HTTP 500 - down") as llm:
+        with patch('backend.history_rollup.settings.chat_history_rollup_min_tokens', 1000):
+            window = await load_history_window("s1", token_budget=35)
+            llm.assert_not_called()
+        with patch('backend.history_rollup.settings.chat_history_rollup_min_tokens', 50):
+            assert await load_history_window("s1", token_budget=35) == window
+            llm.assert_called_once()
+    assert [m["content"] for m in window] == ["message 7", "message 8", "message 9"]
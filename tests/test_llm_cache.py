@@ -0,0 +1,80 @@
+import os
+import threading
+
+import pytest
+from unittest.mock import patch
+
+from backend.llm_cache import ResponseCache, make_cache_key
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(path=str(tmp_path / "llm_cache.db"), max_memory_entries=2, max_disk_entries=100, ttl_seconds=60)
+
+def test_make_cache_key_is_stable_and_param_sensitive():
+    messages = [{"role": "user", "content": "Hello"}]
+    key = make_cache_key("mistral", "m", messages, 0.0, 1.0, 4096, None)
+    assert key == make_cache_key("Mistral", "m", [{"content": "Hello", "role": "user"}], 0.0, 1.0, 4096, [])
+    assert key != make_cache_key("mistral", "m", messages, 0.0, 1.0, 50, None)
+    assert key != make_cache_key("mistral", "other", messages, 0.0, 1.0, 4096, None)
+
+def test_memory_tier_hit(cache):
+    cache.set("k", "value")
+    assert cache.get("k") == "value"
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 0, "misses": 0}
+
+def test_disk_tier_survives_memory_eviction(cache):
+    for key in ["a", "b", "c"]:
+        cache.set(key, key.upper())
+    assert "a" not in cache._memory
+    assert cache.get("a") == "A"
+    assert cache.stats()["disk_hits"] == 1
+
+def test_disk_tier_shared_across_instances(cache, tmp_path):
+    cache.set("k", "value")
+    other = ResponseCache(path=str(tmp_path / "llm_cache.db"), max_memory_entries=2, max_disk_entries=100, ttl_seconds=60)
+    assert other.get("k") == "value"
+
+def test_expired_entries_miss(cache):
+    with patch('backend.llm_cache.time.time', return_value=1000.0):
+        cache.set("k", "value")
+    with patch('backend.llm_cache.time.time', return_value=1061.0):
+        assert cache.get("k") is None
+    assert cache.stats()["misses"] == 1
+
+def test_disk_tier_trims_to_max_entries(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "llm_cache.db"), max_memory_entries=1, max_disk_entries=10, ttl_seconds=60)
+    for i in range(100):
+        cache.set(f"k{i}", str(i))
+    (count,) = cache._get_conn().execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+    assert count == 10
+    assert cache.get("k99") == "99"
+    assert cache.get("k0") is None
+
+def test_memory_only_cache():
+    cache = ResponseCache(path=None, max_memory_entries=4, max_disk_entries=0, ttl_seconds=60)
+    cache.set("k", "value")
+    assert cache.get("k") == "value"
+    assert cache.get("missing") is None
+
+@pytest.mark.asyncio
+async def test_async_lookups_run_sqlite_off_the_event_loop(cache):
+    threads = []
+    original = cache._disk_get
+
+    def recording_disk_get(key, now):
+        threads.append(threading.current_thread())
+        return original(key, now)
+
+    await cache.aset("a", "A")
+    for key in ["b", "c"]:
+        await cache.aset(key, key.upper())
+    with patch.object(cache, "_disk_get", recording_disk_get):
+        assert await cache.aget("c") == "C"
+        assert await cache.aget("a") == "A"
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 1, "misses": 0}
+
+def test_default_disk_tier_lives_under_the_data_dir():
+    from backend.llm_cache import response_cache
+    from backend.config import settings
+    assert os.path.dirname(os.path.abspath(response_cache.path)) == os.path.abspath(settings.data_dir)
@@ -0,0 +1,167 @@
+import json
+import pytest
+import httpx
+from unittest.mock import patch
+
+from backend import llm_client
+from backend.llm_client import get_http_client, get_llm_response, shutdown_http_client
+from backend.tools import handle_code_generation, handle_refactor_code
+
+@pytest.fixture(autouse=True)
+def disable_response_cache():
+    with patch('backend.llm_client.settings.llm_cache_enabled', False):
+        yield
+
+@pytest.mark.asyncio
+async def test_get_http_client_is_reused():
+    try:
+        first = get_http_client()
+        second = get_http_client()
+        assert first is second
+        assert not first.is_closed
+    finally:
+        await shutdown_http_client()
+
+@pytest.mark.asyncio
+async def test_shutdown_http_client_closes_pool():
+    client = get_http_client()
+    await shutdown_http_client()
+    assert client.is_closed
+    assert llm_client._http_client is None
+
+@pytest.mark.asyncio
+async def test_get_llm_response_uses_pooled_client():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "Hello"}}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": 1},
+        })
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    with patch('backend.llm_client.get_http_client', return_value=client):
+        result = await get_llm_response(
+            provider="mistral", model_name="test-model",
+            messages=[{"role": "user", "content": "Hi"}], temperature=0.0
+        )
+    await client.aclose()
+
+    assert result == "Hello"
+    assert calls[0]["model"] == "test-model"
+
+@pytest.mark.asyncio
+async def test_get_llm_response_http_error():
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(429, text="rate limited")))
+    with patch('backend.llm_client.get_http_client', return_value=client):
+        result = await get_llm_response(
+            provider="mistral", model_name="test-model",
+            messages=[{"role": "user", "content": "Hi"}], temperature=0.0
+        )
+    await client.aclose()
+
+    assert result == "API_ERROR: HTTP 429 - rate limited"
+
+@pytest.mark.asyncio
+async def test_stream_llm_response_parses_sse_chunks():
+    body = "".join(
+        f"data: {json.dumps(event)}\n\n" for event in [
+            {"choices": [{"delta": {"role": "assistant"}}]},
+            {"choices": [{"delta": {"content": "def "}}]},
+            {"choices": [{"delta": {"content": "f(): pass"}}], "usage": {"prompt_tokens": 5, "completion_tokens": 4}},
+        ]
+    ) + "data: [DONE]\n\n"
+    client = httpx.AsyncClient(transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+    ))
+    with patch('backend.llm_client.get_http_client', return_value=client):
+        chunks = [chunk async for chunk in llm_client.stream_llm_response(
+            provider="mistral", model_name="codestral-latest",
+            messages=[{"role": "user", "content": "Hi"}], temperature=0.0
+        )]
+    await client.aclose()
+
+    assert chunks == ["def ", "f(): pass"]
+
+@pytest.mark.asyncio
+async def test_stream_llm_response_http_error():
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(500, text="boom")))
+    with patch('backend.llm_client.get_http_client', return_value=client):
+        with pytest.raises(llm_client.LLMStreamError, match="API_ERROR: HTTP 500 - boom"):
+            async for _ in llm_client.stream_llm_response(
+                provider="mistral", model_name="codestral-latest",
+                messages=[{"role": "user", "content": "Hi"}], temperature=0.0
+            ):
+                pass
+    await client.aclose()
+
+@pytest.mark.asyncio
+async def test_get_llm_response_serves_deterministic_calls_from_cache(tmp_path):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Cached"}}]})
+
+    cache = llm_client.response_cache.__class__(
+        path=str(tmp_path / "cache.db"), max_memory_entries=8, max_disk_entries=8, ttl_seconds=60
+    )
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    messages = [{"role": "user", "content": "Hi"}]
+    with patch('backend.llm_client.settings.llm_cache_enabled', True), \
+            patch('backend.llm_client.response_cache', cache), \
+            patch('backend.llm_client.get_http_client', return_value=client):
+        first = await get_llm_response(provider="mistral", model_name="m", messages=messages, temperature=0.0)
+        second = await get_llm_response(provider="mistral", model_name="m", messages=messages, temperature=0.0)
+        await get_llm_response(provider="mistral", model_name="m", messages=messages, temperature=0.7)
+    await client.aclose()
+
+    assert first == second == "Cached"
+    assert len(calls) == 2
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 0, "misses": 1}
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status, retryable", [(500, True), (429, True), (400, False), (401, False)])
+async def test_stream_llm_response_marks_only_transient_errors_retryable(status, retryable):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(status, text="nope")))
+    with patch('backend.llm_client.get_http_client', return_value=client):
+        with pytest.raises(llm_client.LLMStreamError) as error:
+            async for _ in llm_client.stream_llm_response(
+                provider="mistral", model_name="codestral-latest",
+                messages=[{"role": "user", "content": "Hi"}], temperature=0.0
+            ):
+                pass
+    await client.aclose()
+    assert error.value.retryable is retryable
+
+@pytest.mark.asyncio
+async def test_streamed_code_generation_fails_fast_without_an_api_key():
+    with patch('backend.tools.settings.llm_stream_code_generation', True), \
+         patch('backend.llm_client.settings.mistral_api_key', ""), \
+         patch('backend.utils.asyncio.sleep') as sleep:
+        result = await handle_code_generation({"prompt": "write f"})
+    assert result == {"status": "error", "message": "API_ERROR: MISTRAL_API_KEY environment variable not set."}
+    sleep.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_streamed_refactor_replaces_the_file_only_when_complete(tmp_path):
+    target = tmp_path / "s1" / "a.py"
+    target.parent.mkdir()
+    target.write_text("old = 1\n")
+    seen = []
+
+    async def generate(prompt):
+        yield "new = "
+        seen.append(target.read_text())
+        yield "2\n"
+
+    with patch('backend.tools.VAULT_ROOT', str(tmp_path)), \
+         patch('backend.tools.settings.llm_stream_code_generation', True), \
+         patch('backend.tools.stream_code_generation', generate), \
+         patch('backend.tools.memory_manager.enqueue'):
+        result = await handle_refactor_code({"filename": "a.py", "refactoring_prompt": "rename"}, session_id="s1")
+
+    assert result["status"] == "success"
+    assert seen == ["old = 1\n"] and target.read_text() == "new = 2\n"
+    assert not list(target.parent.glob(".*.partial"))
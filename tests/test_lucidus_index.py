@@ -0,0 +1,67 @@
+import numpy as np
+from unittest.mock import MagicMock
+
+from backend.lucidus.index import VaultIndex
+from backend.lucidus.utils import vector_match, vector_match_many
+
+def _entries(vectors):
+    return [{"id": i, "fact": f"fact {i}", "tags": ["t"], "source": "s", "embedding": v} for i, v in enumerate(vectors)]
+
+def _brute_force(vectors, query, threshold):
+    scores = [float(np.dot(v, query) / (np.linalg.norm(v) * np.linalg.norm(query))) for v in vectors]
+    return sorted(((i, s) for i, s in enumerate(scores) if s >= threshold), key=lambda item: -item[1])
+
+def test_search_matches_pairwise_cosine():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((200, 16))
+    query = rng.standard_normal(16)
+    hits = VaultIndex(_entries(vectors)).search(query, threshold=0.3)
+
+    expected = _brute_force(vectors, query, 0.3)
+    assert [h["id"] for h in hits] == [i for i, _ in expected]
+    assert [h["similarity"] for h in hits] == [round(s, 3) for _, s in expected]
+
+def test_top_k_and_missing_embeddings():
+    vectors = np.eye(4)
+    entries = _entries(vectors) + [{"id": "no-vector", "fact": "x"}, {"id": "null", "embedding": None}]
+    index = VaultIndex(entries)
+
+    assert len(index) == 4
+    hits = index.search(np.array([1.0, 0.5, 0.2, 0.0]), top_k=2, threshold=-1.0)
+    assert [h["id"] for h in hits] == [0, 1]
+    assert hits[0]["tags"] == ["t"] and hits[0]["source"] == "s"
+
+def test_search_many_matches_single_queries():
+    rng = np.random.default_rng(1)
+    index = VaultIndex(_entries(rng.standard_normal((100, 8))))
+    queries = rng.standard_normal((5, 8))
+    assert index.search_many(queries, top_k=3, threshold=0.0) == [index.search(q, top_k=3, threshold=0.0) for q in queries]
+
+def test_ivf_index_finds_nearest_facts():
+    rng = np.random.default_rng(2)
+    centers = rng.standard_normal((20, 32))
+    vectors = np.repeat(centers, 100, axis=0) + rng.standard_normal((2000, 32)) * 0.1
+    exact = VaultIndex(_entries(vectors))
+    approximate = VaultIndex(_entries(vectors), ivf_min_facts=1000, n_probe=4)
+    assert approximate.ivf is not None and exact.ivf is None
+
+    queries = vectors[rng.choice(2000, 20, replace=False)] + rng.standard_normal((20, 32)) * 0.05
+    for query in queries:
+        want = {h["id"] for h in exact.search(query, top_k=10, threshold=-1.0)}
+        got = {h["id"] for h in approximate.search(query, top_k=10, threshold=-1.0)}
+        assert len(want & got) >= 9
+
+def test_vector_match_encodes_batch_once():
+    model = MagicMock()
+    model.encode.side_effect = lambda texts: np.array([[1.0, 0.0] if "a" in t else [0.0, 1.0] for t in texts])
+    vault = _entries([np.array([1.0, 0.0]), np.array([0.0, 1.0])])
+
+    results = vector_match_many(["a", "b", "c"], model, vault, threshold=0.9)
+    assert [[h["id"] for h in hits] for hits in results] == [[0], [1], [1]]
+    assert model.encode.call_count == 1
+    assert [h["id"] for h in vector_match("a", model, vault, threshold=0.9)] == [0]
+
+def test_vector_match_without_model_returns_nothing():
+    model = MagicMock(available=False)
+    assert vector_match("a", model, _entries([np.ones(2)])) == []
+    model.encode.assert_not_called()
@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+from unittest.mock import MagicMock
+
+from backend.lucidus.store import compile_embeddings, load_embeddings, sidecar_paths
+from backend.lucidus.utils import vector_match
+from backend.lucidus.vault import Vault
+
+FACTS = [
+    {"id": "a", "fact": "alpha", "tags": ["x"], "source": "docs"},
+    {"id": "no-fact"},
+    {"id": "b", "fact": "beta"},
+]
+
+def _encode(texts):
+    return np.array([[3.0, 0.0] if t == "alpha" else [0.0, 2.0] for t in texts])
+
+def _write_vault(tmp_path, entries=FACTS):
+    path = tmp_path / "vault.test.json"
+    path.write_text(json.dumps(entries))
+    return path, path.read_bytes()
+
+def test_compile_then_memory_map(tmp_path):
+    path, raw = _write_vault(tmp_path)
+    compile_embeddings(path, FACTS, raw, "model-a", _encode)
+
+    compiled = load_embeddings(path, raw, "model-a")
+    assert isinstance(compiled.matrix, np.memmap)
+    assert compiled.positions == [0, 2]
+    np.testing.assert_allclose(compiled.matrix, [[1.0, 0.0], [0.0, 1.0]])
+
+def test_sidecar_is_keyed_on_vault_hash_and_model(tmp_path):
+    path, raw = _write_vault(tmp_path)
+    compile_embeddings(path, FACTS, raw, "org/model-a", _encode)
+    assert all(p.exists() for p in sidecar_paths(path, "org/model-a"))
+
+    assert load_embeddings(path, raw, "model-b") is None
+    _, changed = _write_vault(tmp_path, FACTS + [{"id": "c", "fact": "gamma"}])
+    assert load_embeddings(path, changed, "org/model-a") is None
+
+def test_corrupt_index_is_ignored(tmp_path):
+    path, raw = _write_vault(tmp_path)
+    compile_embeddings(path, FACTS, raw, "model-a", _encode)
+    sidecar_paths(path, "model-a")[1].write_text("{not json")
+    assert load_embeddings(path, raw, "model-a") is None
+
+def test_vault_matches_against_compiled_embeddings_without_encoding_facts(tmp_path):
+    path, raw = _write_vault(tmp_path)
+    compile_embeddings(path, FACTS, raw, "model-a", _encode)
+
+    vault = Vault(str(path))
+    assert vault.load_embeddings("model-a")
+    model = MagicMock()
+    model.encode.side_effect = _encode
+
+    hits = vector_match("alpha", model, vault, threshold=0.9)
+    assert [(h["id"], h["tags"], h["source"]) for h in hits] == [("a", ["x"], "docs")]
+    model.encode.assert_called_once_with(["alpha"])
+
+def test_vault_without_sidecar_does_not_encode(tmp_path):
+    path, _ = _write_vault(tmp_path)
+    vault = Vault(str(path))
+    assert not vault.load_embeddings("model-a")
+    assert len(vault.index) == 0
+
+def test_ivf_layout_is_compiled_into_the_sidecar(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((8, 16))
+    vectors = {f"fact {i}": centers[i % 8] + rng.standard_normal(16) * 0.05 for i in range(400)}
+    entries = [{"id": i, "fact": f"fact {i}"} for i in range(400)]
+    path, raw = _write_vault(tmp_path, entries)
+    encode = lambda texts: np.array([vectors[t] for t in texts])
+    compile_embeddings(path, entries, raw, "model-a", encode, ivf_min_facts=100)
+
+    compiled = load_embeddings(path, raw, "model-a")
+    assert isinstance(compiled.matrix, np.memmap) and compiled.ivf is not None
+    assert sorted(compiled.positions) == list(range(400)) and compiled.positions != list(range(400))
+    first = vectors[f"fact {compiled.positions[0]}"]
+    np.testing.assert_allclose(compiled.matrix[0], first / np.linalg.norm(first), rtol=1e-5)
+
+    vault = Vault(str(path))
+    assert vault.load_embeddings("model-a")
+    assert vault.index.ivf.n_lists == compiled.ivf.n_lists
+    assert isinstance(vault.index.matrix, np.memmap)
+    hits = vault.index.search(vectors["fact 3"], top_k=5, threshold=0.9)
+    assert hits and all(h["id"] % 8 == 3 for h in hits)
@@ -0,0 +1,210 @@
+import asyncio
+import time
+import uuid
+import chromadb
+import numpy as np
+import pytest
+from unittest.mock import patch, MagicMock
+
+from backend.embedding_cache import EmbeddingCache
+from backend.embedding_service import EmbeddingService
+from backend.memory_manager import MemoryManager
+
+def fake_encode(texts):
+    single = isinstance(texts, str)
+    vectors = []
+    for text in [texts] if single else texts:
+        vector = np.zeros(32)
+        for word in text.lower().split():
+            vector[hash(word) % 32] += 1.0
+        vectors.append(vector / (np.linalg.norm(vector) or 1.0))
+    return vectors[0] if single else np.array(vectors)
+
+@pytest.fixture
+def manager(tmp_path):
+    collection = chromadb.EphemeralClient().get_or_create_collection(name=f"test-{uuid.uuid4().hex}")
+    model = MagicMock()
+    model.encode = MagicMock(side_effect=fake_encode)
+    with patch('backend.memory_manager.embedding_cache', EmbeddingCache(str(tmp_path / "embeddings.db"))):
+        yield MemoryManager(EmbeddingService("fake-model", factory=lambda name: model, workers=0), collection)
+
+def _stored(manager):
+    stored = manager.collection.get(include=["metadatas", "documents"])
+    return sorted(zip(stored["ids"], stored["metadatas"], stored["documents"]), key=lambda r: r[1]["start_line"])
+
+SOURCE = (
+    "import os\n\n"
+    "def load(path):\n    return open(path).read()\n\n"
+    "class Store:\n    def save(self, data):\n        return data\n"
+)
+
+def test_add_to_memory_indexes_code_chunks_with_offsets(manager):
+    manager.add_to_memory(SOURCE, "store.py", "s1")
+
+    rows = _stored(manager)
+    assert [(m["kind"], m["start_line"], m["end_line"]) for _, m, _ in rows] == [
+        ("module", 1, 2), ("function", 3, 4), ("class", 6, 8)
+    ]
+    assert all(i.startswith("s1:store.py#") for i, _, _ in rows)
+    assert rows[1][2] == "def load(path):\n    return open(path).read()\n"
+    assert SOURCE[rows[1][1]["start_char"]:rows[1][1]["end_char"]] == rows[1][2]
+
+def test_rewrite_only_embeds_changed_chunks(manager):
+    manager.add_to_memory(SOURCE, "store.py", "s1")
+    manager.model.encode.reset_mock()
+
+    manager.add_to_memory("# header\n" + SOURCE.replace("return data", "return dict(data)"), "store.py", "s1")
+
+    encoded = manager.model.encode.call_args.args[0]
+    assert len(encoded) == 2
+    assert "class Store" in encoded[1]
+    rows = _stored(manager)
+    assert len(rows) == 3
+    assert rows[1][1]["start_line"] == 4
+
+def test_identical_rewrite_is_skipped(manager):
+    manager.add_to_memory(SOURCE, "store.py", "s1")
+    before = _stored(manager)
+    manager.model.encode.reset_mock()
+
+    manager.add_to_memory(SOURCE, "store.py", "s1")
+
+    manager.model.encode.assert_not_called()
+    assert _stored(manager) == before
+    assert all(m["doc_hash"] == before[0][1]["doc_hash"] for _, m, _ in before)
+
+def test_embedding_cache_is_shared_across_sessions(manager):
+    manager.add_to_memory(SOURCE, "vendored.py", "s1")
+    manager.model.encode.reset_mock()
+
+    manager.add_to_memory(SOURCE, "vendored.py", "s2")
+
+    manager.model.encode.assert_not_called()
+    assert len(manager.collection.get(where={"session_id": "s2"})["ids"]) == 3
+
+def test_retrieve_from_memory_respects_token_budget(manager):
+    for i in range(5):
+        manager.add_to_memory(f"def handler_{i}(request):\n    return 'payment refund {i}'\n", f"h{i}.py", "s1")
+
+    chunks = manager.retrieve_from_memory("payment refund", token_budget=40)
+
+    assert 1 <= len(chunks) < 5
+    assert chunks[0].startswith("# h")
+    assert "(lines 1-2)" in chunks[0]
+
+def test_repeated_queries_reuse_embedding_and_results_until_a_write(manager):
+    manager.add_to_memory("def refund(payment):\n    return payment\n", "refund.py", "s1")
+    manager.model.encode.reset_mock()
+
+    first = manager.retrieve_from_memory("refund a payment")
+    with patch.object(manager.collection, 'query', wraps=manager.collection.query) as mock_query:
+        second = manager.retrieve_from_memory("refund a payment")
+        mock_query.assert_not_called()
+    assert first == second
+    assert manager.model.encode.call_count == 1
+
+    manager.add_to_memory("def charge(payment):\n    return payment\n", "charge.py", "s1")
+    manager.model.encode.reset_mock()
+    third = manager.retrieve_from_memory("refund a payment")
+
+    manager.model.encode.assert_not_called()
+    assert len(third) == 2
+
+def test_result_cache_expires(manager):
+    manager.add_to_memory("notes about refunds\n", "notes.txt", "s1")
+    with patch('backend.memory_manager.settings.memory_result_cache_ttl_seconds', 0.0):
+        manager.retrieve_from_memory("refunds")
+        with patch.object(manager.collection, 'query', wraps=manager.collection.query) as mock_query:
+            manager.retrieve_from_memory("refunds")
+            mock_query.assert_called_once()
+
+def test_result_overlapping_a_write_is_not_cached(manager):
+    manager.add_to_memory("def refund(payment):\n    return payment\n", "refund.py", "s1")
+    original_query = manager.collection.query
+
+    def query_during_write(**kwargs):
+        results = original_query(**kwargs)
+        manager.add_to_memory("def charge(payment):\n    return payment\n", "charge.py", "s1")
+        return results
+
+    with patch.object(manager.collection, 'query', side_effect=query_during_write):
+        assert len(manager.retrieve_from_memory("refund a payment")) == 1
+    assert len(manager.retrieve_from_memory("refund a payment")) == 2
+
+def test_result_cache_evicts_least_recently_used(manager):
+    manager.add_to_memory("notes about refunds\n", "notes.txt", "s1")
+    with patch('backend.memory_manager.settings.memory_query_cache_size', 2):
+        for query in ("refunds", "payments", "refunds", "invoices"):
+            manager.retrieve_from_memory(query)
+    assert [key[0] for key in manager._results] == ["refunds", "invoices"]
+
+def test_retrieval_can_be_scoped_by_session_glob_and_recency(manager):
+    manager.add_to_memory("refund payment handler\n", "refund.py", "s1")
+    manager.add_to_memory("refund payment notes\n", "refund.md", "s1")
+    manager.add_to_memory("refund payment handler\n", "refund.py", "s2")
+
+    assert all("refund.py" in c or "refund.md" in c for c in manager.retrieve_from_memory("refund", session_id="s1"))
+    assert len(manager.retrieve_from_memory("refund", session_id="s1")) == 2
+    assert len(manager.retrieve_from_memory("refund", session_id="s2")) == 1
+    assert len(manager.retrieve_from_memory("refund", filename_glob="*.md")) == 1
+    assert manager.retrieve_from_memory("refund", since=time.time() + 60) == []
+
+def test_hybrid_retrieval_finds_identifier_matches(manager):
+    manager.add_to_memory("def unrelated():\n    return 1\n", "a.py", "s1")
+    manager.add_to_memory("def compute_invoice_total(items):\n    return sum(items)\n", "billing.py", "s1")
+    manager.add_to_memory("def later():\n    return compute_invoice_total([1])\n", "later.py", "s2")
+
+    chunks = manager.retrieve_from_memory("compute_invoice_total", n_results=1, hybrid=True, session_id="s1")
+
+    assert len(chunks) == 1
+    assert chunks[0].startswith("# billing.py")
+    manager.add_to_memory("def compute_invoice_total(items):\n    return max(items)\n", "billing.py", "s1")
+    assert "max(items)" in manager.retrieve_from_memory("compute_invoice_total", n_results=1, hybrid=True, session_id="s1")[0]
+
+@pytest.mark.asyncio
+async def test_async_retrieval_encodes_through_the_batcher(manager):
+    manager.add_to_memory("refund payment handler\n", "refund.py", "s1")
+    expected = manager.retrieve_from_memory("refund", session_id="s1", n_results=2)
+    manager._query_embeddings.clear()
+    manager._invalidate_results()
+
+    with patch.object(manager.embeddings, 'encode_many', wraps=manager.embeddings.encode_many) as mock_encode_many:
+        assert await manager.aretrieve_from_memory("refund", session_id="s1", n_results=2) == expected
+        mock_encode_many.assert_called_once_with(["refund"])
+        assert await manager.aretrieve_from_memory("refund", session_id="s1", n_results=2) == expected
+        assert mock_encode_many.call_count == 1
+    manager.embeddings.shutdown()
+
+@pytest.mark.asyncio
+async def test_enqueue_batches_writes_into_one_encode(manager):
+    with patch('backend.memory_manager.settings.memory_ingest_flush_ms', 50.0):
+        await asyncio.gather(*(manager.enqueue(f"content {i}", f"f{i}.txt", "s1") for i in range(5)))
+        await manager.enqueue("latest", "f0.txt", "s1")
+        await manager.flush()
+
+    manager.model.encode.assert_called_once()
+    stored = manager.collection.get(where={"doc_id": "s1:f0.txt"}, include=["documents"])
+    assert stored["documents"] == ["latest"]
+    await manager.shutdown()
+
+@pytest.mark.asyncio
+async def test_batches_are_capped_by_batch_size(manager):
+    with patch('backend.memory_manager.settings.memory_ingest_batch_size', 2):
+        for i in range(5):
+            await manager.enqueue(f"content {i}", f"f{i}.txt", "s1")
+        await manager.shutdown()
+
+    assert manager.model.encode.call_count == 3
+
+@pytest.mark.asyncio
+async def test_enqueue_applies_backpressure(manager):
+    with patch('backend.memory_manager.settings.memory_ingest_queue_size', 1), \
+            patch('backend.memory_manager.settings.memory_ingest_batch_size', 1), \
+            patch.object(manager, '_ingest_batch', side_effect=lambda batch: time.sleep(0.05)):
+        await manager.enqueue("a", "a.py", "s1")
+        await manager.enqueue("b", "b.py", "s1")
+        blocked = asyncio.ensure_future(manager.enqueue("c", "c.py", "s1"))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        await blocked
+        await manager.shutdown()
@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+
+from backend.plan_executor import build_dependency_graph, execute_plan
+from backend.schemas import PlanModel
+
+def _plan(*steps):
+    return PlanModel(plan=[
+        {"tool": {"name": name}, "parameters": params, "reason": "test"} for name, params in steps
+    ]).plan
+
+def test_independent_reads_and_generation_have_no_dependencies():
+    plan = _plan(
+        ("read_file", {"filename": "a.py"}),
+        ("read_file", {"filename": "b.py"}),
+        ("code_generation", {"prompt": "Write a helper."}),
+    )
+    assert build_dependency_graph(plan) == {0: set(), 1: set(), 2: set()}
+
+def test_placeholders_and_file_overlap_create_dependencies():
+    plan = _plan(
+        ("code_generation", {"prompt": "Write a helper."}),
+        ("write_file", {"filename": "a.py", "content": "<ref:step_0_result>"}),
+        ("read_file", {"filename": "a.py"}),
+        ("read_file", {"filename": "b.py"}),
+        ("refactor_code", {"filename": "b.py", "refactoring_prompt": "{{ step_2_result }}"}),
+        ("list_files", {}),
+    )
+    assert build_dependency_graph(plan) == {
+        0: set(), 1: {0}, 2: {1}, 3: set(), 4: {2, 3}, 5: {1, 4},
+    }
+
+def test_equivalent_and_placeholder_filenames_conflict():
+    plan = _plan(
+        ("write_file", {"filename": "./src/a.py", "content": "x"}),
+        ("read_file", {"filename": "src//lib/../a.py"}),
+        ("read_file", {"filename": "b.py"}),
+        ("write_file", {"filename": "<ref:step_2_result>", "content": "y"}),
+    )
+    assert build_dependency_graph(plan) == {0: set(), 1: {0}, 2: set(), 3: {0, 1, 2}}
+
+def test_shell_steps_are_barriers():
+    plan = _plan(
+        ("read_file", {"filename": "a.py"}),
+        ("execute_script", {"command": "ls"}),
+        ("read_file", {"filename": "b.py"}),
+    )
+    assert build_dependency_graph(plan) == {0: set(), 1: {0}, 2: {1}}
+
+@pytest.mark.asyncio
+async def test_execute_plan_runs_independent_steps_concurrently():
+    plan = _plan(*[("read_file", {"filename": f"{i}.py"}) for i in range(4)])
+    running, peak = 0, 0
+
+    async def run_step(i, step, results):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {"status": "success", "data": step.parameters["filename"]}
+
+    results = await execute_plan(plan, run_step, max_concurrency=2)
+
+    assert peak == 2
+    assert [results[i]["data"] for i in sorted(results)] == ["0.py", "1.py", "2.py", "3.py"]
+
+@pytest.mark.asyncio
+async def test_execute_plan_passes_results_to_dependents_and_stops_on_error():
+    plan = _plan(
+        ("code_generation", {"prompt": "x"}),
+        ("write_file", {"filename": "a.py", "content": "<ref:step_0_result>"}),
+        ("execute_script", {"command": "python a.py"}),
+        ("read_file", {"filename": "a.py"}),
+    )
+    seen = {}
+
+    async def run_step(i, step, results):
+        seen[i] = dict(results)
+        if step.tool.name == "execute_script":
+            return {"status": "error", "message": "boom"}
+        return {"status": "success", "data": f"step{i}"}
+
+    results = await execute_plan(plan, run_step, max_concurrency=4)
+
+    assert 0 in seen[1]
+    assert results[2]["status"] == "error"
+    assert 3 not in results
@@ -0,0 +1,34 @@
+import json
+from unittest.mock import MagicMock
+
+from backend.prompts import PlanningPromptBuilder, compact_json
+from backend.tools import TOOL_DISPATCHER, get_tool_definitions
+
+def test_static_prefix_is_built_once_per_registry_version():
+    definitions = MagicMock(return_value=[{"name": "a", "parameters": {"type": "object"}}])
+    registry = {"a": None}
+    builder = PlanningPromptBuilder(definitions, registry)
+
+    first = builder.build("do it", "")
+    second = builder.build("do something else", "some context")
+    assert definitions.call_count == 1
+    assert first.version == second.version
+
+    registry["b"] = None
+    definitions.return_value = definitions.return_value + [{"name": "b", "parameters": {"type": "object"}}]
+    assert builder.build("do it", "").version != first.version
+    assert definitions.call_count == 2
+
+def test_context_is_spliced_after_the_cached_prefix():
+    builder = PlanningPromptBuilder()
+    prefix = builder.static_prefix().text
+    prompt = builder.build("make a directory", "def main(): pass")
+
+    system = prompt.messages[0]["content"]
+    assert system.startswith(prefix)
+    assert "def main(): pass" in system[len(prefix):]
+    assert compact_json(get_tool_definitions()) in prefix
+    assert prompt.messages[1] == {"role": "user", "content": "make a directory"}
+    assert set(prompt.section_tokens) == {"instructions", "tool_schemas", "memory_context", "user_prompt"}
+    assert prompt.section_tokens["tool_schemas"] < len(json.dumps(get_tool_definitions(), indent=2)) // 4
+    assert set(TOOL_DISPATCHER) == {tool["name"] for tool in get_tool_definitions()}
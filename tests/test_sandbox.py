@@ -0,0 +1,120 @@
+import asyncio
+import shutil
+import subprocess
+import time
+
+import pytest
+from unittest.mock import patch
+
+from backend.sandbox import CapturedOutput, SandboxPool
+from backend.tools import handle_execute_script, run_in_user_namespace
+
+def _unshare_works() -> bool:
+    if shutil.which("unshare") is None:
+        return False
+    return subprocess.run(["unshare", "-U", "-r", "-m", "--", "true"], capture_output=True).returncode == 0
+
+needs_unshare = pytest.mark.skipif(not _unshare_works(), reason="user namespaces are not available")
+
+@pytest.fixture
+def pool():
+    return SandboxPool()
+
+@needs_unshare
+@pytest.mark.asyncio
+async def test_session_reuses_its_worker_and_cwd(pool, tmp_path):
+    try:
+        first = await pool.run("s1", "id -u; pwd", str(tmp_path))
+        second = await pool.run("s1", "echo $PPID", str(tmp_path))
+        other = await pool.run("s2", "echo $PPID", str(tmp_path))
+    finally:
+        await pool.shutdown()
+    assert first["stdout"].render().split() == ["0", str(tmp_path)]
+    assert first["exit_code"] == 0
+    assert second["stdout"].render() != other["stdout"].render()
+
+@needs_unshare
+@pytest.mark.asyncio
+async def test_timeout_and_output_cap(pool, tmp_path):
+    try:
+        started = time.monotonic()
+        slow = await pool.run("s1", "sleep 30 & sleep 30", str(tmp_path), timeout=0.5)
+        assert slow["timed_out"] and time.monotonic() - started < 10
+        loud = await pool.run("s1", "seq 1 100000", str(tmp_path), head_bytes=64, tail_bytes=64)
+        text = loud["stdout"].render()
+        assert loud["stdout"].truncated and loud["stdout"].total == len("".join(f"{i}\n" for i in range(1, 100001)))
+        assert text.startswith("1\n2\n3\n") and text.endswith("99999\n100000\n") and "bytes omitted" in text
+        still_alive = await pool.run("s1", "echo ok", str(tmp_path))
+        assert still_alive["stdout"].render() == "ok\n"
+    finally:
+        await pool.shutdown()
+
+@needs_unshare
+@pytest.mark.asyncio
+async def test_commands_do_not_block_the_event_loop(tmp_path):
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.get_running_loop().create_task(ticker())
+    with patch('backend.tools.sandbox_pool', SandboxPool()) as pool:
+        try:
+            result = await run_in_user_namespace("sleep 0.5; echo done >&2; exit 3", str(tmp_path), session_id="s1")
+        finally:
+            await pool.shutdown()
+    task.cancel()
+    assert result == {"status": "error", "output": "done\n", "exit_code": 3, "output_bytes": 5, "output_file": None}
+    assert ticks >= 20
+
+@needs_unshare
+@pytest.mark.asyncio
+async def test_large_output_spills_to_the_vault_with_progress(tmp_path):
+    events = []
+    with patch('backend.tools.sandbox_pool', SandboxPool()) as pool, \
+         patch('backend.sandbox.settings.sandbox_output_head_bytes', 100), \
+         patch('backend.sandbox.settings.sandbox_output_tail_bytes', 100), \
+         patch('backend.sandbox.settings.sandbox_progress_interval', 0.0):
+        try:
+            result = await run_in_user_namespace(
+                "seq 1 50000", str(tmp_path), session_id="s1", spill_dir=tmp_path / ".outputs", on_progress=events.append
+            )
+        finally:
+            await pool.shutdown()
+    expected = "".join(f"{i}\n" for i in range(1, 50001))
+    assert result["status"] == "success" and result["output_bytes"] == len(expected)
+    assert result["output_file"].startswith(".outputs/") and result["output_file"] in result["output"]
+    assert (tmp_path / result["output_file"]).read_text() == expected
+    assert len(result["output"]) < 400
+    assert events and events[-1]["stream"] == "stdout" and events[-1]["bytes"] <= len(expected)
+
+def test_binary_output_is_not_decoded():
+    binary = CapturedOutput(b"\x7fELF\0\0\x01", b"", 7)
+    assert binary.is_binary and binary.render() == "[binary output, 7 bytes]"
+    text = CapturedOutput("h\u00e9".encode("utf-8"), b"tail", 10)
+    assert text.render() == "h\u00e9\n[... 3 bytes omitted ...]\ntail"
+
+@needs_unshare
+@pytest.mark.asyncio
+async def test_mounts_do_not_outlive_their_command(pool, tmp_path):
+    (tmp_path / "mnt").mkdir()
+    (tmp_path / "mnt" / "kept").write_text("x")
+    try:
+        mounted = await pool.run("s1", "mount -t tmpfs none mnt && ls mnt", str(tmp_path))
+        after = await pool.run("s1", "ls mnt", str(tmp_path))
+    finally:
+        await pool.shutdown()
+    assert mounted["exit_code"] == 0 and mounted["stdout"].render() == ""
+    assert after["stdout"].render() == "kept\n"
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("timeout", ["5", 0, -1, True])
+async def test_execute_script_rejects_invalid_timeouts(timeout, tmp_path):
+    with patch('backend.tools.VAULT_ROOT', str(tmp_path)), patch('backend.tools.assess_command') as assess:
+        (tmp_path / "s1").mkdir(exist_ok=True)
+        result = await handle_execute_script({"command": "ls", "timeout": timeout}, session_id="s1", user_prompt="list")
+    assert result == {"status": "error", "message": "'timeout' must be a positive number of seconds."}
+    assess.assert_not_called()